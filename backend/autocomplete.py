@@ -0,0 +1,126 @@
+"""Prefix autocomplete over the product catalog for /api/suggestions.
+
+Every product contributes a few lowercase keys (the full name, each later
+word of the name and the brand) to one sorted array. A prefix query is two
+binary searches that give the contiguous range of matching keys; the
+highest-scoring suggestions in that range are then pulled out with a range
+maximum query, so entries outside the range are never looked at and large
+ranges are not scanned.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+# Keys are grouped into blocks of this size; a sparse table over the block
+# maxima answers the middle of a range, partial blocks are scanned directly.
+_BLOCK = 32
+
+
+class Autocomplete:
+	"""Score-weighted top-k prefix completion built from catalog records."""
+
+	def __init__(self, products: Iterable):
+		self._suggestions: List[Dict[str, str]] = []
+		weights: List[int] = []
+		seen: Dict[tuple, int] = {}
+		pairs = []
+		for product in products:
+			name, brand = product.name, product.brand
+			sid = seen.get((name, brand))
+			if sid is not None:
+				# Same suggestion listed twice (e.g. in two catalogs): keep the best score
+				weights[sid] = max(weights[sid], product.score)
+				continue
+			sid = seen[(name, brand)] = len(self._suggestions)
+			self._suggestions.append({"name": name, "brand": brand})
+			weights.append(product.score)
+			for key in self._keys_for(name, brand):
+				pairs.append((key, sid))
+
+		pairs.sort()
+		self._keys = [key for key, _ in pairs]
+		self._sids = array("l", (sid for _, sid in pairs))
+		self._weights = array("l", (weights[sid] for _, sid in pairs))
+		self._build_sparse_table()
+
+	def __len__(self) -> int:
+		return len(self._keys)
+
+	def complete(self, q: str, limit: int = 5) -> List[Dict[str, str]]:
+		"""Return up to ``limit`` suggestions whose keys start with ``q``."""
+		prefix = q.strip().lower()
+		if not prefix or limit <= 0:
+			return []
+		lo = bisect_left(self._keys, prefix)
+		hi = bisect_left(self._keys, prefix + "\U0010ffff", lo)
+		if lo >= hi:
+			return []
+
+		results = []
+		emitted = set()
+		best = self._argmax(lo, hi)
+		heap = [(-self._weights[best], best, lo, hi)]
+		while heap and len(results) < limit:
+			_, pos, lo, hi = heapq.heappop(heap)
+			sid = self._sids[pos]
+			if sid not in emitted:
+				emitted.add(sid)
+				results.append(self._suggestions[sid])
+			for sub_lo, sub_hi in ((lo, pos), (pos + 1, hi)):
+				if sub_lo < sub_hi:
+					best = self._argmax(sub_lo, sub_hi)
+					heapq.heappush(heap, (-self._weights[best], best, sub_lo, sub_hi))
+		return results
+
+	@staticmethod
+	def _keys_for(name: str, brand: str) -> List[str]:
+		name_l = name.lower()
+		words = name_l.split()
+		keys = [name_l]
+		# Let "pro" complete "iPhone 15 Pro" without indexing every substring
+		for i in range(1, len(words)):
+			keys.append(" ".join(words[i:]))
+		brand_l = brand.lower()
+		if brand_l and not name_l.startswith(brand_l):
+			keys.append(brand_l)
+		return keys
+
+	def _build_sparse_table(self) -> None:
+		weights = self._weights
+		n = len(weights)
+		block_best = array("l", (
+			max(range(start, min(start + _BLOCK, n)), key=weights.__getitem__)
+			for start in range(0, n, _BLOCK)
+		))
+		self._table = [block_best]
+		span = 1
+		while span * 2 <= len(block_best):
+			prev = self._table[-1]
+			self._table.append(array("l", (
+				self._better(prev[i], prev[i + span])
+				for i in range(len(prev) - span)
+			)))
+			span *= 2
+
+	def _better(self, a: int, b: int) -> int:
+		# Ties go to the lower position, i.e. the alphabetically first key
+		wa, wb = self._weights[a], self._weights[b]
+		if wa > wb or (wa == wb and a < b):
+			return a
+		return b
+
+	def _argmax(self, lo: int, hi: int) -> int:
+		"""Position of the highest weight in keys[lo:hi]."""
+		weight = self._weights.__getitem__
+		first_block, last_block = lo // _BLOCK, (hi - 1) // _BLOCK
+		if last_block - first_block < 2:
+			return max(range(lo, hi), key=weight)
+
+		best = max(range(lo, (first_block + 1) * _BLOCK), key=weight)
+		best = self._better(best, max(range(last_block * _BLOCK, hi), key=weight))
+		a, b = first_block + 1, last_block - 1
+		level = (b - a + 1).bit_length() - 1
+		row = self._table[level]
+		best = self._better(best, self._better(row[a], row[b - (1 << level) + 1]))
+		return best
@@ -0,0 +1,208 @@
+"""Per-provider circuit breakers with latency-adaptive timeouts.
+
+Each upstream provider gets a :class:`CircuitBreaker` that watches its last
+``window`` calls. When enough of them fail (errors, timeouts, 5xx) or are
+slower than ``slow_call`` seconds, the breaker opens and calls are refused
+with :class:`CircuitOpenError` instead of waiting on a source that is down.
+After ``reset_timeout`` seconds it lets ``half_open_calls`` probe requests
+through; a successful probe closes it again, a failed one reopens it.
+Every admitted call carries an :class:`Admission` naming the breaker state
+it was let through in, so a call still running from before a transition
+cannot be mistaken for a probe, or decide the state it no longer saw.
+
+While closed, :meth:`CircuitBreaker.timeout` tracks the p95 latency of
+recent successful calls, so a source that normally answers in 200 ms is not
+given the full fixed timeout before it counts as failed. Probes get the full
+timeout, and opening forgets the latencies: a source that became slower than
+its old p95 allows, but still answers in time, can close the breaker again
+and sets a new baseline.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "2.0"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+# Adaptive timeout = p95 of recent successes x factor, never below the floor
+TIMEOUT_FACTOR = float(os.getenv("PROVIDER_TIMEOUT_FACTOR", "3.0"))
+TIMEOUT_FLOOR = float(os.getenv("PROVIDER_TIMEOUT_FLOOR", "0.5"))
+
+
+class CircuitOpenError(Exception):
+	"""Raised instead of calling a provider whose breaker is open."""
+
+
+class Admission:
+	"""Ticket for a call :meth:`CircuitBreaker.allow` let through.
+
+	``generation`` counts the breaker's state changes at admission and
+	``probe`` is True for the half-open probes.
+	"""
+
+	__slots__ = ("generation", "probe")
+
+	def __init__(self, generation: int, probe: bool):
+		self.generation = generation
+		self.probe = probe
+
+
+class CircuitBreaker:
+	"""Closed/open/half-open breaker over a sliding window of call outcomes.
+
+	Callers ask :meth:`allow` before a call and report it with
+	:meth:`record`, handing back the :class:`Admission` they got. Safe to
+	use from several threads and event loops.
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		window: int = BREAKER_WINDOW,
+		min_calls: int = BREAKER_MIN_CALLS,
+		failure_rate: float = BREAKER_FAILURE_RATE,
+		slow_call: float = BREAKER_SLOW_CALL,
+		slow_rate: float = BREAKER_SLOW_RATE,
+		reset_timeout: float = BREAKER_RESET_TIMEOUT,
+		half_open_calls: int = BREAKER_HALF_OPEN_CALLS,
+		timeout_factor: float = TIMEOUT_FACTOR,
+		timeout_floor: float = TIMEOUT_FLOOR,
+		clock: Callable[[], float] = time.monotonic,
+		on_change: Optional[Callable[[str, str, str], None]] = None,
+	):
+		self.name = name
+		self.min_calls = min_calls
+		self.failure_rate = failure_rate
+		self.slow_call = slow_call
+		self.slow_rate = slow_rate
+		self.reset_timeout = reset_timeout
+		self.half_open_calls = half_open_calls
+		self.timeout_factor = timeout_factor
+		self.timeout_floor = timeout_floor
+		self.on_change = on_change
+		self._clock = clock
+		self._lock = threading.Lock()
+		# (failed, slow) per call, and latencies of successful calls
+		self._outcomes: Deque[tuple] = deque(maxlen=window)
+		self._latencies: Deque[float] = deque(maxlen=100)
+		self.state = CLOSED
+		self._opened_at = 0.0
+		self._probes = 0
+		# Bumped by every transition; admissions from an older one are stale
+		self._generation = 0
+		self.calls = 0
+		self.failures = 0
+		self.rejected = 0
+		self.transitions: List[Dict] = []
+
+	def allow(self) -> Optional[Admission]:
+		"""Admit a call now (reserving a probe slot when half-open), or return None."""
+		with self._lock:
+			if self.state == OPEN:
+				if self._clock() - self._opened_at < self.reset_timeout:
+					self.rejected += 1
+					return None
+				self._transition(HALF_OPEN)
+			if self.state == HALF_OPEN:
+				if self._probes >= self.half_open_calls:
+					self.rejected += 1
+					return None
+				self._probes += 1
+				return Admission(self._generation, probe=True)
+			return Admission(self._generation, probe=False)
+
+	def record(self, admission: Admission, latency: float, failed: bool) -> None:
+		"""Report the outcome of a call that :meth:`allow` let through."""
+		slow = latency >= self.slow_call
+		with self._lock:
+			self.calls += 1
+			if failed:
+				self.failures += 1
+			else:
+				self._latencies.append(latency)
+
+			if admission.generation != self._generation:
+				# Admitted before the last transition (say, closed calls still
+				# running when the breaker tripped): not a probe of this state
+				return
+			if admission.probe:
+				self._probes -= 1
+				if failed or slow:
+					self._open()
+				else:
+					self._outcomes.clear()
+					self._transition(CLOSED)
+				return
+
+			self._outcomes.append((failed, slow))
+			if len(self._outcomes) < self.min_calls:
+				return
+			total = len(self._outcomes)
+			failed_rate = sum(1 for f, _ in self._outcomes if f) / total
+			slow_rate = sum(1 for _, s in self._outcomes if s) / total
+			if failed_rate >= self.failure_rate or slow_rate >= self.slow_rate:
+				self._open()
+
+	def release(self, admission: Admission) -> None:
+		"""Give back a call slot without an outcome (e.g. the caller cancelled it)."""
+		with self._lock:
+			if admission.probe and admission.generation == self._generation:
+				self._probes -= 1
+
+	def timeout(self, ceiling: float, admission: Optional[Admission] = None) -> float:
+		"""Timeout for the next call: recent p95 x factor, within [floor, ceiling].
+
+		Probes always get ``ceiling``.
+		"""
+		if admission is not None and admission.probe:
+			return ceiling
+		with self._lock:
+			latencies = sorted(self._latencies)
+		if len(latencies) < self.min_calls:
+			return ceiling
+		p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+		return min(ceiling, max(self.timeout_floor, p95 * self.timeout_factor))
+
+	def stats(self) -> Dict:
+		with self._lock:
+			outcomes = list(self._outcomes)
+		return {
+			"state": self.state,
+			"calls": self.calls,
+			"failures": self.failures,
+			"rejected": self.rejected,
+			"window_failure_rate": round(sum(1 for f, _ in outcomes if f) / len(outcomes), 4) if outcomes else 0.0,
+			"window_slow_rate": round(sum(1 for _, s in outcomes if s) / len(outcomes), 4) if outcomes else 0.0,
+			"transitions": self.transitions[-10:],
+		}
+
+	def _open(self) -> None:
+		self._opened_at = self._clock()
+		self._probes = 0
+		# Latencies from before the trip would hold probes and the first
+		# calls after closing to a timeout the source may have outgrown
+		self._latencies.clear()
+		self._transition(OPEN)
+
+	def _transition(self, state: str) -> None:
+		# Called with the lock held
+		previous, self.state = self.state, state
+		self._generation += 1
+		self.transitions.append({"from": previous, "to": state, "at": time.time()})
+		del self.transitions[:-50]
+		if self.on_change is not None:
+			self.on_change(self.name, previous, state)
+
+
+def log_change(name: str, previous: str, state: str) -> None:
+	print(f"Circuit breaker {name}: {previous} -> {state}")
@@ -0,0 +1,179 @@
+"""Bounded in-process cache with TTLs and LRU eviction by memory footprint.
+
+Used in front of the upstream product providers. Entries expire after a
+per-entry TTL (empty results get a shorter "negative" TTL) and once past
+that TTL may still be served for ``stale_ttl`` seconds while a background
+task refreshes them. Eviction is least-recently-used, bounded by the
+estimated size of the cached values rather than by entry count.
+"""
+import asyncio
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def estimate_size(value: Any) -> int:
+	"""Rough deep ``sys.getsizeof`` for JSON-like values."""
+	size = sys.getsizeof(value)
+	if isinstance(value, dict):
+		size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+	elif isinstance(value, (list, tuple, set)):
+		size += sum(estimate_size(v) for v in value)
+	return size
+
+
+class _Entry:
+	__slots__ = ("value", "size", "expires", "stale_until")
+
+	def __init__(self, value: Any, size: int, expires: float, stale_until: float):
+		self.value = value
+		self.size = size
+		self.expires = expires
+		self.stale_until = stale_until
+
+
+class TTLCache:
+	"""LRU cache bounded by ``max_bytes`` with per-entry TTLs.
+
+	The plain :meth:`get`/:meth:`set` API is thread-safe and synchronous;
+	:meth:`get_or_fetch` adds stale-while-revalidate for async fetchers.
+	"""
+
+	def __init__(
+		self,
+		max_bytes: int = 16 * 1024 * 1024,
+		ttl: float = 300.0,
+		negative_ttl: float = 30.0,
+		stale_ttl: float = 60.0,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.negative_ttl = negative_ttl
+		self.stale_ttl = stale_ttl
+		self._clock = clock
+		self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._refreshing: Dict[Hashable, asyncio.Task] = {}
+		self.bytes = 0
+		self.hits = 0
+		self.stale_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def get(self, key: Hashable, default: Any = None, allow_stale: bool = False) -> Any:
+		"""Return the cached value, or ``default`` if missing or expired."""
+		entry = self._lookup(key, allow_stale)
+		return default if entry is None else entry.value
+
+	def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+		"""Store ``value``; empty values default to the negative TTL."""
+		if ttl is None:
+			ttl = self.ttl if value else self.negative_ttl
+		size = estimate_size(value)
+		if size > self.max_bytes:
+			return
+		now = self._clock()
+		entry = _Entry(value, size, now + ttl, now + ttl + self.stale_ttl)
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.bytes -= old.size
+			self._entries[key] = entry
+			self.bytes += size
+			while self.bytes > self.max_bytes:
+				_, evicted = self._entries.popitem(last=False)
+				self.bytes -= evicted.size
+				self.evictions += 1
+
+	def delete(self, key: Hashable) -> None:
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None:
+				self.bytes -= entry.size
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+			self.bytes = 0
+
+	async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+		"""Return a cached value, calling ``fetch`` on a miss.
+
+		A stale entry is returned immediately and refreshed in the background.
+		"""
+		entry = self._lookup(key, allow_stale=True)
+		if entry is not None:
+			if entry.expires <= self._clock() and key not in self._refreshing:
+				task = asyncio.ensure_future(self._refresh(key, fetch, ttl))
+				self._refreshing[key] = task
+			return entry.value
+		value = await fetch()
+		self.set(key, value, ttl)
+		return value
+
+	def stats(self) -> Dict[str, Any]:
+		lookups = self.hits + self.stale_hits + self.misses
+		return {
+			"entries": len(self._entries),
+			"bytes": self.bytes,
+			"max_bytes": self.max_bytes,
+			"hits": self.hits,
+			"stale_hits": self.stale_hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"expirations": self.expirations,
+			"hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+		}
+
+	def _lookup(self, key: Hashable, allow_stale: bool) -> Optional[_Entry]:
+		now = self._clock()
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			if entry.expires > now:
+				self.hits += 1
+			elif allow_stale and entry.stale_until > now:
+				self.stale_hits += 1
+			else:
+				if entry.stale_until <= now:
+					# Too old to serve even as stale; drop it
+					del self._entries[key]
+					self.bytes -= entry.size
+					self.expirations += 1
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			return entry
+
+	async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> None:
+		try:
+			self.set(key, await fetch(), ttl)
+		except Exception as e:
+			print(f"Error refreshing cache entry {key!r}: {e}")
+		finally:
+			self._refreshing.pop(key, None)
+
+
+def cached(cache: TTLCache, name: str):
+	"""Decorate an async ``provider(query, *args)`` to go through ``cache``.
+
+	Keys are ``(name, normalized query)`` so each provider has its own entries.
+	"""
+	def decorator(fn):
+		@functools.wraps(fn)
+		async def wrapper(query: str, *args, **kwargs):
+			key = (name, " ".join(query.lower().split()))
+			return await cache.get_or_fetch(key, lambda: fn(query, *args, **kwargs))
+		wrapper.uncached = fn
+		return wrapper
+	return decorator
@@ -0,0 +1,176 @@
+"""Product catalog store shared by the search and suggestion endpoints.
+
+The catalog is loaded once from a JSON, CSV or SQLite file into compact
+``__slots__`` records with interned brand/category strings, and the search
+index and autocomplete structures are built from it. ``CatalogStore``
+keeps the current snapshot and can swap in a freshly loaded one (e.g. when
+the file changes) without restarting the server; requests keep using the
+snapshot they started with.
+"""
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+	from . import fast_json
+	from .autocomplete import Autocomplete
+	from .search_index import SearchIndex
+except ImportError:
+	import fast_json
+	from autocomplete import Autocomplete
+	from search_index import SearchIndex
+
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "products.json")
+CATALOG_PATH = os.getenv("ECOSCAN_CATALOG", DEFAULT_CATALOG)
+
+
+class ProductRecord:
+	"""One catalog product. ``to_dict`` gives the JSON shape the API returns."""
+
+	__slots__ = ("id", "name", "brand", "category", "score", "carbon", "water", "other", "image", "alternatives", "_json")
+
+	def __init__(self, id, name: str, brand: str, category: str, score: int,
+			carbon: int = 0, water: int = 0, other: int = 0, image: str = "",
+			alternatives: Tuple[Tuple[str, int], ...] = ()):
+		self.id = id
+		self.name = name
+		# Few distinct brands/categories across many products: share the strings
+		self.brand = sys.intern(brand)
+		self.category = sys.intern(category)
+		self.score = score
+		self.carbon = carbon
+		self.water = water
+		self.other = other
+		self.image = image
+		self.alternatives = alternatives
+		self._json: Optional[bytes] = None
+
+	@classmethod
+	def from_dict(cls, product: Dict) -> "ProductRecord":
+		breakdown = product.get("breakdown") or {}
+		return cls(
+			product["id"], product["name"], product["brand"], product["category"], product["score"],
+			breakdown.get("carbon", 0), breakdown.get("water", 0), breakdown.get("other", 0),
+			product.get("image", ""),
+			tuple((alt["name"], alt["score"]) for alt in product.get("alternatives", ())),
+		)
+
+	def to_dict(self) -> Dict:
+		return {
+			"id": self.id,
+			"name": self.name,
+			"brand": self.brand,
+			"category": self.category,
+			"score": self.score,
+			"breakdown": {"carbon": self.carbon, "water": self.water, "other": self.other},
+			"image": self.image,
+			"alternatives": [{"name": name, "score": score} for name, score in self.alternatives],
+		}
+
+	def to_json(self) -> bytes:
+		"""``to_dict`` as JSON bytes, encoded on first use and kept (records do not change)."""
+		encoded = self._json
+		if encoded is None:
+			encoded = self._json = fast_json.dumps(self.to_dict())
+		return encoded
+
+
+def _read_json(path: str) -> Iterator[ProductRecord]:
+	with open(path, encoding="utf-8") as f:
+		data = json.load(f)
+	for product in data["products"] if isinstance(data, dict) else data:
+		yield ProductRecord.from_dict(product)
+
+
+def _row_record(row: Dict) -> ProductRecord:
+	# Shared by the CSV and SQLite readers, which store one column per field
+	alternatives = row.get("alternatives") or "[]"
+	return ProductRecord(
+		row["id"], row["name"], row["brand"], row["category"], int(row["score"]),
+		int(row.get("carbon") or 0), int(row.get("water") or 0), int(row.get("other") or 0),
+		row.get("image") or "",
+		tuple((alt["name"], alt["score"]) for alt in json.loads(alternatives)),
+	)
+
+
+def _read_csv(path: str) -> Iterator[ProductRecord]:
+	with open(path, encoding="utf-8", newline="") as f:
+		for row in csv.DictReader(f):
+			yield _row_record(row)
+
+
+def _read_sqlite(path: str) -> Iterator[ProductRecord]:
+	conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+	conn.row_factory = sqlite3.Row
+	try:
+		for row in conn.execute("SELECT * FROM catalog_products ORDER BY rowid"):
+			yield _row_record(dict(row))
+	finally:
+		conn.close()
+
+
+_READERS = {".json": _read_json, ".csv": _read_csv, ".db": _read_sqlite, ".sqlite": _read_sqlite, ".sqlite3": _read_sqlite}
+
+
+def load_products(path: str) -> List[ProductRecord]:
+	"""Read every product from a JSON, CSV or SQLite (``catalog_products`` table) file."""
+	reader = _READERS.get(os.path.splitext(path)[1].lower())
+	if reader is None:
+		raise ValueError(f"unsupported catalog format: {path}")
+	return list(reader(path))
+
+
+def file_version(path: str) -> str:
+	stat = os.stat(path)
+	return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class Catalog:
+	"""Immutable snapshot: products plus the structures built from them."""
+
+	__slots__ = ("products", "version", "search_index", "autocomplete")
+
+	def __init__(self, products: Iterable[ProductRecord], version: str = ""):
+		self.products: List[ProductRecord] = list(products)
+		self.version = version
+		self.search_index = SearchIndex(self.products)
+		self.autocomplete = Autocomplete(self.products)
+
+	def __len__(self) -> int:
+		return len(self.products)
+
+
+class CatalogStore:
+	"""Holds the current :class:`Catalog` and reloads it from ``path``."""
+
+	def __init__(self, path: str = CATALOG_PATH, lazy: bool = False):
+		self.path = path
+		self._lock = threading.Lock()
+		self._current: Optional[Catalog] = None
+		if not lazy:
+			self._current = Catalog(load_products(path), file_version(path))
+
+	@property
+	def current(self) -> Catalog:
+		"""The loaded snapshot; a lazy store loads it on first access."""
+		if self._current is None:
+			with self._lock:
+				if self._current is None:
+					self._current = Catalog(load_products(self.path), file_version(self.path))
+		return self._current
+
+	def reload(self, force: bool = False) -> bool:
+		"""Load the file again if it changed; returns True if a new snapshot was swapped in."""
+		current = self.current
+		with self._lock:
+			version = file_version(self.path)
+			if not force and version == current.version:
+				return False
+			# Build completely before swapping so readers never see a half-built catalog
+			self._current = Catalog(load_products(self.path), version)
+			return True
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -9,7 +9,55 @@ if not DATABASE_URL:
     # Fallback to sqlite file in backend/ for quick local testing
     DATABASE_URL = "sqlite:///./dev.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+def make_engine(url: str = DATABASE_URL, **kwargs):
+    """Create an engine tuned for concurrent workers.
+
+    SQLite connections get WAL journaling and the pragmas below so readers
+    do not block the writer and lock waits retry instead of failing with
+    "database is locked". Server databases (Postgres) get an explicit pool.
+    Everything can be overridden through environment variables.
+    """
+    if url.startswith("sqlite"):
+        busy_timeout = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+        pragmas = {
+            "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+            "busy_timeout": busy_timeout,
+        }
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            # WAL and mmap only apply to database files
+            pragmas = {"busy_timeout": busy_timeout}
+        connect_args = {"check_same_thread": False, "timeout": busy_timeout / 1000}
+        connect_args.update(kwargs.pop("connect_args", {}))
+        engine = create_engine(url, connect_args=connect_args, **kwargs)
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+        return engine
+
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    options.update(kwargs)
+    return create_engine(url, **options)
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -0,0 +1,46 @@
+"""JSON encoding for the hot response paths.
+
+FastAPI serializes a returned dict or list by walking it with
+``jsonable_encoder`` (or validating it against the response model) and then
+calling ``json.dumps``. For products that never change between requests
+that is wasted work. Here, catalog products encode themselves once
+(:meth:`catalog.ProductRecord.to_json`), a list of results is the
+concatenation of those fragments (:func:`array`), and
+:class:`RawJSONResponse` sends the bytes as they are.
+
+:func:`dumps` uses orjson when it is installed and otherwise ``json.dumps``
+with the compact settings of Starlette's ``JSONResponse``. Both give the
+same bytes for the str/int/list/dict payloads of the API, so responses do
+not change.
+"""
+import json
+from typing import Any, Iterable
+
+from starlette.responses import Response
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+
+def dumps(content: Any) -> bytes:
+	if orjson is not None:
+		return orjson.dumps(content)
+	return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def array(fragments: Iterable[bytes]) -> bytes:
+	"""JSON array of already encoded values."""
+	return b"[" + b",".join(fragments) + b"]"
+
+
+class RawJSONResponse(Response):
+	"""JSON response whose content may already be encoded bytes."""
+
+	media_type = "application/json"
+
+	def render(self, content: Any) -> bytes:
+		if isinstance(content, bytes):
+			return content
+		return dumps(content)
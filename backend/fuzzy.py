@@ -0,0 +1,198 @@
+"""Typo-tolerant token lookup: trigram candidates, bounded edit distance.
+
+:class:`TrigramIndex` holds a vocabulary of tokens (the words of product
+names, brands and categories). :meth:`TrigramIndex.similar` finds the
+tokens within a few edits of a query word in two steps:
+
+1. candidates are the tokens of a similar length sharing enough trigrams
+   with the word (one edit changes at most four of them, counting a swap of
+   two adjacent letters as one edit), read from per-trigram posting lists.
+   When the word has too few trigrams for that bound to require any shared
+   one (two swaps in a seven-letter word can leave none), the tokens with
+   few enough trigrams to share none come from a deletion neighbourhood
+   instead: within ``k`` edits (swaps included), the word and the token
+   reduce to the same string by deleting at most ``k`` characters from
+   each, so every such string of those short tokens is indexed;
+2. each candidate is verified with :func:`bounded_distance`, a banded edit
+   distance that gives up as soon as the limit is exceeded.
+
+So the cost follows the number of candidates, not the size of the
+vocabulary. The number of edits allowed grows with the word length, see
+:func:`max_edits`.
+"""
+from typing import Dict, List, Optional, Set
+
+# Padding so the first and last letters get trigrams of their own
+_PAD_START, _PAD_END = "\x02\x02", "\x03"
+# Deletions indexed per token; max_edits() never allows more edits
+_NEIGHBOURHOOD = 2
+
+
+def trigrams(token: str) -> Set[str]:
+	padded = _PAD_START + token + _PAD_END
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def deletions(token: str, depth: int) -> Set[str]:
+	"""``token`` and every string left after deleting up to ``depth`` of its characters."""
+	found = frontier = {token}
+	for _ in range(depth):
+		frontier = {t[:i] + t[i + 1:] for t in frontier for i in range(len(t))}
+		found = found | frontier
+	return found
+
+
+def max_edits(length: int) -> int:
+	"""Edits tolerated in a word of ``length`` characters."""
+	if length < 4:
+		return 0
+	if length < 7:
+		return 1
+	return 2
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+	"""Edit distance between ``a`` and ``b``, or ``limit + 1`` if it exceeds ``limit``.
+
+	Insertions, deletions, substitutions and swaps of two adjacent characters
+	each count as one edit (optimal string alignment). The common prefix and
+	suffix are skipped first; then only the diagonal band of width
+	``2 * limit + 1`` is computed, and the scan stops at the first row whose
+	values all exceed ``limit``: O(limit * len) rather than
+	O(len(a) * len(b)).
+	"""
+	if abs(len(a) - len(b)) > limit:
+		return limit + 1
+	if a == b:
+		return 0
+	over = limit + 1
+	# Typos are local: only the part between the common prefix and suffix counts
+	start = 0
+	while start < len(a) and start < len(b) and a[start] == b[start]:
+		start += 1
+	end = 0
+	while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+		end += 1
+	a, b = a[start:len(a) - end], b[start:len(b) - end]
+	if not a or not b:
+		return len(a) + len(b) if len(a) + len(b) <= limit else over
+	if limit == 1:
+		# Both differ in their first and last character: one substitution
+		# or one swap of the only two characters is all a single edit can do
+		if len(a) == len(b) == 1 or (len(a) == len(b) == 2 and a == b[::-1]):
+			return 1
+		return over
+	n = len(b)
+	# Rows hold distances for b[:j], j = 0..n; cells outside the band stay over
+	prev2: List[int] = []
+	prev = [j if j <= limit else over for j in range(n + 1)]
+	for i in range(1, len(a) + 1):
+		lo, hi = max(1, i - limit), min(n, i + limit)
+		row = [over] * (n + 1)
+		if i <= limit:
+			row[0] = i
+		ca = a[i - 1]
+		best = row[0]
+		for j in range(lo, hi + 1):
+			cb = b[j - 1]
+			cost = prev[j - 1] + (ca != cb)
+			if prev[j] + 1 < cost:
+				cost = prev[j] + 1
+			if row[j - 1] + 1 < cost:
+				cost = row[j - 1] + 1
+			if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] + 1 < cost:
+				cost = prev2[j - 2] + 1
+			if cost > over:
+				cost = over
+			row[j] = cost
+			if cost < best:
+				best = cost
+		if best > limit:
+			return over
+		prev2, prev = prev, row
+	return prev[n] if prev[n] <= limit else over
+
+
+class TrigramIndex:
+	"""Vocabulary of tokens searchable by approximate spelling."""
+
+	def __init__(self):
+		# trigram -> token length -> tokens; the length split lets a lookup
+		# skip tokens too long or short to be within the edit limit
+		self._postings: Dict[str, Dict[int, List[str]]] = {}
+		# token -> number of distinct trigrams
+		self._tokens: Dict[str, int] = {}
+		# Deletion neighbourhood -> tokens, of the tokens short enough to be
+		# close to a word without sharing a trigram; built on first use
+		self._deletions: Optional[Dict[str, List[str]]] = None
+		# token length -> tokens, for limits beyond the neighbourhood
+		self._by_length: Dict[int, List[str]] = {}
+
+	def __len__(self) -> int:
+		return len(self._tokens)
+
+	def add(self, token: str) -> None:
+		if token in self._tokens:
+			return
+		grams = trigrams(token)
+		self._tokens[token] = len(grams)
+		self._by_length.setdefault(len(token), []).append(token)
+		for gram in grams:
+			self._postings.setdefault(gram, {}).setdefault(len(token), []).append(token)
+		if self._deletions is not None:
+			self._add_deletions(self._deletions, token, len(grams))
+
+	@staticmethod
+	def _add_deletions(index: Dict[str, List[str]], token: str, size: int) -> None:
+		if size <= 4 * _NEIGHBOURHOOD:
+			for variant in deletions(token, _NEIGHBOURHOOD):
+				index.setdefault(variant, []).append(token)
+
+	def _neighbourhood(self) -> Dict[str, List[str]]:
+		if self._deletions is None:
+			# Built aside and then published, so concurrent lookups never see
+			# a partial index (at worst two of them build it)
+			index: Dict[str, List[str]] = {}
+			for token, size in list(self._tokens.items()):
+				self._add_deletions(index, token, size)
+			self._deletions = index
+		return self._deletions
+
+	def similar(self, word: str, limit: int = -1) -> Dict[str, int]:
+		"""Tokens within ``limit`` edits of ``word`` (default :func:`max_edits`), with their distance."""
+		if limit < 0:
+			limit = max_edits(len(word))
+		if limit == 0:
+			return {word: 0} if word in self._tokens else {}
+		grams = trigrams(word)
+		shared: Dict[str, int] = {}
+		lengths = range(len(word) - limit, len(word) + limit + 1)
+		for gram in grams:
+			by_length = self._postings.get(gram)
+			if by_length is None:
+				continue
+			for length in lengths:
+				for token in by_length.get(length, ()):
+					shared[token] = shared.get(token, 0) + 1
+		# Each edit changes at most four trigrams (three, except for a swap),
+		# so the longer of the two keeps all but 4 * limit of its own
+		sizes = self._tokens
+		needed = len(grams) - 4 * limit
+		if needed <= 0:
+			# Then a token sharing no trigram at all can still be close enough
+			# (if it has few trigrams itself), and the postings never list it
+			if limit <= _NEIGHBOURHOOD:
+				neighbourhood = self._neighbourhood()
+				close = (token for variant in deletions(word, limit) for token in neighbourhood.get(variant, ()))
+			else:
+				close = (token for length in lengths for token in self._by_length.get(length, ()))
+			for token in close:
+				if sizes[token] <= 4 * limit and abs(len(token) - len(word)) <= limit:
+					shared.setdefault(token, 0)
+		found = {}
+		for token, count in shared.items():
+			if count >= needed and count >= sizes[token] - 4 * limit:
+				distance = bounded_distance(word, token, limit)
+				if distance <= limit:
+					found[token] = distance
+		return found
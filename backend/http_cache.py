@@ -0,0 +1,192 @@
+"""Conditional requests, Cache-Control and compression for read endpoints.
+
+:class:`HttpCacheMiddleware` handles the GET routes it is given a
+:class:`CacheRule` for. Every response gets a strong ``ETag`` and the
+rule's ``Cache-Control``. A request whose ``If-None-Match`` holds the
+current tag is answered with ``304 Not Modified`` and no body.
+
+A rule with a ``version`` function derives the tag from that version plus
+the path and the sorted query string. Routes whose result is a function of
+the catalog snapshot and the query (search, suggestions) use this: the tag
+is known before the endpoint runs, so a revalidation returns 304 without
+computing the result at all. A rule without ``version`` hashes the response
+body instead; the endpoint still runs, which keeps side effects such as
+recording a scan, and only the transfer is saved.
+
+Bodies of at least ``minimum_size`` bytes are compressed with brotli (when
+the ``brotli`` package is installed) or gzip, whichever the client accepts.
+Each encoding is a different representation, so its tag carries a suffix
+(``"<hash>-gzip"``); revalidating with any of them is recognised.
+"""
+import gzip
+import hashlib
+import os
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.routing import Match
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+
+
+class CacheRule:
+	"""How responses of one GET route are validated and cached by clients.
+
+	``version`` receives the query parameters and returns a string that
+	changes whenever the response for them may change; leave it out to tag
+	responses by a hash of their body.
+	"""
+
+	__slots__ = ("cache_control", "version")
+
+	def __init__(self, cache_control: str, version: Optional[Callable[[Dict[str, str]], str]] = None):
+		self.cache_control = cache_control
+		self.version = version
+
+
+def _digest(*parts: bytes) -> str:
+	h = hashlib.blake2b(digest_size=12)
+	for part in parts:
+		h.update(part)
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+def _requested_tags(value: str) -> List[str]:
+	"""Opaque parts of the tags in ``If-None-Match`` (which compares weakly)."""
+	tags = []
+	for tag in value.split(","):
+		tag = tag.strip()
+		if tag.startswith("W/"):
+			tag = tag[2:]
+		tags.append(tag.strip('"'))
+	return tags
+
+
+def _matching_tag(tags: List[str], digest: str) -> Optional[str]:
+	"""The requested tag naming any representation of ``digest``, if any."""
+	for tag in tags:
+		if tag == "*" or tag.split("-", 1)[0] == digest:
+			return f'"{tag}"' if tag != "*" else f'"{digest}"'
+	return None
+
+
+def _encoding(accept: str) -> Optional[str]:
+	"""Preferred encoding the client accepts: ``br``, ``gzip`` or None."""
+	accepted = set()
+	for item in accept.split(","):
+		name, _, params = item.strip().partition(";")
+		params = params.replace(" ", "")
+		if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+			continue
+		accepted.add(name.strip().lower())
+	if brotli is not None and "br" in accepted:
+		return "br"
+	if "gzip" in accepted or "*" in accepted:
+		return "gzip"
+	return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+	if encoding == "br":
+		return brotli.compress(body, quality=BROTLI_QUALITY)
+	return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class HttpCacheMiddleware:
+	"""ASGI middleware adding ETags, Cache-Control and compression to ``rules`` routes."""
+
+	def __init__(self, app, rules: Dict[str, CacheRule], minimum_size: int = COMPRESS_MIN_BYTES):
+		self.app = app
+		self.rules = rules
+		self.minimum_size = minimum_size
+
+	async def __call__(self, scope, receive, send):
+		rule = self.rules.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+		if rule is None:
+			await self.app(scope, receive, send)
+			return
+
+		headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+		tags = _requested_tags(headers["if-none-match"]) if "if-none-match" in headers else []
+		digest = None
+		if rule.version is not None:
+			# Sorted so the same parameters in any order share a tag
+			params = sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+			digest = _digest(rule.version(dict(params)).encode(), scope["path"].encode(), urlencode(params).encode())
+			matched = _matching_tag(tags, digest)
+			if matched is not None:
+				self._route(scope)
+				await self._not_modified(send, rule, matched)
+				return
+
+		start = None
+		chunks = []
+
+		async def buffer(message):
+			nonlocal start
+			if message["type"] == "http.response.start":
+				start = message
+			elif message["type"] == "http.response.body":
+				chunks.append(message.get("body", b""))
+				if not message.get("more_body", False):
+					await self._respond(send, rule, start, b"".join(chunks), digest, tags, headers)
+			else:
+				await send(message)
+
+		await self.app(scope, receive, buffer)
+
+	@staticmethod
+	def _route(scope) -> None:
+		# Give the metrics middleware the route template the endpoint would have had
+		for route in scope["app"].router.routes:
+			match, child = route.matches(scope)
+			if match is Match.FULL:
+				scope.update(child)
+				return
+
+	@staticmethod
+	async def _not_modified(send, rule: CacheRule, etag: str) -> None:
+		await send({"type": "http.response.start", "status": 304, "headers": [
+			(b"etag", etag.encode()),
+			(b"cache-control", rule.cache_control.encode()),
+			(b"vary", b"Accept-Encoding"),
+		]})
+		await send({"type": "http.response.body", "body": b""})
+
+	async def _respond(self, send, rule: CacheRule, start, body: bytes, digest, tags, headers) -> None:
+		if start["status"] != 200:
+			await send(start)
+			await send({"type": "http.response.body", "body": body})
+			return
+		if digest is None:
+			digest = _digest(body)
+			matched = _matching_tag(tags, digest)
+			if matched is not None:
+				await self._not_modified(send, rule, matched)
+				return
+
+		response_headers = [(name, value) for name, value in start["headers"]
+			if name.lower() not in (b"content-length", b"etag", b"cache-control")]
+		etag = f'"{digest}"'
+		already_encoded = any(name.lower() == b"content-encoding" for name, _ in response_headers)
+		encoding = _encoding(headers.get("accept-encoding", "")) if not already_encoded else None
+		if encoding is not None and len(body) >= self.minimum_size:
+			body = _compress(body, encoding)
+			etag = f'"{digest}-{encoding}"'
+			response_headers.append((b"content-encoding", encoding.encode()))
+		response_headers += [
+			(b"content-length", str(len(body)).encode()),
+			(b"etag", etag.encode()),
+			(b"cache-control", rule.cache_control.encode()),
+			(b"vary", b"Accept-Encoding"),
+		]
+		await send({**start, "headers": response_headers})
+		await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,136 @@
+"""Weighted keyword lexicon matched against search queries in one pass.
+
+The lexicon (``data/lexicon.json``, or the file named by
+``ECOSCAN_LEXICON``) maps keywords to score weights and lists category
+keywords in priority order. All keywords are compiled into one
+Aho-Corasick automaton, so scoring and categorizing a query is a single scan
+of its characters no matter how many keywords the lexicon holds.
+
+Matching keeps the semantics of the original keyword loops: a keyword
+counts once if it occurs anywhere in the query, including inside a longer
+word ("eco" in "ecological") and overlapping other keywords.
+"""
+import json
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexicon.json")
+LEXICON_PATH = os.getenv("ECOSCAN_LEXICON", DEFAULT_LEXICON)
+
+
+class KeywordMatcher:
+	"""Aho-Corasick automaton reporting which of ``keywords`` occur in a text."""
+
+	def __init__(self, keywords: Sequence[str]):
+		self.keywords = list(keywords)
+		self._goto: List[Dict[str, int]] = [{}]
+		self._fail: List[int] = [0]
+		self._out: List[Tuple[int, ...]] = [()]
+
+		for index, keyword in enumerate(self.keywords):
+			state = 0
+			for ch in keyword:
+				nxt = self._goto[state].get(ch)
+				if nxt is None:
+					nxt = self._goto[state][ch] = len(self._goto)
+					self._goto.append({})
+					self._fail.append(0)
+					self._out.append(())
+				state = nxt
+			self._out[state] += (index,)
+
+		# Breadth-first so a state's fail target is finished before it
+		queue = deque(self._goto[0].values())
+		while queue:
+			state = queue.popleft()
+			for ch, nxt in self._goto[state].items():
+				queue.append(nxt)
+				fail = self._fail[state]
+				while fail and ch not in self._goto[fail]:
+					fail = self._fail[fail]
+				# Depth-1 states fall back to the root
+				self._fail[nxt] = self._goto[fail].get(ch, 0) if state else 0
+				self._out[nxt] += self._out[self._fail[nxt]]
+
+	def __len__(self) -> int:
+		return len(self.keywords)
+
+	def find(self, text: str) -> Set[int]:
+		"""Indexes of every keyword occurring in ``text``."""
+		goto, fail, out = self._goto, self._fail, self._out
+		found: Set[int] = set()
+		state = 0
+		for ch in text:
+			while state and ch not in goto[state]:
+				state = fail[state]
+			state = goto[state].get(ch, 0)
+			if out[state]:
+				found.update(out[state])
+		return found
+
+
+class Lexicon:
+	"""Keyword weights plus prioritized category keywords, compiled once."""
+
+	def __init__(self, weights: Dict[str, int], categories: Dict[str, Iterable[str]],
+			base_score: int = 50, default_category: str = "general"):
+		self.base_score = base_score
+		self.default_category = default_category
+		keywords: Dict[str, int] = {}
+		self._weights: List[int] = []
+		self._category: List[Optional[int]] = []
+		self.categories = list(categories)
+
+		def slot(keyword: str) -> int:
+			keyword = keyword.lower()
+			if keyword not in keywords:
+				keywords[keyword] = len(self._weights)
+				self._weights.append(0)
+				self._category.append(None)
+			return keywords[keyword]
+
+		for keyword, weight in weights.items():
+			self._weights[slot(keyword)] += weight
+		for rank, category in enumerate(self.categories):
+			for keyword in categories[category]:
+				i = slot(keyword)
+				# A keyword listed under several categories belongs to the first
+				if self._category[i] is None:
+					self._category[i] = rank
+		self.matcher = KeywordMatcher(list(keywords))
+
+	@classmethod
+	def load(cls, path: str = LEXICON_PATH) -> "Lexicon":
+		with open(path, encoding="utf-8") as f:
+			data = json.load(f)
+		return cls(data.get("weights", {}), data.get("categories", {}),
+			data.get("base_score", 50), data.get("default_category", "general"))
+
+	def analyze(self, query: str) -> Tuple[int, str]:
+		"""Return ``(score, category)`` for ``query`` from one scan of it.
+
+		The score is the base score plus the weight of every keyword present,
+		clamped to 0-100; the category is the highest-priority category with
+		a keyword present.
+		"""
+		score = self.base_score
+		best = None
+		for i in self.matcher.find(query.lower()):
+			score += self._weights[i]
+			rank = self._category[i]
+			if rank is not None and (best is None or rank < best):
+				best = rank
+		category = self.default_category if best is None else self.categories[best]
+		return min(100, max(0, score)), category
+
+
+_lexicon: Optional[Lexicon] = None
+
+
+def get_lexicon() -> Lexicon:
+	"""The lexicon from ``LEXICON_PATH``, compiled on first use."""
+	global _lexicon
+	if _lexicon is None:
+		_lexicon = Lexicon.load()
+	return _lexicon
@@ -0,0 +1,200 @@
+"""Pre-forking production launcher: N uvicorn workers sharing one socket.
+
+The master imports the app and runs its ``prepare()`` hook once, so the
+catalog, search index, autocomplete and lexicon are built (and the schema
+created) a single time before forking and shared copy-on-write by every
+worker. Each worker then runs its own uvicorn server and event loop with
+its own caches, connection pools and scan writer; nothing mutable is shared.
+
+    python -m backend.launcher test_server:app --workers 4 --port 8000
+    python -m backend.launcher backend.server:app --workers 8
+
+Signals to the master:
+- ``SIGHUP`` reloads the catalog in the master, starts a new set of workers
+  from it and gracefully stops the old ones once the new ones are up.
+- ``SIGTERM`` / ``SIGINT`` stop every worker gracefully (in-flight requests
+  finish) and exit.
+Workers that die unexpectedly are replaced.
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+PRELOAD_NUMPY = os.getenv("PRELOAD_NUMPY", "1") != "0"
+
+
+def load_app(target: str):
+	module_name, _, attr = target.partition(":")
+	module = importlib.import_module(module_name)
+	return module, getattr(module, attr or "app")
+
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+	sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((host, port))
+	sock.listen(backlog)
+	sock.set_inheritable(True)
+	return sock
+
+
+def warm(module) -> None:
+	"""Run the app's startup preparation so workers inherit what it builds."""
+	prepare = getattr(module, "prepare", None)
+	if prepare is not None:
+		prepare()
+	# NumPy (batch scoring) is only worth sharing for apps that score
+	# batches; everyone else would pay its import before serving anything
+	eco_data = getattr(module, "eco_data", None)
+	if eco_data is not None and PRELOAD_NUMPY:
+		eco_data._numpy()
+
+
+def release_shared_resources(module) -> None:
+	"""Drop anything the master opened that must not be shared across forks."""
+	# Pooled DB connections opened at import (create_all, table checks) would
+	# otherwise be used by several processes at once
+	engines = [getattr(module, "engine", None)]
+	try:
+		from backend.database import engine
+		engines.append(engine)
+	except ImportError:
+		pass
+	for engine in engines:
+		if engine is not None and hasattr(engine, "dispose"):
+			engine.dispose()
+
+
+class Master:
+	def __init__(self, target: str, host: str, port: int, workers: int, log_level: str):
+		self.target = target
+		self.workers = workers
+		self.log_level = log_level
+		self.module, self.app = load_app(target)
+		warm(self.module)
+		self.sock = bind(host, port)
+		self.children: Dict[int, int] = {}  # pid -> generation
+		self.generation = 0
+		self._reload = False
+		self._stop = False
+
+	def prepare_fork(self) -> None:
+		release_shared_resources(self.module)
+		# Keep the preloaded objects out of the collector's reach so workers
+		# do not write to (and so copy) their pages during collections
+		gc.collect()
+		gc.freeze()
+
+	def spawn(self) -> int:
+		pid = os.fork()
+		if pid:
+			self.children[pid] = self.generation
+			return pid
+		# Worker: default signal handling; uvicorn installs its own
+		for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+			signal.signal(sig, signal.SIG_DFL)
+		code = 0
+		try:
+			config = uvicorn.Config(self.app, log_level=self.log_level, timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+			uvicorn.Server(config).run(sockets=[self.sock])
+		except BaseException as e:
+			print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+			code = 1
+		finally:
+			os._exit(code)
+
+	def stop_generation(self, generation: int, sig: int = signal.SIGTERM) -> None:
+		for pid, gen in list(self.children.items()):
+			if gen <= generation:
+				try:
+					os.kill(pid, sig)
+				except ProcessLookupError:
+					pass
+
+	def reap(self) -> None:
+		while True:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except ChildProcessError:
+				return
+			if pid == 0:
+				return
+			generation = self.children.pop(pid, None)
+			if generation == self.generation and not self._stop:
+				print(f"Worker {pid} exited ({status}); starting a replacement", file=sys.stderr)
+				self.spawn()
+
+	def reload(self) -> None:
+		"""Load a fresh catalog snapshot and roll the workers onto it."""
+		store = getattr(self.module, "catalog_store", None)
+		if store is not None:
+			try:
+				store.reload(force=True)
+				print(f"Reloaded catalog: {len(store.current)} products")
+			except Exception as e:
+				# Keep serving the old snapshot rather than restarting into nothing
+				print(f"Error reloading catalog: {e}", file=sys.stderr)
+				return
+		gc.unfreeze()
+		self.prepare_fork()
+		old = self.generation
+		self.generation += 1
+		for _ in range(self.workers):
+			self.spawn()
+		# New workers accept on the shared socket as soon as they start;
+		# old ones stop accepting, finish in-flight requests and exit
+		time.sleep(1.0)
+		self.stop_generation(old)
+
+	def run(self) -> None:
+		signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_reload", True))
+		signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stop", True))
+		signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stop", True))
+
+		self.prepare_fork()
+		for _ in range(self.workers):
+			self.spawn()
+		host, port = self.sock.getsockname()[:2]
+		print(f"Serving {self.target} on http://{host}:{port} with {self.workers} workers (master {os.getpid()})")
+
+		while not self._stop:
+			if self._reload:
+				self._reload = False
+				self.reload()
+			self.reap()
+			time.sleep(0.2)
+
+		self.stop_generation(self.generation)
+		deadline = time.monotonic() + GRACEFUL_TIMEOUT
+		while self.children and time.monotonic() < deadline:
+			self.reap()
+			time.sleep(0.1)
+		self.stop_generation(self.generation, signal.SIGKILL)
+		self.sock.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("app", nargs="?", default="test_server:app", help="module:attribute of the ASGI app")
+	parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+	parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+	parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: WEB_CONCURRENCY or CPU count)")
+	parser.add_argument("--log-level", default="warning")
+	args = parser.parse_args()
+
+	sys.path.insert(0, os.getcwd())
+	Master(args.app, args.host, args.port, max(1, args.workers), args.log_level).run()
+
+
+if __name__ == "__main__":
+	main()
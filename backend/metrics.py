@@ -0,0 +1,219 @@
+"""In-process latency histograms exposed in Prometheus text format.
+
+:class:`MetricsMiddleware` times every HTTP request by method, route
+template and status, and :func:`span` times the phases inside a request
+(upstream lookups, index filtering, scoring, serialization). Both feed
+fixed-bucket histograms that cost a ``bisect`` and a few integer updates per
+observation; :func:`render` formats them for ``GET /metrics``.
+
+When ``PROFILE_REQUESTS`` is enabled, a request carrying an ``X-Profile``
+header is also run under :class:`SamplingProfiler`. The collapsed stacks
+are written to ``PROFILE_DIR`` (flamegraph.pl / speedscope format) and the
+file name is returned in the ``X-Profile-Output`` response header.
+"""
+import bisect
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "").lower() in ("1", "true", "yes", "on")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ecoscan-profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+# Seconds; covers cache hits (~10us) up to a full upstream timeout
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+	0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Series:
+	__slots__ = ("counts", "sum", "count")
+
+	def __init__(self, buckets: int):
+		self.counts = [0] * (buckets + 1)
+		self.sum = 0.0
+		self.count = 0
+
+
+class Histogram:
+	"""Prometheus histogram with one series per combination of label values."""
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self.buckets = tuple(buckets)
+		self._series: Dict[Tuple[str, ...], _Series] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, *labels: str) -> None:
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			series = self._series.get(labels)
+			if series is None:
+				series = self._series[labels] = _Series(len(self.buckets))
+			series.counts[index] += 1
+			series.sum += value
+			series.count += 1
+
+	def render(self, lines: List[str]) -> None:
+		lines.append(f"# HELP {self.name} {self.help}")
+		lines.append(f"# TYPE {self.name} histogram")
+		with self._lock:
+			snapshot = [(labels, list(s.counts), s.sum, s.count) for labels, s in self._series.items()]
+		for labels, counts, total, count in sorted(snapshot):
+			label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+			prefix = label_str + "," if label_str else ""
+			cumulative = 0
+			for bound, n in zip(self.buckets, counts):
+				cumulative += n
+				lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+			lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+			lines.append(f"{self.name}_sum{{{label_str}}} {total:.9g}")
+			lines.append(f"{self.name}_count{{{label_str}}} {count}")
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+	"ecoscan_http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route", "status"))
+SPAN_SECONDS = Histogram(
+	"ecoscan_span_duration_seconds", "Time spent in instrumented phases of a request.", ("span",))
+PROVIDER_SECONDS = Histogram(
+	"ecoscan_provider_duration_seconds", "Time spent waiting on each upstream provider.", ("provider", "outcome"))
+
+REGISTRY = [REQUEST_SECONDS, SPAN_SECONDS, PROVIDER_SECONDS]
+
+
+class span:
+	"""``with span("search_index"): ...`` records the block's duration."""
+
+	__slots__ = ("name", "start")
+
+	def __init__(self, name: str):
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		SPAN_SECONDS.observe(time.perf_counter() - self.start, self.name)
+		return False
+
+
+def render() -> str:
+	"""All histograms in the Prometheus text exposition format."""
+	lines: List[str] = []
+	for histogram in REGISTRY:
+		histogram.render(lines)
+	return "\n".join(lines) + "\n"
+
+
+# Innermost frames of threads that are idle rather than doing work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+class SamplingProfiler:
+	"""Samples the stacks of all other threads every ``interval`` seconds.
+
+	Stacks are counted in collapsed form (``outer;...;inner``). Idle threads
+	(blocked in a queue, lock or selector) are skipped, so on a quiet server
+	the samples show what the profiled request was doing. Given an
+	``output`` path, the sampling thread writes the stacks there itself once
+	stopped, so the caller (an event loop) does no file I/O.
+	"""
+
+	def __init__(self, interval: float = PROFILE_INTERVAL, output: Optional[str] = None):
+		self.interval = interval
+		self.output = output
+		self.stacks: Counter = Counter()
+		self.samples = 0
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+		self._thread.start()
+
+	def stop(self, wait: bool = True) -> None:
+		self._stop.set()
+		if wait and self._thread is not None:
+			self._thread.join()
+
+	def _run(self) -> None:
+		own = threading.get_ident()
+		while not self._stop.wait(self.interval):
+			self.samples += 1
+			for thread_id, frame in sys._current_frames().items():
+				if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+					continue
+				self.stacks[self._collapse(frame)] += 1
+		if self.output is not None:
+			try:
+				self.write(self.output)
+			except OSError as e:
+				print(f"Error writing profile {self.output}: {e}")
+
+	@staticmethod
+	def _collapse(frame) -> str:
+		names = []
+		while frame is not None:
+			code = frame.f_code
+			names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+			frame = frame.f_back
+		return ";".join(reversed(names))
+
+	def write(self, path: str) -> None:
+		os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+		with open(path, "w", encoding="utf-8") as f:
+			for stack, count in self.stacks.most_common():
+				f.write(f"{stack} {count}\n")
+
+
+class MetricsMiddleware:
+	"""ASGI middleware recording request latency, plus opt-in profiling."""
+
+	def __init__(self, app, profile: bool = PROFILE_REQUESTS):
+		self.app = app
+		self.profile = profile
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+
+		profiler = output = None
+		if self.profile and any(name == b"x-profile" for name, _ in scope["headers"]):
+			output = os.path.join(PROFILE_DIR, f"{uuid.uuid4().hex}.folded")
+			profiler = SamplingProfiler(output=output)
+			profiler.start()
+
+		status = 500
+
+		async def send_wrapper(message):
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = message["status"]
+				if output is not None:
+					message["headers"] = list(message.get("headers", [])) + [(b"x-profile-output", output.encode())]
+			await send(message)
+
+		start = time.perf_counter()
+		try:
+			await self.app(scope, receive, send_wrapper)
+		finally:
+			# The route template, not the raw path, keeps label cardinality bounded
+			route = getattr(scope.get("route"), "path", "unmatched")
+			REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status))
+			if profiler is not None:
+				# The sampling thread writes the file on its way out
+				profiler.stop(wait=False)
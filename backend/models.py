@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, JSON
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, JSON, inspect
 try:
 	from .database import Base
 except ImportError:
@@ -12,3 +14,89 @@ class Scan(Base):
     barcode = Column(String, index=True)
     score = Column(Integer)
     breakdown = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Product(Base):
+    """Locally ingested product (see off_ingest.py), keyed by barcode."""
+    __tablename__ = "products"
+
+    barcode = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    brand = Column(String)
+    category = Column(String)
+    score = Column(Integer)
+    carbon = Column(Integer)
+    water = Column(Integer)
+    other = Column(Integer)
+    image = Column(String)
+
+
+class IngestProgress(Base):
+    """Lines of a dump file already loaded, so an interrupted ingest can resume."""
+    __tablename__ = "ingest_progress"
+
+    source = Column(String, primary_key=True)
+    lines = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ScoreHistogram:
+    """Scans, score sum and scans per score decile: b0 (0-9) up to b9 (90-100)."""
+    scans = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    b0 = Column(Integer, nullable=False, default=0)
+    b1 = Column(Integer, nullable=False, default=0)
+    b2 = Column(Integer, nullable=False, default=0)
+    b3 = Column(Integer, nullable=False, default=0)
+    b4 = Column(Integer, nullable=False, default=0)
+    b5 = Column(Integer, nullable=False, default=0)
+    b6 = Column(Integer, nullable=False, default=0)
+    b7 = Column(Integer, nullable=False, default=0)
+    b8 = Column(Integer, nullable=False, default=0)
+    b9 = Column(Integer, nullable=False, default=0)
+
+
+class ScanRollup(ScoreHistogram, Base):
+    """Scans per hour and barcode, kept up to date by the scan writer (see scan_stats.py)."""
+    __tablename__ = "scan_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    barcode = Column(String, primary_key=True)
+    category = Column(String, nullable=False)
+
+    __table_args__ = (Index("ix_scan_rollups_barcode_hour", "barcode", "hour"),)
+
+
+class CategoryRollup(ScoreHistogram, Base):
+    """Scans per hour and product category (see scan_stats.py)."""
+    __tablename__ = "scan_category_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    category = Column(String, primary_key=True)
+
+
+# Columns added to tables that existing databases already have; create_all
+# only creates missing tables, so upgrade_schema adds these in place
+_ADDED_COLUMNS = [
+    (Scan.__table__, "created_at"),
+]
+
+
+def upgrade_schema(engine) -> None:
+    """Add columns (and their indexes) missing from tables created by older versions.
+
+    Idempotent: columns and indexes that exist are left alone. Existing rows
+    get NULL in new columns.
+    """
+    for table, name in _ADDED_COLUMNS:
+        inspector = inspect(engine)
+        if not inspector.has_table(table.name):
+            continue
+        if name not in {column["name"] for column in inspector.get_columns(table.name)}:
+            column = table.c[name]
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(engine.dialect)}")
+        for index in table.indexes:
+            if name in index.columns:
+                index.create(bind=engine, checkfirst=True)
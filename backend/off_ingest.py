@@ -0,0 +1,185 @@
+"""Load an OpenFoodFacts dump into the local ``products`` table.
+
+Reads the JSONL export (``openfoodfacts-products.jsonl.gz``) or the
+tab-separated CSV export (``en.openfoodfacts.org.products.csv.gz``), plain
+or gzipped, one line at a time. Batches of lines are parsed and scored with
+``calculate_food_sustainability_score`` in a process pool and upserted in
+file order; only a bounded number of batches is in flight, so memory stays
+flat however large the dump is.
+
+After each batch the number of lines consumed is committed together with
+the rows, so rerunning the same command after an interruption skips what is
+already loaded:
+
+    python -m backend.off_ingest openfoodfacts-products.jsonl.gz
+    python -m backend.off_ingest en.openfoodfacts.org.products.csv.gz --workers 8
+"""
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+	from . import models
+	from .database import engine as default_engine
+	from .eco_data import calculate_food_sustainability_score
+	from .product_store import ensure_search_index
+except ImportError:
+	import models
+	from database import engine as default_engine
+	from eco_data import calculate_food_sustainability_score
+	from product_store import ensure_search_index
+
+
+BATCH_LINES = 5000
+
+# The CSV export is huge-fielded; the default 128 KB limit is too small
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+
+def open_dump(path: str):
+	if path.endswith(".gz"):
+		return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+	return open(path, encoding="utf-8", errors="replace")
+
+
+def is_csv(path: str) -> bool:
+	name = path[:-3] if path.endswith(".gz") else path
+	return name.endswith((".csv", ".tsv"))
+
+
+def _row(record: Dict) -> Optional[Dict]:
+	code = str(record.get("code") or "").strip()
+	name = str(record.get("product_name") or "").strip()
+	if not code or len(name) <= 2:
+		return None
+	score = calculate_food_sustainability_score(record)
+	return {
+		"barcode": code,
+		"name": name,
+		"brand": str(record.get("brands") or "").split(",")[0].strip() or None,
+		"category": "food",
+		"score": score,
+		# Same breakdown the live OpenFoodFacts provider reports
+		"carbon": max(0, 50 - score),
+		"water": max(0, 30 - score),
+		"other": max(0, 20 - score),
+		"image": record.get("image_url") or record.get("image_front_url") or "",
+	}
+
+
+def parse_batch(lines: Sequence[str], header: Optional[Sequence[str]] = None) -> List[Dict]:
+	"""Parse and score one batch of dump lines (runs in a worker process).
+
+	``header`` holds the CSV column names; without it lines are JSON.
+	"""
+	rows = {}
+	for line in lines:
+		if header is not None:
+			record = dict(zip(header, line.rstrip("\n").split("\t")))
+		else:
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+		row = _row(record)
+		if row is not None:
+			# A barcode repeated within a batch would fail the upsert; keep the last
+			rows[row["barcode"]] = row
+	return list(rows.values())
+
+
+def _upsert(conn, rows: List[Dict]) -> None:
+	if not rows:
+		return
+	table = models.Product.__table__
+	dialect = conn.engine.dialect.name
+	if dialect not in ("sqlite", "postgresql"):
+		conn.execute(table.delete().where(table.c.barcode.in_([r["barcode"] for r in rows])))
+		conn.execute(table.insert(), rows)
+		return
+	stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+	updates = {c.name: stmt.excluded[c.name] for c in table.columns if c.name != "barcode"}
+	conn.execute(stmt.on_conflict_do_update(index_elements=["barcode"], set_=updates), rows)
+
+
+def _batches(lines: Iterator[str], size: int) -> Iterator[List[str]]:
+	while True:
+		batch = list(itertools.islice(lines, size))
+		if not batch:
+			return
+		yield batch
+
+
+def ingest(path: str, engine=default_engine, workers: Optional[int] = None, batch_lines: int = BATCH_LINES,
+		restart: bool = False) -> int:
+	"""Ingest ``path``, resuming from its checkpoint; returns rows written."""
+	ensure_search_index(engine)
+	progress = models.IngestProgress.__table__
+	models.Base.metadata.create_all(bind=engine, tables=[progress])
+	source = os.path.realpath(path)
+
+	with engine.begin() as conn:
+		done = 0 if restart else conn.execute(select(progress.c.lines).where(progress.c.source == source)).scalar() or 0
+		if done == 0:
+			conn.execute(progress.delete().where(progress.c.source == source))
+			conn.execute(progress.insert(), {"source": source, "lines": 0})
+
+	workers = workers or os.cpu_count() or 1
+	written = 0
+	start = time.perf_counter()
+	with open_dump(path) as f, ProcessPoolExecutor(max_workers=workers) as pool:
+		header = f.readline().rstrip("\n").split("\t") if is_csv(path) else None
+		lines = iter(f)
+		if done:
+			print(f"resuming after {done:,} lines")
+			for _ in itertools.islice(lines, done):
+				pass
+
+		def write(count: int, future) -> None:
+			nonlocal done, written
+			rows = future.result()
+			done += count
+			with engine.begin() as conn:
+				_upsert(conn, rows)
+				conn.execute(progress.update().where(progress.c.source == source).values(lines=done))
+			written += len(rows)
+			elapsed = time.perf_counter() - start
+			print(f"{done:,} lines, {written:,} products ({written / elapsed:,.0f}/s)", end="\r", flush=True)
+
+		# Keep a few batches per worker queued; results are written in file order
+		in_flight = deque()
+		for batch in _batches(lines, batch_lines):
+			in_flight.append((len(batch), pool.submit(parse_batch, batch, header)))
+			if len(in_flight) >= workers * 2:
+				write(*in_flight.popleft())
+		while in_flight:
+			write(*in_flight.popleft())
+	print()
+	return written
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("path", help="JSONL or tab-separated CSV dump, optionally .gz")
+	parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+	parser.add_argument("--batch-lines", type=int, default=BATCH_LINES)
+	parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first line")
+	args = parser.parse_args()
+
+	written = ingest(args.path, workers=args.workers, batch_lines=args.batch_lines, restart=args.restart)
+	print(f"loaded {written:,} products from {args.path}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,131 @@
+"""Read access to the locally ingested ``products`` table.
+
+:meth:`ProductStore.get` is a primary-key lookup by barcode, optionally
+behind a bounded hot-key cache (scans are heavily skewed towards a few
+popular products; unknown barcodes are cached too), and
+:meth:`ProductStore.search` a full-text match on name and brand, backed by
+an FTS5 table on SQLite or a GIN ``tsvector`` index on Postgres (both
+created by :func:`ensure_search_index`). Results use the same product dict
+shape as the upstream providers, so /api/search can serve them directly.
+"""
+import re
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Engine
+
+try:
+	from . import models
+	from .cache import TTLCache
+except ImportError:
+	import models
+	from cache import TTLCache
+
+
+_products = models.Product.__table__
+_MISSING = object()
+
+# How long to wait before checking again for a table that did not exist
+_RECHECK_SECONDS = 60.0
+
+_SQLITE_FTS = [
+	"CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+	"name, brand, content='products', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+	"CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+	"INSERT INTO products_fts(rowid, name, brand) VALUES (new.rowid, new.name, new.brand); END",
+	"CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+	"INSERT INTO products_fts(products_fts, rowid, name, brand) VALUES ('delete', old.rowid, old.name, old.brand); END",
+	"CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN "
+	"INSERT INTO products_fts(products_fts, rowid, name, brand) VALUES ('delete', old.rowid, old.name, old.brand); "
+	"INSERT INTO products_fts(rowid, name, brand) VALUES (new.rowid, new.name, new.brand); END",
+]
+
+_PG_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(brand, ''))"
+
+
+def ensure_search_index(engine: Engine) -> None:
+	"""Create the products table and its full-text index if missing."""
+	models.Base.metadata.create_all(bind=engine, tables=[_products])
+	with engine.begin() as conn:
+		if engine.dialect.name == "sqlite":
+			for statement in _SQLITE_FTS:
+				conn.execute(text(statement))
+		elif engine.dialect.name == "postgresql":
+			conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING gin ({_PG_DOCUMENT})"))
+
+
+def to_product(row) -> Dict:
+	"""Product dict (as returned by /api/search) for a ``products`` row."""
+	return {
+		"id": f"off_{row.barcode}",
+		"name": row.name,
+		"brand": row.brand or "Unknown Brand",
+		"category": row.category or "food",
+		"score": row.score,
+		"breakdown": {"carbon": row.carbon, "water": row.water, "other": row.other},
+		"image": row.image or "",
+		"alternatives": [],
+	}
+
+
+class ProductStore:
+	"""Barcode lookups and full-text search over ingested products."""
+
+	def __init__(self, engine: Engine, cache: Optional[TTLCache] = None):
+		self.engine = engine
+		self.cache = cache
+		self._ready = False
+		self._checked_at = float("-inf")
+
+	def available(self) -> bool:
+		"""Whether the table (and on SQLite the FTS index) exists.
+
+		A missing table is re-checked at most once a minute, so a server
+		started before the first ingest picks the data up without a restart.
+		"""
+		if self._ready:
+			return True
+		now = time.monotonic()
+		if now - self._checked_at < _RECHECK_SECONDS:
+			return False
+		self._checked_at = now
+		tables = set(inspect(self.engine).get_table_names())
+		needed = {"products", "products_fts"} if self.engine.dialect.name == "sqlite" else {"products"}
+		self._ready = needed <= tables
+		return self._ready
+
+	def get(self, barcode: str) -> Optional[Dict]:
+		"""The product with this barcode, or None if it is not in the table."""
+		if self.cache is not None:
+			product = self.cache.get(barcode, _MISSING)
+			if product is not _MISSING:
+				# Unknown barcodes are cached as {} (with the cache's negative TTL)
+				return product or None
+		if not self.available():
+			return None
+		with self.engine.connect() as conn:
+			row = conn.execute(select(_products).where(_products.c.barcode == barcode)).first()
+		product = None if row is None else to_product(row)
+		if self.cache is not None:
+			self.cache.set(barcode, product or {})
+		return product
+
+	def search(self, query: str, limit: int = 20) -> List[Dict]:
+		"""Products whose name or brand contain every word of ``query`` (as a prefix)."""
+		words = re.findall(r"\w+", query.lower())
+		if not words or not self.available():
+			return []
+		with self.engine.connect() as conn:
+			if self.engine.dialect.name == "sqlite":
+				match = " ".join(f'"{word}"*' for word in words)
+				rows = conn.execute(text(
+					"SELECT p.* FROM products_fts JOIN products p ON p.rowid = products_fts.rowid "
+					"WHERE products_fts MATCH :match ORDER BY products_fts.rank, p.score DESC LIMIT :limit"
+				), {"match": match, "limit": limit})
+			else:
+				rows = conn.execute(text(
+					f"SELECT * FROM products WHERE {_PG_DOCUMENT} @@ to_tsquery('simple', :match) "
+					"ORDER BY score DESC LIMIT :limit"
+				), {"match": " & ".join(f"{word}:*" for word in words), "limit": limit})
+			return [to_product(row) for row in rows]
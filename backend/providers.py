@@ -0,0 +1,290 @@
+"""Async upstream product providers used by /api/search.
+
+All sources are queried concurrently through one pooled ``httpx`` client.
+:func:`fan_out` returns the first non-empty result that arrives within the
+request deadline and cancels the remaining lookups, so one slow source no
+longer delays the others.
+
+Base URLs can be overridden with environment variables, which is how the
+providers are pointed at a local stub server (see
+``benchmarks/stub_upstream.py``). Edamam and Spoonacular are only queried
+when their API credentials are configured.
+"""
+import asyncio
+import os
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+	import httpx
+
+try:
+	from .breaker import CircuitBreaker, CircuitOpenError, log_change
+	from .cache import TTLCache, cached
+	from .eco_data import calculate_food_sustainability_score
+	from .metrics import PROVIDER_SECONDS
+except ImportError:
+	from breaker import CircuitBreaker, CircuitOpenError, log_change
+	from cache import TTLCache, cached
+	from eco_data import calculate_food_sustainability_score
+	from metrics import PROVIDER_SECONDS
+
+
+OPENFOODFACTS_URL = os.getenv("OPENFOODFACTS_URL", "https://world.openfoodfacts.org")
+EDAMAM_URL = os.getenv("EDAMAM_URL", "https://api.edamam.com")
+SPOONACULAR_URL = os.getenv("SPOONACULAR_URL", "https://api.spoonacular.com")
+
+EDAMAM_APP_ID = os.getenv("EDAMAM_APP_ID", "")
+EDAMAM_APP_KEY = os.getenv("EDAMAM_APP_KEY", "")
+SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY", "")
+
+# Seconds a single source may take, and the budget for the whole fan-out
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "5"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "5"))
+MAX_CONNECTIONS = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100"))
+
+# Responses are cached per (provider, query). Empty results, which include
+# failed lookups, are kept for a shorter time so a recovering source is
+# retried soon without being hammered while it is down.
+provider_cache = TTLCache(
+	max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+	ttl=float(os.getenv("CACHE_TTL", "600")),
+	negative_ttl=float(os.getenv("CACHE_NEGATIVE_TTL", "30")),
+	stale_ttl=float(os.getenv("CACHE_STALE_TTL", "300")),
+)
+
+# One breaker per source; see breaker.py for the BREAKER_* settings
+breakers: Dict[str, CircuitBreaker] = {
+	name: CircuitBreaker(name, on_change=log_change) for name in ("openfoodfacts", "edamam", "spoonacular")
+}
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_client() -> "httpx.AsyncClient":
+	"""Return the shared HTTP client, creating it on first use."""
+	global _client
+	if _client is None or _client.is_closed:
+		# Imported here: httpx costs ~60 ms of import, which would otherwise
+		# land on app startup before any provider is queried
+		import httpx
+		_client = httpx.AsyncClient(
+			limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+			timeout=PROVIDER_TIMEOUT,
+		)
+	return _client
+
+
+async def close_client() -> None:
+	"""Close the shared HTTP client (call on application shutdown)."""
+	global _client
+	if _client is not None:
+		await _client.aclose()
+		_client = None
+
+
+async def _get(name: str, url: str, params: Dict, timeout: float) -> "httpx.Response":
+	"""GET through ``name``'s circuit breaker with its adaptive timeout.
+
+	Raises :class:`CircuitOpenError` without touching the network while the
+	breaker is open. Transport errors, timeouts and 5xx/429 answers count as
+	failures.
+	"""
+	breaker = breakers[name]
+	admission = breaker.allow()
+	if admission is None:
+		raise CircuitOpenError(f"{name} circuit is open")
+	start = time.perf_counter()
+	try:
+		response = await get_client().get(url, params=params, timeout=breaker.timeout(timeout, admission))
+	except asyncio.CancelledError:
+		# fan_out picked another source; says nothing about this one
+		breaker.release(admission)
+		raise
+	except Exception:
+		breaker.record(admission, time.perf_counter() - start, failed=True)
+		raise
+	breaker.record(admission, time.perf_counter() - start, failed=response.status_code >= 500 or response.status_code == 429)
+	return response
+
+
+def breaker_stats() -> Dict[str, Dict]:
+	"""State and counters of every provider's circuit breaker."""
+	return {
+		name: dict(breaker.stats(), timeout=round(breaker.timeout(PROVIDER_TIMEOUT), 3))
+		for name, breaker in breakers.items()
+	}
+
+
+def _food_product(product_id: str, name: str, brand: str, score: int, image: str) -> Dict:
+	return {
+		"id": product_id,
+		"name": name,
+		"brand": brand,
+		"category": "food",
+		"score": score,
+		"breakdown": {
+			"carbon": max(0, 50 - score),
+			"water": max(0, 30 - score),
+			"other": max(0, 20 - score)
+		},
+		"image": image,
+		"alternatives": []
+	}
+
+
+@cached(provider_cache, "openfoodfacts")
+async def search_openfoodfacts(query: str, timeout: float = PROVIDER_TIMEOUT) -> List[Dict]:
+	"""Search OpenFoodFacts database for food products"""
+	try:
+		response = await _get(
+			"openfoodfacts",
+			f"{OPENFOODFACTS_URL}/cgi/search.pl",
+			{"search_terms": query, "search_simple": 1, "action": "process", "json": 1},
+			timeout,
+		)
+		if response.status_code == 200:
+			products = []
+			for item in response.json().get('products', [])[:3]:  # Limit to 3 results
+				if item.get('product_name') and len(item.get('product_name', '')) > 2:
+					products.append(_food_product(
+						f"off_{item.get('code', '')}",
+						item.get('product_name', 'Unknown Product'),
+						item.get('brands', 'Unknown Brand'),
+						calculate_food_sustainability_score(item),
+						item.get('image_url', ''),
+					))
+			return products
+	except CircuitOpenError:
+		# Not cached: the source should be retried once the breaker closes
+		raise
+	except Exception as e:
+		print(f"Error searching OpenFoodFacts: {e}")
+	return []
+
+
+@cached(provider_cache, "edamam")
+async def search_edamam_foods(query: str, timeout: float = PROVIDER_TIMEOUT) -> List[Dict]:
+	"""Search Edamam API for food products"""
+	if not (EDAMAM_APP_ID and EDAMAM_APP_KEY):
+		return []
+	try:
+		response = await _get(
+			"edamam",
+			f"{EDAMAM_URL}/api/food-database/v2/parser",
+			{"app_id": EDAMAM_APP_ID, "app_key": EDAMAM_APP_KEY, "ingr": query},
+			timeout,
+		)
+		if response.status_code == 200:
+			products = []
+			for hint in response.json().get('hints', [])[:3]:
+				food = hint.get('food', {})
+				if food.get('label'):
+					products.append(_food_product(
+						f"edamam_{food.get('foodId', '')}",
+						food['label'],
+						food.get('brand', 'Unknown Brand'),
+						calculate_food_sustainability_score(food),
+						food.get('image', ''),
+					))
+			return products
+	except CircuitOpenError:
+		# Not cached: the source should be retried once the breaker closes
+		raise
+	except Exception as e:
+		print(f"Error searching Edamam: {e}")
+	return []
+
+
+@cached(provider_cache, "spoonacular")
+async def search_spoonacular(query: str, timeout: float = PROVIDER_TIMEOUT) -> List[Dict]:
+	"""Search Spoonacular API for food products"""
+	if not SPOONACULAR_API_KEY:
+		return []
+	try:
+		response = await _get(
+			"spoonacular",
+			f"{SPOONACULAR_URL}/food/products/search",
+			{"query": query, "apiKey": SPOONACULAR_API_KEY},
+			timeout,
+		)
+		if response.status_code == 200:
+			products = []
+			for item in response.json().get('products', [])[:3]:
+				if item.get('title'):
+					products.append(_food_product(
+						f"spoon_{item.get('id', '')}",
+						item['title'],
+						'Unknown Brand',
+						calculate_food_sustainability_score({}),
+						item.get('image', ''),
+					))
+			return products
+	except CircuitOpenError:
+		# Not cached: the source should be retried once the breaker closes
+		raise
+	except Exception as e:
+		print(f"Error searching Spoonacular: {e}")
+	return []
+
+
+Provider = Callable[[str, float], Awaitable[List[Dict]]]
+
+
+async def _timed(name: str, lookup: Awaitable[List[Dict]]) -> List[Dict]:
+	# Per-provider latency for /metrics, including lookups fan_out cancels
+	start = time.perf_counter()
+	outcome = "error"
+	try:
+		result = await lookup
+		outcome = "ok" if result else "empty"
+		return result
+	except asyncio.CancelledError:
+		outcome = "cancelled"
+		raise
+	except CircuitOpenError:
+		outcome = "open"
+		raise
+	finally:
+		PROVIDER_SECONDS.observe(time.perf_counter() - start, name, outcome)
+
+
+# In priority order: when several sources answer together the first one wins
+PROVIDERS: List[Tuple[str, Provider]] = [
+	("openfoodfacts", search_openfoodfacts),
+	("edamam", search_edamam_foods),
+	("spoonacular", search_spoonacular),
+]
+
+
+async def fan_out(query: str, deadline: float = SEARCH_DEADLINE, providers: Optional[List[Tuple[str, Provider]]] = None) -> List[Dict]:
+	"""Query all providers concurrently and return the first non-empty result.
+
+	Each source gets at most ``PROVIDER_TIMEOUT`` seconds and the whole call
+	at most ``deadline`` seconds; lookups still running once a result has
+	been chosen (or the deadline passes) are cancelled.
+	"""
+	providers = PROVIDERS if providers is None else providers
+	loop = asyncio.get_running_loop()
+	end = loop.time() + deadline
+	timeout = min(PROVIDER_TIMEOUT, deadline)
+	priority = {}
+	for rank, (name, provider) in enumerate(providers):
+		priority[asyncio.ensure_future(_timed(name, provider(query, timeout)))] = rank
+
+	pending = set(priority)
+	try:
+		while pending:
+			remaining = end - loop.time()
+			if remaining <= 0:
+				break
+			done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+			for task in sorted(done, key=priority.get):
+				if task.cancelled() or task.exception() is not None:
+					continue
+				if task.result():
+					return task.result()
+	finally:
+		for task in pending:
+			task.cancel()
+	return []
@@ -0,0 +1,88 @@
+"""Streaming export of the scan history table.
+
+Rows are read through a server-side cursor (``stream_results``) in fixed
+size partitions and encoded as they arrive, so exporting millions of scans
+uses the same memory as exporting a few thousand.
+"""
+import csv
+import io
+import json
+import os
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import select
+
+try:
+	from . import models
+except ImportError:
+	import models
+
+
+EXPORT_BATCH = int(os.getenv("SCAN_EXPORT_BATCH", "1000"))
+
+CSV_COLUMNS = ["id", "barcode", "score", "carbon", "water", "other", "created_at"]
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _query(barcode_prefix: str, min_score: Optional[int], max_score: Optional[int]):
+	scan = models.Scan
+	stmt = select(scan.id, scan.barcode, scan.score, scan.breakdown, scan.created_at).order_by(scan.id)
+	if barcode_prefix:
+		stmt = stmt.where(scan.barcode.startswith(barcode_prefix, autoescape=True))
+	if min_score is not None:
+		stmt = stmt.where(scan.score >= min_score)
+	if max_score is not None:
+		stmt = stmt.where(scan.score <= max_score)
+	# yield_per stops the ORM from pre-buffering the whole result
+	return stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH)
+
+
+def _partitions(session_factory: Callable, barcode_prefix: str, min_score: Optional[int], max_score: Optional[int]):
+	session = session_factory()
+	try:
+		result = session.execute(_query(barcode_prefix, min_score, max_score))
+		for rows in result.partitions(EXPORT_BATCH):
+			yield rows
+	finally:
+		session.close()
+
+
+def iter_export(
+	session_factory: Callable,
+	fmt: str = "ndjson",
+	barcode_prefix: str = "",
+	min_score: Optional[int] = None,
+	max_score: Optional[int] = None,
+) -> Iterator[str]:
+	"""Yield the matching scans encoded as NDJSON lines or CSV, one chunk per partition."""
+	partitions = _partitions(session_factory, barcode_prefix, min_score, max_score)
+	if fmt == "csv":
+		buf = io.StringIO()
+		writer = csv.writer(buf)
+		writer.writerow(CSV_COLUMNS)
+		for rows in partitions:
+			for r in rows:
+				breakdown = r.breakdown or {}
+				writer.writerow([
+					r.id, r.barcode, r.score,
+					breakdown.get("carbon"), breakdown.get("water"), breakdown.get("other"),
+					r.created_at.isoformat() if r.created_at else "",
+				])
+			yield buf.getvalue()
+			buf.seek(0)
+			buf.truncate()
+		if buf.tell():
+			yield buf.getvalue()
+		return
+
+	for rows in partitions:
+		yield "".join(
+			json.dumps({
+				"id": r.id,
+				"barcode": r.barcode,
+				"score": r.score,
+				"breakdown": r.breakdown,
+				"created_at": r.created_at.isoformat() if r.created_at else None,
+			}) + "\n"
+			for r in rows
+		)
@@ -0,0 +1,132 @@
+"""Write-behind persistence for scan history.
+
+Request handlers hand scans to :class:`ScanWriter`, which queues them and
+inserts them from a background thread in batches (one executemany per
+batch) instead of committing once per request. When the queue is full,
+:meth:`ScanWriter.submit` blocks for up to ``put_timeout`` seconds and then
+raises ``queue.Full`` so callers can shed load.
+
+Each batch is also added to the hourly ``scan_rollups`` (see scan_stats.py)
+in the same transaction; set ``SCAN_ROLLUPS=0`` to skip that.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+
+try:
+	from . import models, scan_stats
+except ImportError:
+	import models
+	import scan_stats
+
+
+FLUSH_SIZE = int(os.getenv("SCAN_FLUSH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("SCAN_FLUSH_INTERVAL", "1.0"))
+QUEUE_SIZE = int(os.getenv("SCAN_QUEUE_SIZE", "10000"))
+PUT_TIMEOUT = float(os.getenv("SCAN_QUEUE_TIMEOUT", "0.5"))
+ROLLUPS = os.getenv("SCAN_ROLLUPS", "1").lower() not in ("0", "false", "no", "off")
+
+_STOP = object()
+
+
+class ScanWriter:
+	"""Batch ``Scan`` inserts on a background thread."""
+
+	def __init__(
+		self,
+		session_factory: Callable,
+		flush_size: int = FLUSH_SIZE,
+		flush_interval: float = FLUSH_INTERVAL,
+		max_queue: int = QUEUE_SIZE,
+		put_timeout: float = PUT_TIMEOUT,
+		rollups: bool = ROLLUPS,
+	):
+		self.session_factory = session_factory
+		self.flush_size = flush_size
+		self.flush_interval = flush_interval
+		self.put_timeout = put_timeout
+		self.rollups = rollups
+		self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+		self._thread: Optional[threading.Thread] = None
+		self.written = 0
+		self.failed = 0
+		self.batches = 0
+
+	def start(self) -> None:
+		if self._thread is None or not self._thread.is_alive():
+			self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+			self._thread.start()
+
+	def stop(self, timeout: Optional[float] = None) -> None:
+		"""Flush everything still queued and stop the writer thread."""
+		if self._thread is None:
+			return
+		self._queue.put(_STOP)
+		self._thread.join(timeout)
+		self._thread = None
+
+	def submit(self, barcode: str, score: int, breakdown: Dict[str, int]) -> None:
+		"""Queue one scan; raises ``queue.Full`` if the writer cannot keep up."""
+		row = {"barcode": barcode, "score": score, "breakdown": breakdown, "created_at": datetime.utcnow()}
+		self._queue.put(row, timeout=self.put_timeout)
+
+	def drain(self) -> None:
+		"""Block until every queued scan has been written (or failed)."""
+		self._queue.join()
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"queued": self._queue.qsize(),
+			"written": self.written,
+			"failed": self.failed,
+			"batches": self.batches,
+		}
+
+	def _run(self) -> None:
+		stopping = False
+		while not stopping:
+			batch: List[Dict] = []
+			deadline = time.monotonic() + self.flush_interval
+			while len(batch) < self.flush_size:
+				remaining = deadline - time.monotonic()
+				try:
+					item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+				except queue.Empty:
+					break
+				if item is _STOP:
+					self._queue.task_done()
+					stopping = True
+					break
+				batch.append(item)
+			if stopping:
+				# Pick up anything queued behind the stop marker
+				while True:
+					try:
+						batch.append(self._queue.get_nowait())
+					except queue.Empty:
+						break
+			if batch:
+				self._flush(batch)
+
+	def _flush(self, batch: List[Dict]) -> None:
+		session = self.session_factory()
+		try:
+			session.execute(insert(models.Scan), batch)
+			if self.rollups:
+				scan_stats.apply(session.connection(), batch)
+			session.commit()
+			self.written += len(batch)
+			self.batches += 1
+		except Exception as e:
+			session.rollback()
+			self.failed += len(batch)
+			print(f"Error writing {len(batch)} scans: {e}")
+		finally:
+			session.close()
+			for _ in batch:
+				self._queue.task_done()
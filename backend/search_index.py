@@ -0,0 +1,363 @@
+"""In-memory inverted index used by the product search endpoint.
+
+Products are tokenized once when they are added to the index instead of on
+every request. A text query is answered by intersecting token posting lists
+and then verifying the small candidate set with the same substring rules the
+linear scan used, so results are identical to the original implementation.
+
+Filter-only queries (category, brand and/or sustainability without ``q``)
+never look at the whole catalog: products are also kept in per-category,
+per-brand and per-sustainability-bucket lists that are already sorted by
+score, so the answer is a slice of one list, or a walk of the shortest one
+when filters are combined.
+
+A text query that matches no indexed product falls back to typo-tolerant
+matching (see fuzzy.py): each query word may also match vocabulary tokens a
+few edits away ("iphnoe" finds "iPhone"), and those results rank after
+exact ones, closest spelling first.
+
+Indexed products are :class:`catalog.ProductRecord` objects (anything with
+``id``, ``name``, ``brand``, ``category`` and ``score`` attributes); search
+results are those same objects.
+"""
+import base64
+import heapq
+import json
+import re
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+	from .fuzzy import TrigramIndex
+except ImportError:
+	from fuzzy import TrigramIndex
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Score boundaries used by the ``sustainability`` filter on /api/search.
+SUSTAINABILITY_BUCKETS = ("excellent", "good", "fair", "poor")
+
+
+def score_bucket(score: int) -> str:
+	"""Return the sustainability bucket a score falls into."""
+	if score >= 80:
+		return "excellent"
+	if score >= 60:
+		return "good"
+	if score >= 40:
+		return "fair"
+	return "poor"
+
+
+def encode_cursor(key: tuple) -> str:
+	"""Opaque pagination cursor for a key returned by :meth:`SearchIndex.search_page`."""
+	raw = json.dumps(list(key), separators=(",", ":")).encode()
+	return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+	"""Inverse of :func:`encode_cursor`; raises ``ValueError`` on bad input."""
+	try:
+		key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+	except Exception:
+		raise ValueError("malformed cursor")
+	if not isinstance(key, list) or not key or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in key):
+		raise ValueError("malformed cursor")
+	return tuple(key)
+
+
+def tokenize(text: str) -> List[str]:
+	"""Split lowercased text into word tokens."""
+	return _TOKEN_RE.findall(text.lower())
+
+
+class _Doc:
+	"""Precomputed, lowercased view of one product."""
+
+	__slots__ = ("product", "seq", "name", "brand", "category", "score")
+
+	def __init__(self, product, seq: int):
+		self.product = product
+		self.seq = seq
+		self.name = product.name.lower()
+		self.brand = product.brand.lower()
+		self.category = product.category.lower()
+		self.score = product.score
+
+
+def _rank(doc: _Doc) -> tuple:
+	# Order of filter-only results: best score first, then insertion order
+	return (-doc.score, doc.seq)
+
+
+class SearchIndex:
+	"""Tokenized inverted index plus score-sorted category/brand/bucket lists.
+
+	Documents are keyed by the product ``id`` so calling :meth:`add` with an
+	existing id replaces the stored product.
+	"""
+
+	def __init__(self, products: Iterable = (), fuzzy: bool = True):
+		self.fuzzy = fuzzy
+		self._docs: Dict[int, _Doc] = {}
+		self._ids: Dict[object, int] = {}
+		self._next_seq = 0
+		self._tokens: Dict[str, Set[int]] = {}
+		# Facet key -> docs sorted by _rank; see _facet_keys
+		self._sorted: Dict[tuple, List[_Doc]] = {("all",): []}
+		# Sorted suffixes of every known token so a query token can be
+		# resolved to all tokens containing it with a binary search.
+		self._suffixes: List[str] = []
+		self._suffix_owner: List[str] = []
+		self._vocabulary = TrigramIndex()
+		self._build(products)
+
+	def __len__(self) -> int:
+		return len(self._docs)
+
+	def _build(self, products: Iterable) -> None:
+		"""Index ``products`` into the empty index, sorting every list once at the end.
+
+		Equivalent to calling :meth:`add` for each product, but without the
+		per-item ``list.insert`` that makes incremental building quadratic.
+		"""
+		products = list(products)
+		# A repeated id keeps its last product, as add() would
+		last = {product.id: i for i, product in enumerate(products)}
+		new_tokens = []
+		for i, product in enumerate(products):
+			if last[product.id] != i:
+				continue
+			doc_id = self._next_seq
+			self._next_seq += 1
+			doc = _Doc(product, doc_id)
+			self._docs[doc_id] = doc
+			self._ids[product.id] = doc_id
+			for token in self._doc_tokens(doc):
+				postings = self._tokens.get(token)
+				if postings is None:
+					postings = self._tokens[token] = set()
+					new_tokens.append(token)
+					self._vocabulary.add(token)
+				postings.add(doc_id)
+			for key in self._facet_keys(doc):
+				self._sorted.setdefault(key, []).append(doc)
+		for docs in self._sorted.values():
+			docs.sort(key=_rank)
+		pairs = sorted((token[start:], token) for token in new_tokens for start in range(len(token)))
+		self._suffixes = [suffix for suffix, _ in pairs]
+		self._suffix_owner = [owner for _, owner in pairs]
+
+	def add(self, product) -> None:
+		"""Index a product, replacing any product with the same id."""
+		if product.id in self._ids:
+			self.remove(product.id)
+
+		doc_id = self._next_seq
+		self._next_seq += 1
+		doc = _Doc(product, doc_id)
+		self._docs[doc_id] = doc
+		self._ids[product.id] = doc_id
+
+		for token in self._doc_tokens(doc):
+			postings = self._tokens.get(token)
+			if postings is None:
+				postings = self._tokens[token] = set()
+				self._add_suffixes(token)
+				self._vocabulary.add(token)
+			postings.add(doc_id)
+		for key in self._facet_keys(doc):
+			insort(self._sorted.setdefault(key, []), doc, key=_rank)
+
+	def remove(self, product_id) -> None:
+		"""Drop a product from the index. Unknown ids are ignored."""
+		doc_id = self._ids.pop(product_id, None)
+		if doc_id is None:
+			return
+		doc = self._docs.pop(doc_id)
+		# Emptied token postings are kept; they simply match nothing.
+		for token in self._doc_tokens(doc):
+			self._tokens[token].discard(doc_id)
+		for key in self._facet_keys(doc):
+			docs = self._sorted[key]
+			del docs[bisect_left(docs, _rank(doc), key=_rank)]
+
+	def search(
+		self,
+		q: str = "",
+		category: str = "",
+		brand: str = "",
+		sustainability: str = "",
+		extra: Iterable = (),
+		limit: Optional[int] = None,
+	) -> List:
+		"""Return matching products ranked like the original /api/search.
+
+		``extra`` holds transient products (e.g. upstream API results) that
+		are not worth indexing; they are filtered the same way and rank ahead
+		of indexed products on ties, as they did in the linear scan.
+		"""
+		return [doc.product for _, doc in self._ranked(q, category, brand, sustainability, extra, limit, None)]
+
+	def search_page(
+		self,
+		q: str = "",
+		category: str = "",
+		brand: str = "",
+		sustainability: str = "",
+		extra: Iterable = (),
+		limit: int = 20,
+		after: Optional[tuple] = None,
+	) -> Tuple[List, Optional[tuple]]:
+		"""Return one page of :meth:`search` results and the key to resume from.
+
+		``after`` is the key returned for the previous page (``None`` for the
+		first page); the returned key is ``None`` on the last page. Only
+		``limit + 1`` results are ranked, never the full result set.
+		"""
+		ranked = self._ranked(q, category, brand, sustainability, extra, limit + 1, after)
+		next_key = ranked[limit - 1][0] if len(ranked) > limit else None
+		return [doc.product for _, doc in ranked[:limit]], next_key
+
+	def _ranked(self, q, category, brand, sustainability, extra, limit, after) -> List[Tuple[tuple, _Doc]]:
+		query = q.lower()
+		brand = brand.lower()
+		if sustainability not in SUSTAINABILITY_BUCKETS:
+			sustainability = ""
+
+		extra = list(extra)
+		extra_docs = [doc for doc in (_Doc(p, i - len(extra)) for i, p in enumerate(extra))
+			if self._matches(doc, query, category, brand, sustainability)]
+
+		if not query:
+			# Both sides are already in rank order; merge instead of sorting
+			indexed = self._filtered(category, brand, sustainability)
+			start = 0
+			if after is not None:
+				start = bisect_right(indexed, after, key=_rank)
+				extra_docs = [doc for doc in extra_docs if _rank(doc) > after]
+			if not extra_docs:
+				ranked = indexed[start:] if limit is None else indexed[start:start + limit]
+			else:
+				merged = heapq.merge(sorted(extra_docs, key=_rank), islice(indexed, start, None), key=_rank)
+				ranked = list(merged if limit is None else islice(merged, limit))
+			return [(_rank(doc), doc) for doc in ranked]
+
+		key = lambda d: (0 if query in d.name else 1, -d.score, d.seq)
+		matched = [(key(doc), doc) for doc in self._candidates(query)
+			if self._matches(doc, query, category, brand, sustainability)]
+		if not matched and self.fuzzy:
+			# Nothing spelled like the query: rank near spellings after exact hits
+			matched = [((2 + distance, -doc.score, doc.seq), doc) for distance, doc in self._approximate(query)
+				if self._matches(doc, "", category, brand, sustainability)]
+		matched.extend((key(doc), doc) for doc in extra_docs)
+		if after is not None:
+			matched = [item for item in matched if item[0] > after]
+		if limit is not None and limit < len(matched):
+			return heapq.nsmallest(limit, matched, key=itemgetter(0))
+		return sorted(matched, key=itemgetter(0))
+
+	def _filtered(self, category: str, brand: str, sustainability: str) -> List[_Doc]:
+		"""Indexed docs passing the filters, in rank order."""
+		lists = []
+		if category and sustainability:
+			lists.append(self._sorted.get(("category", category, sustainability), []))
+		elif category:
+			lists.append(self._sorted.get(("category", category), []))
+		elif sustainability:
+			lists.append(self._sorted.get(("bucket", sustainability), []))
+		if brand:
+			lists.append(self._sorted.get(("brand", brand), []))
+		if not lists:
+			return self._sorted[("all",)]
+		if len(lists) == 1:
+			return lists[0]
+		# Walk the shortest list; it is already ordered, so the result is too
+		shortest = min(lists, key=len)
+		return [doc for doc in shortest if self._matches(doc, "", category, brand, sustainability)]
+
+	def matches(self, q: str) -> bool:
+		"""Whether any indexed product matches ``q``, exactly or approximately."""
+		return bool(self._ranked(q, "", "", "", (), 1, None))
+
+	def _approximate(self, query: str) -> List[Tuple[int, _Doc]]:
+		"""Docs matching every query word within its edit limit, with the summed distance."""
+		total: Optional[Dict[int, int]] = None
+		for word in set(tokenize(query)):
+			# Containment still matches at distance 0, as in exact search
+			distances = dict.fromkeys(self._containing(word), 0)
+			for token, distance in self._vocabulary.similar(word).items():
+				for doc_id in self._tokens[token]:
+					if distances.get(doc_id, distance) >= distance:
+						distances[doc_id] = distance
+			if total is None:
+				total = distances
+			else:
+				total = {doc_id: d + distances[doc_id] for doc_id, d in total.items() if doc_id in distances}
+			if not total:
+				return []
+		return [(distance, self._docs[doc_id]) for doc_id, distance in (total or {}).items()]
+
+	def _candidates(self, query: str) -> Iterable[_Doc]:
+		postings = [self._containing(token) for token in set(tokenize(query))]
+		if not postings:
+			return self._docs.values()
+		postings.sort(key=len)
+		ids = set(postings[0])
+		for other in postings[1:]:
+			if not ids:
+				break
+			ids &= other
+		return [self._docs[doc_id] for doc_id in ids]
+
+	def _containing(self, fragment: str) -> Set[int]:
+		"""Union of postings for every indexed token containing ``fragment``."""
+		exact = self._tokens.get(fragment)
+		lo = bisect_left(self._suffixes, fragment)
+		hi = bisect_left(self._suffixes, fragment + "\U0010ffff", lo)
+		owners = {self._suffix_owner[i] for i in range(lo, hi)}
+		if len(owners) == 1 and exact is not None:
+			return exact
+		result: Set[int] = set()
+		for token in owners:
+			result |= self._tokens[token]
+		return result
+
+	def _add_suffixes(self, token: str) -> None:
+		for start in range(len(token)):
+			suffix = token[start:]
+			pos = bisect_left(self._suffixes, suffix)
+			self._suffixes.insert(pos, suffix)
+			self._suffix_owner.insert(pos, token)
+
+	@staticmethod
+	def _facet_keys(doc: _Doc) -> List[tuple]:
+		category, bucket = doc.product.category, score_bucket(doc.score)
+		return [
+			("all",),
+			("category", category),
+			("category", category, bucket),
+			("bucket", bucket),
+			("brand", doc.brand),
+		]
+
+	@staticmethod
+	def _doc_tokens(doc: _Doc) -> Set[str]:
+		return set(tokenize(doc.name)) | set(tokenize(doc.brand)) | set(tokenize(doc.category))
+
+	@staticmethod
+	def _matches_query(doc: _Doc, query: str) -> bool:
+		return query in doc.name or query in doc.brand or query in doc.category
+
+	def _matches(self, doc: _Doc, query: str, category: str, brand: str, sustainability: str) -> bool:
+		if query and not self._matches_query(doc, query):
+			return False
+		if category and doc.product.category != category:
+			return False
+		if brand and doc.brand != brand:
+			return False
+		if sustainability and score_bucket(doc.score) != sustainability:
+			return False
+		return True
@@ -1,28 +1,102 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import codecs
+import json
 import os
+import queue
 
 # Support running the file as a module (python -m backend.server) or as a
 # script (python server.py). When run as a script, relative imports fail, so
 # fall back to absolute imports from the same directory.
 try:
 	# Preferred when run as package from repo root: `python -m backend.server`
-	from . import eco_data
-	from .database import SessionLocal, engine
+	from . import eco_data, fast_json, metrics, scan_stats
+	from .database import SessionLocal, engine, get_db
 	from . import models
+	from .cache import TTLCache
+	from .http_cache import CacheRule, HttpCacheMiddleware
+	from .product_store import ProductStore
+	from .scan_export import FORMATS, iter_export
+	from .scan_writer import ScanWriter
+	from .singleflight import SingleFlight
 except Exception:
 	# Fallback when running `python server.py` inside the backend/ folder
 	import eco_data
-	from database import SessionLocal, engine
+	import fast_json
+	import metrics
+	import scan_stats
+	from database import SessionLocal, engine, get_db
 	import models
+	from cache import TTLCache
+	from http_cache import CacheRule, HttpCacheMiddleware
+	from product_store import ProductStore
+	from scan_export import FORMATS, iter_export
+	from scan_writer import ScanWriter
+	from singleflight import SingleFlight
 
 from fastapi.middleware.cors import CORSMiddleware
 
-# Create database tables (simple approach for prototype)
-models.Base.metadata.create_all(bind=engine)
+# Scan history is written behind the request in batches
+scan_writer = ScanWriter(SessionLocal)
 
-app = FastAPI(title="EcoScan API")
+# Products ingested from an OpenFoodFacts dump (python -m backend.off_ingest),
+# with the most scanned barcodes (known or not) kept in memory
+product_store = ProductStore(engine, cache=TTLCache(
+	max_bytes=int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+	ttl=float(os.getenv("PRODUCT_CACHE_TTL", "3600")),
+	negative_ttl=float(os.getenv("PRODUCT_CACHE_NEGATIVE_TTL", "300")),
+	stale_ttl=0,
+))
+
+
+_schema_ready = False
+
+
+def prepare() -> None:
+	"""Create (or upgrade) the database tables; runs once per process, before the first request.
+
+	Kept out of import so importing the app stays cheap. The launcher calls
+	it in the master before forking, so workers do not race to create tables.
+	"""
+	global _schema_ready
+	if _schema_ready:
+		return
+	try:
+		models.Base.metadata.create_all(bind=engine)
+		models.upgrade_schema(engine)
+	except SQLAlchemyError:
+		# Another process created a table (or added a column) between the
+		# existence check and the DDL; a second pass sees it and does the rest
+		models.Base.metadata.create_all(bind=engine)
+		models.upgrade_schema(engine)
+	_schema_ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	await run_in_threadpool(prepare)
+	scan_writer.start()
+	yield
+	# Flush queued scans before the process exits
+	scan_writer.stop()
+
+
+app = FastAPI(title="EcoScan API", lifespan=lifespan)
+
+# ETags and compression for GET /api/scan. The endpoint records every scan,
+# so it always runs and the tag is a hash of the body; "no-cache" makes
+# clients revalidate (and so be recorded) instead of reusing a stored copy.
+# Added before CORS so 304 responses get the CORS headers too.
+app.add_middleware(HttpCacheMiddleware, rules={
+	"/api/scan": CacheRule(os.getenv("HTTP_CACHE_CONTROL_SCAN", "private, no-cache")),
+})
 
 # Allow CORS for local frontend development — restrict in production
 app.add_middleware(
@@ -33,6 +107,9 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
+# Request latency histograms for /metrics (and X-Profile sampling when enabled)
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 class ScanRequest(BaseModel):
 	barcode: str
@@ -42,6 +119,66 @@ class ScanResponse(BaseModel):
 	barcode: str
 	score: int
 	breakdown: Dict[str, int]
+	# Set when the barcode is a known product
+	name: Optional[str] = None
+	brand: Optional[str] = None
+
+
+# Largest JSON array accepted by /api/scan/batch; bigger jobs should stream
+BATCH_MAX = int(os.getenv("SCAN_BATCH_MAX", "1000000"))
+# Barcodes scored per chunk when streaming newline-delimited input
+BATCH_STREAM_CHUNK = 10000
+# Longest barcode accepted by the batch endpoint (GTINs have 14 digits)
+BARCODE_MAX_LENGTH = int(os.getenv("BARCODE_MAX_LENGTH", "64"))
+# Longest line buffered from a streamed batch; longer lines become error records
+BATCH_MAX_LINE = 4096
+
+
+class ScanRecord(ScanResponse):
+	id: int
+	created_at: Optional[datetime] = None
+
+
+def record_scan(barcode: str, score: int, breakdown: Dict[str, int]) -> None:
+	"""Queue a scan for the history table without waiting on the database."""
+	try:
+		scan_writer.submit(barcode, score, breakdown)
+	except queue.Full:
+		raise HTTPException(status_code=503, detail="scan history is backed up, please retry")
+
+
+def score_barcode(barcode: str) -> Dict:
+	"""Score a known product from the products table, anything else by hash."""
+	product = product_store.get(barcode)
+	if product is not None:
+		return {"barcode": barcode, "score": product["score"], "breakdown": product["breakdown"],
+			"name": product["name"], "brand": product["brand"]}
+	with metrics.span("compute_score"):
+		score, breakdown = eco_data.compute_score(barcode)
+	return {"barcode": barcode, "score": score, "breakdown": breakdown}
+
+
+# Concurrent scans of the same barcode share one lookup (SINGLEFLIGHT=0 disables)
+scan_flight = SingleFlight()
+
+
+def lookup_barcode(barcode: str) -> Dict:
+	return scan_flight.do_sync(barcode, lambda: score_barcode(barcode))
+
+
+def scan_response(result: Dict) -> Response:
+	"""Encode a scan result as ``ScanResponse`` JSON without the pydantic round trip.
+
+	Same fields, order and bytes as ``response_model=ScanResponse``; the model
+	still documents the endpoints.
+	"""
+	return fast_json.RawJSONResponse(fast_json.dumps({
+		"barcode": result["barcode"],
+		"score": result["score"],
+		"breakdown": result["breakdown"],
+		"name": result.get("name"),
+		"brand": result.get("brand"),
+	}))
 
 
 @app.get("/api/scan", response_model=ScanResponse)
@@ -53,17 +190,230 @@ def scan_get(barcode: str):
 	if not barcode:
 		raise HTTPException(status_code=400, detail="barcode query parameter is required")
 
-	score, breakdown = eco_data.compute_score(barcode)
-	return {"barcode": barcode, "score": score, "breakdown": breakdown}
+	result = lookup_barcode(barcode)
+	record_scan(barcode, result["score"], result["breakdown"])
+	return scan_response(result)
 
 
 @app.post("/api/scan", response_model=ScanResponse)
 def scan_post(r: ScanRequest):
 	"""POST JSON { "barcode": "..." } to compute a score."""
-	score, breakdown = eco_data.compute_score(r.barcode)
-	return {"barcode": r.barcode, "score": score, "breakdown": breakdown}
+	result = lookup_barcode(r.barcode)
+	record_scan(r.barcode, result["score"], result["breakdown"])
+	return scan_response(result)
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+	"""StreamingResponse that does not listen for client disconnects.
+
+	The default implementation reads ``receive`` concurrently to detect a
+	disconnect, which steals body chunks from a generator that is still
+	reading the request stream.
+	"""
+
+	async def __call__(self, scope, receive, send):
+		await self.stream_response(send)
+		if self.background is not None:
+			await self.background()
 
 
+def _compute_scores(barcodes):
+	with metrics.span("compute_scores"):
+		return eco_data.compute_scores(barcodes)
+
+
+def _batch_lines(items) -> str:
+	"""NDJSON for parsed lines: barcodes get their scores, error records pass through."""
+	results = iter(_compute_scores([item for item in items if isinstance(item, str)]))
+	out = []
+	for item in items:
+		if isinstance(item, str):
+			score, breakdown = next(results)
+			item = {"barcode": item, "score": score, "breakdown": breakdown}
+		out.append(json.dumps(item) + "\n")
+	return "".join(out)
+
+
+def _parse_barcode_line(line: str):
+	"""``(barcode, None)`` for one streamed line, or ``(None, error message)``."""
+	# Lines are bare barcodes, JSON strings or {"barcode": ...} objects
+	if "\ufffd" in line:
+		return None, "invalid UTF-8"
+	value = line
+	if line[0] in "{\"":
+		try:
+			value = json.loads(line)
+		except ValueError:
+			return None, "invalid JSON"
+		if isinstance(value, dict):
+			value = value.get("barcode")
+		if not isinstance(value, str):
+			return None, "expected a barcode, a JSON string or an object with a \"barcode\" string"
+	if len(value) > BARCODE_MAX_LENGTH:
+		return None, f"barcode longer than {BARCODE_MAX_LENGTH} characters"
+	return value, None
+
+
+def _add_line(items: list, number: int, line: str) -> None:
+	line = line.strip()
+	if not line:
+		return
+	barcode, error = _parse_barcode_line(line)
+	items.append(barcode if error is None else {"line": number, "error": error})
+
+
+async def _stream_batch(request: Request):
+	# Incremental, so a character split across two chunks decodes intact
+	decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+	pending = ""
+	# Set while discarding the rest of a line longer than BATCH_MAX_LINE
+	overlong = False
+	number = 0
+	items = []
+	async for chunk in request.stream():
+		lines = (pending + decoder.decode(chunk)).split("\n")
+		pending = lines.pop()
+		for line in lines:
+			number += 1
+			if overlong:
+				items.append({"line": number, "error": f"line longer than {BATCH_MAX_LINE} characters"})
+				overlong = False
+			else:
+				_add_line(items, number, line)
+		if len(pending) > BATCH_MAX_LINE:
+			pending, overlong = "", True
+		if len(items) >= BATCH_STREAM_CHUNK:
+			yield await run_in_threadpool(_batch_lines, items)
+			items = []
+	pending += decoder.decode(b"", final=True)
+	if overlong:
+		items.append({"line": number + 1, "error": f"line longer than {BATCH_MAX_LINE} characters"})
+	elif pending.strip():
+		_add_line(items, number + 1, pending)
+	if items:
+		yield await run_in_threadpool(_batch_lines, items)
+
+
+@app.post("/api/scan/batch")
+async def scan_batch(request: Request):
+	"""Score many barcodes in one call (bulk imports).
+
+	Send JSON ``{"barcodes": [...]}`` (or a bare array) to get
+	``{"results": [...]}`` back, or stream one barcode per line with
+	``Content-Type: application/x-ndjson`` / ``text/plain`` to get results
+	streamed back as NDJSON while the body is still uploading. Batch scores
+	are not recorded in the scan history.
+	"""
+	content_type = request.headers.get("content-type", "")
+	if not content_type.startswith("application/json"):
+		return _DuplexStreamingResponse(_stream_batch(request), media_type="application/x-ndjson")
+
+	# Parsing, scoring and encoding a million barcodes takes seconds; none
+	# of it may hold up the event loop
+	body = await request.body()
+	return fast_json.RawJSONResponse(await run_in_threadpool(_json_batch, body))
+
+
+def _json_batch(body: bytes) -> bytes:
+	"""``{"results": [...]}`` for a JSON batch request body, encoded."""
+	try:
+		body = json.loads(body)
+	except ValueError:
+		raise HTTPException(status_code=400, detail="invalid JSON body")
+	barcodes = body.get("barcodes") if isinstance(body, dict) else body
+	if not isinstance(barcodes, list) or not all(isinstance(b, str) for b in barcodes):
+		raise HTTPException(status_code=400, detail="expected a list of barcode strings")
+	if any(len(b) > BARCODE_MAX_LENGTH for b in barcodes):
+		raise HTTPException(status_code=400, detail=f"barcodes are at most {BARCODE_MAX_LENGTH} characters")
+	if len(barcodes) > BATCH_MAX:
+		raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX} barcodes per JSON request; stream larger batches")
+
+	# Scored and encoded a chunk at a time. Holding a million result dicts
+	# makes every garbage collection walk them, and a single encoder call
+	# over all of them holds the GIL for a quarter of a second; either way
+	# the event loop thread stalls for hundreds of milliseconds.
+	parts = []
+	for start in range(0, len(barcodes), BATCH_STREAM_CHUNK):
+		chunk = barcodes[start:start + BATCH_STREAM_CHUNK]
+		parts.append(fast_json.dumps([
+			{"barcode": b, "score": score, "breakdown": breakdown}
+			for b, (score, breakdown) in zip(chunk, _compute_scores(chunk))
+		])[1:-1])
+	return b'{"results":[' + b",".join(parts) + b"]}"
+
+
+@app.get("/api/scans", response_model=List[ScanRecord])
+def scans_list(barcode: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+	"""Most recent recorded scans, optionally for a single barcode."""
+	query = db.query(models.Scan)
+	if barcode:
+		query = query.filter(models.Scan.barcode == barcode)
+	rows = query.order_by(models.Scan.id.desc()).limit(max(1, min(limit, 500))).all()
+	return [
+		{"id": r.id, "barcode": r.barcode, "score": r.score, "breakdown": r.breakdown, "created_at": r.created_at}
+		for r in rows
+	]
+
+
+@app.get("/api/stats/barcodes/{barcode}")
+def stats_barcode(barcode: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+		db: Session = Depends(get_db)):
+	"""Scan count, average score, score histogram and hourly series for one barcode."""
+	return scan_stats.barcode_stats(db.connection(), barcode, since, until)
+
+
+@app.get("/api/stats/categories")
+def stats_categories(since: Optional[datetime] = None, until: Optional[datetime] = None, db: Session = Depends(get_db)):
+	"""Scan count, average score and score histogram per product category."""
+	return scan_stats.category_stats(db.connection(), since, until)
+
+
+@app.get("/api/stats/top")
+def stats_top(limit: int = 10, category: Optional[str] = None, since: Optional[datetime] = None,
+		until: Optional[datetime] = None, db: Session = Depends(get_db)):
+	"""Most scanned barcodes, optionally within one category."""
+	return scan_stats.top_barcodes(db.connection(), max(1, min(limit, 500)), category, since, until)
+
+
+@app.get("/api/products/cache/stats")
+def product_cache_stats():
+	"""Hit/miss/eviction counters for the barcode lookup cache."""
+	return product_store.cache.stats()
+
+
+@app.get("/api/scan/coalescing")
+def scan_coalescing_stats():
+	"""How many barcode lookups ran and how many shared an in-flight one."""
+	return scan_flight.stats()
+
+
+@app.get("/metrics")
+def get_metrics():
+	"""Latency histograms in Prometheus text format (see metrics.py)."""
+	return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/scans/export")
+def scans_export(
+	format: str = "ndjson",
+	barcode_prefix: str = "",
+	min_score: Optional[int] = None,
+	max_score: Optional[int] = None,
+):
+	"""Stream the scan history as NDJSON or CSV.
+
+	Rows are fetched through a server-side cursor, so memory stays flat no
+	matter how many scans match, e.g.
+	GET /api/scans/export?format=csv&barcode_prefix=501&min_score=60
+	"""
+	if format not in FORMATS:
+		raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+	return StreamingResponse(
+		iter_export(SessionLocal, format, barcode_prefix, min_score, max_score),
+		media_type=FORMATS[format],
+		headers={"Content-Disposition": f'attachment; filename="scans.{format}"'},
+	)
+
 if __name__ == "__main__":
 	import uvicorn
 
@@ -0,0 +1,92 @@
+"""Request coalescing: identical concurrent calls share one execution.
+
+While a call for ``key`` is in flight, later callers with the same key wait
+for it and get its result (or its exception) instead of repeating the work,
+e.g. thousands of users searching the same promoted term at once trigger a
+single upstream fan-out. Nothing is kept once the call finishes; caching
+is left to the layers below.
+
+:meth:`SingleFlight.do` is for coroutines on one event loop,
+:meth:`SingleFlight.do_sync` for plain functions called from threads (sync
+FastAPI handlers run in a thread pool).
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+ENABLED = os.getenv("SINGLEFLIGHT", "1").lower() not in ("0", "false", "no", "off")
+
+
+class _Call:
+	__slots__ = ("done", "result", "error")
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+
+
+class SingleFlight:
+	"""Deduplicates concurrent calls by key; see the module docstring."""
+
+	def __init__(self, enabled: bool = ENABLED):
+		self.enabled = enabled
+		self._tasks: Dict[Hashable, asyncio.Future] = {}
+		self._calls: Dict[Hashable, _Call] = {}
+		self._lock = threading.Lock()
+		self.executed = 0
+		self.shared = 0
+
+	async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+		"""Await ``fn()``, or the in-flight call already running for ``key``."""
+		if not self.enabled:
+			return await fn()
+		task = self._tasks.get(key)
+		if task is None:
+			self.executed += 1
+			task = self._tasks[key] = asyncio.ensure_future(fn())
+			task.add_done_callback(lambda t: self._finished(key, t))
+		else:
+			self.shared += 1
+		# A caller that is cancelled (client went away) must not cancel the
+		# call for everyone else waiting on it
+		return await asyncio.shield(task)
+
+	def do_sync(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+		"""Call ``fn()``, or wait for the call already running for ``key`` in another thread."""
+		if not self.enabled:
+			return fn()
+		with self._lock:
+			call = self._calls.get(key)
+			leader = call is None
+			if leader:
+				call = self._calls[key] = _Call()
+				self.executed += 1
+			else:
+				self.shared += 1
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return call.result
+		try:
+			call.result = fn()
+			return call.result
+		except BaseException as e:
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				del self._calls[key]
+			call.done.set()
+
+	def stats(self) -> Dict[str, int]:
+		return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._tasks) + len(self._calls)}
+
+	def _finished(self, key: Hashable, task: asyncio.Future) -> None:
+		if self._tasks.get(key) is task:
+			del self._tasks[key]
+		if not task.cancelled():
+			# Mark the exception retrieved even if every waiter was cancelled
+			task.exception()
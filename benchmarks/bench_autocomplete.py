@@ -0,0 +1,67 @@
+"""Latency benchmark for the /api/suggestions autocomplete index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_autocomplete --entries 1000000
+"""
+import argparse
+import random
+import string
+import time
+
+from backend.autocomplete import Autocomplete
+from backend.catalog import ProductRecord
+from benchmarks.stats import percentile
+
+
+def synthetic_products(count: int, seed: int = 42):
+    """Yield fake products with a realistic-ish spread of names and brands."""
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20000)]
+    brands = [w.title() for w in rng.sample(vocab, 2000)]
+    for i in range(count):
+        words = rng.choices(vocab, k=rng.randint(1, 3))
+        yield ProductRecord(i, " ".join(words).title() + f" {i}", rng.choice(brands), "general", rng.randint(0, 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000, help="number of keys to index")
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    # Products contribute several keys each; stop once we have enough keys
+    products = []
+    keys = 0
+    for product in synthetic_products(args.entries):
+        products.append(product)
+        keys += len(product.name.split()) + 1
+        if keys >= args.entries:
+            break
+
+    start = time.perf_counter()
+    index = Autocomplete(products)
+    build = time.perf_counter() - start
+    print(f"indexed {len(index):,} keys from {len(products):,} products in {build:.1f}s")
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(products).name.lower()
+        queries.append(name[:rng.randint(1, 6)])
+
+    timings = []
+    for q in queries:
+        start = time.perf_counter_ns()
+        index.complete(q, args.limit)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+
+    print(f"{len(queries):,} queries, top-{args.limit}")
+    for pct in (50, 90, 99, 99.9):
+        print(f"  p{pct:<5} {percentile(timings, pct):8.1f} us")
+    print(f"  max    {max(timings):8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
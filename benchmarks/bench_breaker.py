@@ -0,0 +1,150 @@
+"""Provider circuit breaker against a fault-injecting upstream stub.
+
+Runs ``providers.fan_out`` from several concurrent clients while the stub
+goes through healthy, failing (503), hanging and recovered phases, and
+prints per-phase latency, how many lookups got products, and the breaker
+state and adaptive timeout at the end of each phase. Before that it checks
+half-open probing on a breaker with a fake clock: calls admitted before the
+breaker tripped must not use up or free probe slots, nor open or close it,
+when they finish during the half-open state; and a source that slowed past
+its adaptive timeout, but answers within the ceiling, must close it again.
+The exit status is 1 if a check fails:
+
+    python -m benchmarks.bench_breaker --phase-seconds 5 --reset 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks import stub_upstream
+from benchmarks.stats import percentile
+
+# (name, error_rate, hang_rate)
+PHASES = [
+    ("healthy", 0.0, 0.0),
+    ("errors", 1.0, 0.0),
+    ("hanging", 0.0, 1.0),
+    ("recovered", 0.0, 0.0),
+]
+
+
+async def run_phase(providers, seconds: float, clients: int, offset: int) -> tuple:
+    latencies = []
+    found = 0
+    end = time.monotonic() + seconds
+
+    async def client(worker: int):
+        nonlocal found
+        i = 0
+        while time.monotonic() < end:
+            # Distinct queries so every lookup misses the response cache
+            query = f"bench {offset} {worker} {i}"
+            i += 1
+            start = time.perf_counter()
+            if await providers.fan_out(query):
+                found += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(client(w) for w in range(clients)))
+    return latencies, found
+
+
+def check_probes() -> bool:
+    from backend.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+    now = [0.0]
+    breaker = CircuitBreaker("check", window=4, min_calls=2, reset_timeout=10, half_open_calls=1, clock=lambda: now[0])
+    results = []
+
+    def check(passed: bool, what: str) -> None:
+        results.append(passed)
+        print(f"  {'ok  ' if passed else 'FAIL'} {what}")
+
+    # Two calls are still running when two others trip the breaker
+    late_failure, late_success = breaker.allow(), breaker.allow()
+    for _ in range(2):
+        breaker.record(breaker.allow(), 0.01, failed=True)
+    now[0] += 10
+    probe = breaker.allow()
+    check(probe is not None and probe.probe and breaker.state == HALF_OPEN, "half-open admits a probe")
+    breaker.record(late_failure, 0.01, failed=True)
+    check(breaker.state == HALF_OPEN, "a failure admitted while closed does not reopen it")
+    breaker.record(late_success, 0.01, failed=False)
+    check(breaker.state == HALF_OPEN, "a success admitted while closed does not close it")
+    check(breaker.allow() is None and breaker._probes == 1, "nor does either free the probe slot")
+    breaker.release(probe)
+    retry = breaker.allow()
+    check(retry is not None and retry.probe, "a released probe frees its slot")
+    breaker.record(retry, 0.01, failed=False)
+    check(breaker.state == CLOSED and breaker._probes == 0, "the probe's success closes it")
+
+    # A source answering in 200 ms gets 3 x p95 = 0.6 s; then it slows to 1 s,
+    # still well within the 5 s ceiling
+    breaker = CircuitBreaker("slowed", window=10, min_calls=5, reset_timeout=10, clock=lambda: now[0])
+
+    def call(latency: float) -> None:
+        admission = breaker.allow()
+        if admission is None:
+            return
+        timeout = breaker.timeout(5.0, admission)
+        breaker.record(admission, min(latency, timeout), failed=latency > timeout)
+
+    for _ in range(10):
+        call(0.2)
+    check(abs(breaker.timeout(5.0) - 0.6) < 1e-9, "a 200 ms source gets a 0.6 s timeout")
+    for _ in range(10):
+        call(1.0)
+    check(breaker.state == OPEN, "slowing to 1 s opens it")
+    now[0] += 10
+    call(1.0)
+    check(breaker.state == CLOSED, "a probe answering in 1 s closes it again")
+    for _ in range(20):
+        call(1.0)
+    check(breaker.state == CLOSED and abs(breaker.timeout(5.0) - 3.0) < 1e-9,
+        "and the timeout follows the new latency (3 s)")
+    return all(results)
+
+
+async def run(args, stub) -> None:
+    from backend import providers
+
+    handler = stub.RequestHandlerClass
+    breaker = providers.breakers["openfoodfacts"]
+    try:
+        for n, (name, error_rate, hang_rate) in enumerate(PHASES):
+            handler.error_rate, handler.hang_rate = error_rate, hang_rate
+            print(f"-- {name}")
+            latencies, found = await run_phase(providers, args.phase_seconds, args.clients, n)
+            stats = providers.breaker_stats()["openfoodfacts"]
+            print(f"  {len(latencies):6,} lookups  {found / max(1, len(latencies)):6.1%} with products  "
+                  f"p50 {percentile(latencies, 50):8.1f} ms  p99 {percentile(latencies, 99):8.1f} ms  "
+                  f"breaker {breaker.state} (timeout {stats['timeout']:.3f}s, {stats['rejected']:,} rejected)")
+    finally:
+        await providers.close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phase-seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--reset", type=float, default=2.0, help="seconds an open breaker waits before probing")
+    parser.add_argument("--delay", type=float, default=0.02, help="stub latency when healthy")
+    args = parser.parse_args()
+
+    stub = stub_upstream.start(delay=args.delay)
+    # providers (and breaker) read their configuration at import time
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ["BREAKER_RESET_TIMEOUT"] = str(args.reset)
+    print("half-open probes")
+    ok = check_probes()
+    try:
+        asyncio.run(run(args, stub))
+    finally:
+        stub.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
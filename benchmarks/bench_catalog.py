@@ -0,0 +1,115 @@
+"""Memory footprint of the product catalog: plain dicts vs ProductRecord.
+
+Each representation is built in a fresh subprocess so ``ru_maxrss`` only
+reflects that one, then the JSON loader and the search/suggestion indexes
+are measured on the same synthetic catalog. Finally the catalog build
+(search index and autocomplete) is timed without tracemalloc; the exit
+status is 1 if it takes longer than ``--max-build-us`` per product, which an
+index build that is not close to linear exceeds long before 1M products:
+
+    python -m benchmarks.bench_catalog --products 1000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from backend.catalog import Catalog, ProductRecord, load_products
+
+CATEGORIES = ["electronics", "food", "clothing", "automotive", "beauty", "home"]
+
+
+def synthetic_products(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    brands = [f"Brand {i}" for i in range(5000)]
+    for i in range(count):
+        score = rng.randint(0, 100)
+        yield {
+            "id": i,
+            "name": f"Product {i} {rng.choice(CATEGORIES).title()}",
+            # Built per product, as a parser would: no sharing unless interned
+            "brand": "".join(rng.choice(brands)),
+            "category": "".join(rng.choice(CATEGORIES)),
+            "score": score,
+            "breakdown": {"carbon": max(0, 50 - score), "water": max(0, 30 - score), "other": max(0, 20 - score)},
+            "image": "",
+            "alternatives": [],
+        }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(mode: str, count: int, path: str) -> None:
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    tracemalloc.start()
+    if mode == "dicts":
+        products = list(synthetic_products(count))
+    elif mode == "records":
+        products = [ProductRecord.from_dict(p) for p in synthetic_products(count)]
+    elif mode == "load":
+        products = load_products(path)
+    else:
+        products = Catalog(load_products(path))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+    print(f"  {mode:<8} {elapsed:6.1f}s  {current / 1e6:8.1f} MB live  {current / count:6.0f} B/product  "
+          f"peak RSS +{peak_rss_mb() - baseline:.1f} MB  ({len(products):,} products)")
+
+
+def build(count: int, path: str, max_us: float) -> None:
+    products = load_products(path)
+    start = time.perf_counter()
+    Catalog(products)
+    elapsed = time.perf_counter() - start
+    per_product = elapsed / count * 1e6
+    ok = per_product <= max_us
+    print(f"  build    {elapsed:6.1f}s  {per_product:8.1f} us/product  "
+          f"{'ok' if ok else 'FAIL'} (limit {max_us:.0f} us/product)")
+    sys.exit(0 if ok else 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--max-build-us", type=float, default=150, help="catalog build time budget per product")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        if args.measure[0] == "build":
+            build(args.products, args.measure[1], args.max_build_us)
+        else:
+            measure(args.measure[0], args.products, args.measure[1])
+        return
+
+    path = os.path.join(tempfile.mkdtemp(), "catalog.json")
+    start = time.perf_counter()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"products": list(synthetic_products(args.products))}, f)
+    print(f"fixture: {args.products:,} products in {time.perf_counter() - start:.1f}s ({path})")
+
+    # "catalog" includes the search index and autocomplete built on top
+    for mode in ("dicts", "records", "load", "catalog"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_catalog", "--products", str(args.products), "--measure", mode, path],
+            check=True,
+        )
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_catalog", "--products", str(args.products),
+        "--max-build-us", str(args.max_build_us), "--measure", "build", path])
+    sys.exit(result.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Concurrent read/write throughput of the default vs tuned engine.
+
+Each worker process opens its own engine (like a uvicorn worker) and runs a
+mix of single-row inserts and barcode lookups against the same database:
+
+    python -m benchmarks.bench_db_concurrency --workers 8
+    python -m benchmarks.bench_db_concurrency --url postgresql://user:pw@localhost/ecoscan_bench
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.database import make_engine
+
+
+def build_engine(mode: str, url: str):
+    if mode == "default":
+        # What database.py did before make_engine existed
+        return create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+    return make_engine(url)
+
+
+def worker(mode: str, url: str, worker_id: int, ops: int, write_ratio: float, results) -> None:
+    engine = build_engine(mode, url)
+    Session = sessionmaker(bind=engine)
+    done = errors = 0
+    start = time.perf_counter()
+    for i in range(ops):
+        barcode = f"{worker_id:03d}{i:010d}"
+        session = Session()
+        try:
+            if (i % 100) < write_ratio * 100:
+                session.add(models.Scan(barcode=barcode, score=i % 100, breakdown={"carbon": 1, "water": 2, "other": 3}))
+                session.commit()
+            else:
+                session.execute(select(models.Scan.score).where(models.Scan.barcode == barcode[:-1] + "0")).first()
+            done += 1
+        except OperationalError:
+            session.rollback()
+            errors += 1
+        finally:
+            session.close()
+    results.put((done, errors, time.perf_counter() - start))
+    engine.dispose()
+
+
+def run(mode: str, url: str, workers: int, ops: int, write_ratio: float):
+    engine = build_engine(mode, url)
+    models.Base.metadata.drop_all(bind=engine, tables=[models.Scan.__table__])
+    models.Base.metadata.create_all(bind=engine, tables=[models.Scan.__table__])
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(mode, url, w, ops, write_ratio, results)) for w in range(workers)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    done = sum(s[0] for s in stats)
+    errors = sum(s[1] for s in stats)
+    print(f"  {mode:<8} {done / elapsed:9,.0f} ops/s  {errors:6,} errors ({errors / (workers * ops):.1%})  {elapsed:6.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="database URL; defaults to a temp SQLite file per mode")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500, help="operations per worker")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.ops} ops, {args.write_ratio:.0%} writes")
+    for mode in ("default", "tuned"):
+        url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), f"{mode}.db")
+        run(mode, url, args.workers, args.ops, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
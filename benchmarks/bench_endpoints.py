@@ -0,0 +1,229 @@
+"""Throughput and latency of every EcoScan endpoint, saved as JSON.
+
+Upstream providers are pointed at the local stub in ``stub_upstream`` and
+scans go to a throwaway SQLite file, so runs are reproducible offline. The
+apps are driven either in-process through an ASGI transport or over HTTP
+against uvicorn processes launched for the run:
+
+    python -m benchmarks.bench_endpoints --output bench/$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_endpoints --mode http --concurrency 64
+    python -m benchmarks.bench_endpoints --compare bench/old.json --output bench/new.json
+
+In-process runs also report the transient memory each request allocates
+(``alloc_kb``, measured sequentially with tracemalloc after the timed run).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks import stub_upstream
+from benchmarks.stats import percentile
+
+SEARCH_QUERIES = ["organic", "coffee", "apple", "shoes", "water", "tesla", "honey", "bamboo"]
+SUGGESTION_PREFIXES = ["o", "or", "org", "app", "te", "be", "sus", "ho", "ni", "re"]
+
+# name -> (app module, method, path, request kwargs for the i-th request)
+SCENARIOS = {
+    "scan_get": ("backend.server", "GET", "/api/scan", lambda i: {"params": {"barcode": f"{i:013d}"}}),
+    "scan_post": ("backend.server", "POST", "/api/scan", lambda i: {"json": {"barcode": f"{i:013d}"}}),
+    "scan_batch": ("backend.server", "POST", "/api/scan/batch",
+        lambda i: {"json": {"barcodes": [f"{i:07d}{j:06d}" for j in range(100)]}}),
+    "search": ("test_server", "GET", "/api/search",
+        lambda i: {"params": {"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}}),
+    "search_filter": ("test_server", "GET", "/api/search",
+        lambda i: {"params": {"category": "food", "sustainability": "excellent"}}),
+    "suggestions": ("test_server", "GET", "/api/suggestions",
+        lambda i: {"params": {"q": SUGGESTION_PREFIXES[i % len(SUGGESTION_PREFIXES)]}}),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(client: httpx.AsyncClient, scenario: str, requests: int, concurrency: int) -> dict:
+    """Send ``requests`` requests from ``concurrency`` workers and summarise them."""
+    _, method, path, build = SCENARIOS[scenario]
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.request(method, path, **build(i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def measure_allocations(client: httpx.AsyncClient, scenario: str, requests: int) -> float:
+    """Mean peak KB traced by tracemalloc per request, one request at a time."""
+    _, method, path, build = SCENARIOS[scenario]
+    total = 0
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            kwargs = build(i)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await client.request(method, path, **kwargs)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return round(total / requests / 1024, 1)
+
+
+async def run_in_process(scenarios, args) -> dict:
+    results = {}
+    for scenario in scenarios:
+        app = importlib.import_module(SCENARIOS[scenario][0]).app
+        # ASGITransport does not send lifespan events; run startup/shutdown here
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                await drive(client, scenario, args.warmup, args.concurrency)
+                results[scenario] = await drive(client, scenario, args.requests, args.concurrency)
+                results[scenario]["alloc_kb"] = await measure_allocations(client, scenario, args.alloc_requests)
+        report(scenario, results[scenario])
+    return results
+
+
+def launch(module: str, env: dict) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/openapi.json").status_code == 200:
+                return proc, url
+        except httpx.TransportError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"uvicorn {module}:app did not start")
+
+
+async def run_http(scenarios, args) -> dict:
+    results = {}
+    servers = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        for scenario in scenarios:
+            module = SCENARIOS[scenario][0]
+            if module not in servers:
+                servers[module] = launch(module, dict(os.environ))
+            async with httpx.AsyncClient(base_url=servers[module][1], limits=limits, timeout=30) as client:
+                await drive(client, scenario, args.warmup, args.concurrency)
+                results[scenario] = await drive(client, scenario, args.requests, args.concurrency)
+            report(scenario, results[scenario])
+    finally:
+        for proc, _ in servers.values():
+            proc.terminate()
+            proc.wait()
+    return results
+
+
+def report(scenario: str, result: dict) -> None:
+    alloc = f"  {result['alloc_kb']:8.1f} KB/req" if "alloc_kb" in result else ""
+    print(f"  {scenario:<14} {result['rps']:9,.0f} req/s  p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}  "
+        f"p99 {result['p99_ms']:7.2f} ms  {result['errors']:5,} errors{alloc}")
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"vs {previous.get('commit') or '?'} ({previous.get('mode')}, concurrency {previous.get('concurrency')})")
+    for scenario, result in current["results"].items():
+        old = previous.get("results", {}).get(scenario)
+        if old is None:
+            continue
+        print(f"  {scenario:<14} req/s {result['rps'] / old['rps'] - 1:+7.1%}  p99 {result['p99_ms'] / old['p99_ms'] - 1:+7.1%}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--alloc-requests", type=int, default=200, help="requests traced for alloc_kb (in-process only)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    # Configure the apps before they are imported (in-process) or launched (http)
+    stub = stub_upstream.start()
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+    print(f"{args.mode}: {args.requests:,} requests per scenario, concurrency {args.concurrency}")
+    runner = run_in_process if args.mode == "inprocess" else run_http
+    try:
+        results = asyncio.run(runner(args.scenarios, args))
+    finally:
+        stub.shutdown()
+
+    current = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), current)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Peak memory of /api/scans/export compared with loading rows via .all().
+
+Builds a large SQLite fixture once, then measures each mode in a fresh
+subprocess so ``ru_maxrss`` is not polluted by the other run. Streaming
+must not need memory in proportion to the rows: the exit status is 1 if
+an export raises peak RSS by more than ``--max-growth-mb`` over the
+import, whatever ``--rows`` is (the ``.all()`` run is only reported).
+The runs disable SQLite's memory map, whose file pages would otherwise
+count towards RSS up to the size of the database:
+
+    python -m benchmarks.bench_export --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+
+from backend import eco_data, models
+
+
+def build_fixture(path: str, rows: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine, tables=[models.Scan.__table__])
+    batch = 50_000
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            barcodes = [f"{i:013d}" for i in range(start, min(start + batch, rows))]
+            conn.execute(insert(models.Scan), [
+                {"barcode": b, "score": score, "breakdown": breakdown}
+                for b, (score, breakdown) in zip(barcodes, eco_data.compute_scores(barcodes))
+            ])
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def asgi_get(app, path: str, query: str) -> int:
+    """Issue a GET straight to the ASGI app and count body bytes.
+
+    The test client buffers whole responses, which would hide whether the
+    endpoint itself streams.
+    """
+    size = 0
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Never disconnect; the response cancels this wait when it is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+def measure(mode: str, fmt: str, max_growth_mb: float) -> bool:
+    from backend import server
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    if mode == "stream":
+        size = asyncio.run(asgi_get(server.app, "/api/scans/export", f"format={fmt}"))
+    else:
+        session = server.SessionLocal()
+        try:
+            for scan in session.query(models.Scan).all():
+                size += len(scan.barcode)
+        finally:
+            session.close()
+    elapsed = time.perf_counter() - start
+    growth = peak_rss_mb() - baseline
+    ok = mode != "stream" or growth <= max_growth_mb
+    verdict = "" if mode != "stream" else f"  {'ok' if ok else 'OVER'} (limit +{max_growth_mb:g} MB)"
+    print(f"  {mode:<7} {fmt:<7} {elapsed:6.1f}s  peak RSS {peak_rss_mb():7.1f} MB "
+          f"(+{growth:.1f} MB over import)  {size / 1e6:,.1f} MB read{verdict}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-growth-mb", type=float, default=32,
+        help="largest peak RSS growth allowed for a streamed export, independent of --rows")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        sys.exit(0 if measure(*args.measure, args.max_growth_mb) else 1)
+
+    path = os.path.join(tempfile.mkdtemp(), "export.db")
+    start = time.perf_counter()
+    build_fixture(path, args.rows)
+    print(f"fixture: {args.rows:,} scans in {time.perf_counter() - start:.1f}s ({path})")
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", SQLITE_MMAP_SIZE="0")
+    ok = True
+    for mode, fmt in (("stream", "ndjson"), ("stream", "csv"), ("all", "-")):
+        result = subprocess.run([sys.executable, "-m", "benchmarks.bench_export", "--measure", mode, fmt,
+            "--max-growth-mb", str(args.max_growth_mb)], env=env)
+        ok &= result.returncode == 0
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
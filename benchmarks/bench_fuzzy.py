@@ -0,0 +1,194 @@
+"""Typo-tolerant search: relevance on the catalog and latency at scale.
+
+First checks misspelled queries against the shipped catalog (each must
+find its product within the top 3) and nonsense queries (which must find
+nothing), and the recall of ``TrigramIndex.similar``: for words one or
+two edits away from a vocabulary token it must return exactly the tokens,
+and distances, that a full optimal string alignment scan of the vocabulary
+finds. The exit status is 1 if any check fails. Then indexes
+``--products`` synthetic products and times exact and misspelled queries
+through ``SearchIndex.search``, plus verifying the same misspellings
+against the whole vocabulary instead of the trigram candidates. The
+synthetic words are built from a few syllables, so they share far more
+trigrams (and so yield more candidates) than real product names do:
+
+    python -m benchmarks.bench_fuzzy --products 100000
+"""
+import argparse
+import random
+import sys
+import time
+
+from backend.catalog import CatalogStore, ProductRecord
+from backend.fuzzy import TrigramIndex, bounded_distance, max_edits
+from backend.search_index import SearchIndex
+from benchmarks.stats import percentile
+
+# misspelled query -> name of the product it should find
+RELEVANCE = {
+    "iphnoe": "iPhone 15 Pro",
+    "samsng galaxy": "Samsung Galaxy S24",
+    "macbok pro": "MacBook Pro M3",
+    "sneakres": "Veja V-10 Sneakers",
+    "patagona sweater": "Patagonia Better Sweater",
+    "orgnaic quinoa": "Organic Quinoa",
+    "qinoa": "Organic Quinoa",
+    "cofee": "Fair Trade Coffee",
+    "avocdo": "Organic Avocado",
+    "bambo cutting": "Bamboo Cutting Board",
+    "tesal": "Tesla Model 3",
+    "hemp hodie": "Hemp Hoodie",
+}
+NO_MATCH = ["xyzzy", "qwertyuiop", "zz top"]
+# misspellings sharing no trigram with the word they should find
+NO_SHARED_TRIGRAM = {"wseaetr": "sweater", "umstnag": "mustang"}
+
+
+def check_relevance() -> bool:
+    index = CatalogStore().current.search_index
+    names = {p.name for p in index.search()}
+    ok = True
+    for query, expected in RELEVANCE.items():
+        if expected not in names:
+            print(f"  skip {query!r}: {expected!r} is not in the catalog")
+            continue
+        top = [p.name for p in index.search(query, limit=3)]
+        hit = expected in top
+        ok &= hit
+        print(f"  {'ok  ' if hit else 'MISS'} {query!r:<20} -> {top}")
+    for query in NO_MATCH:
+        found = [p.name for p in index.search(query, limit=3)]
+        ok &= not found
+        print(f"  {'ok  ' if not found else 'MISS'} {query!r:<20} -> {found}")
+    return ok
+
+
+def osa_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance over the full matrix: the reference for ``similar``."""
+    d = [[i + j if not i or not j else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def check_recall(queries: int, rng: random.Random) -> bool:
+    tokens = set(CatalogStore().current.search_index._vocabulary._tokens)
+    vocabulary = sorted(tokens | set(make_words(2000, rng)) | set(NO_SHARED_TRIGRAM.values()))
+    index = TrigramIndex()
+    for token in vocabulary:
+        index.add(token)
+    words = list(NO_SHARED_TRIGRAM)
+    while len(words) < queries:
+        word = rng.choice(vocabulary)
+        for _ in range(rng.randint(1, 2)):
+            word = misspell(word, rng)
+        words.append(word)
+
+    misses = 0
+    expected_total = 0
+    for word in words:
+        limit = max_edits(len(word))
+        expected = {}
+        for token in vocabulary:
+            if abs(len(token) - len(word)) <= limit:
+                distance = osa_distance(word, token)
+                if distance <= limit:
+                    expected[token] = distance
+        found = index.similar(word)
+        expected_total += len(expected)
+        if found != expected:
+            misses += 1
+            if misses <= 5:
+                print(f"  MISS {word!r}: similar {found}, full scan {expected}")
+    ok = misses == 0
+    for word, token in NO_SHARED_TRIGRAM.items():
+        ok &= token in index.similar(word)
+    print(f"  {'ok  ' if ok else 'FAIL'} {len(words)} misspellings, {expected_total} tokens within the limit, "
+        f"{misses} lookups differ from the full scan")
+    return ok
+
+
+def make_words(count: int, rng: random.Random):
+    syllables = ["ba", "co", "de", "fi", "go", "hu", "ka", "lo", "me", "ni", "po", "ra", "si", "tu", "ve", "zo",
+                 "an", "er", "in", "on", "us", "tr", "st", "pl"]
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))))
+    return sorted(words)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    edit = rng.choice(("swap", "drop", "replace", "insert"))
+    if edit == "swap" and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if edit == "drop":
+        return word[:i] + word[i + 1:]
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if edit == "replace":
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+
+def timed(fn, queries):
+    samples = []
+    found = 0
+    for query in queries:
+        start = time.perf_counter_ns()
+        found += bool(fn(query))
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return samples, found
+
+
+def report(label: str, samples, found: int) -> None:
+    print(f"  {label:<28} p50 {percentile(samples, 50):9.1f}  p99 {percentile(samples, 99):9.1f} us  "
+          f"{found / len(samples):6.1%} found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=30_000, help="distinct words in product names")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--recall-queries", type=int, default=300, help="misspellings checked against a full scan")
+    args = parser.parse_args()
+
+    print("relevance (shipped catalog)")
+    ok = check_relevance()
+    print("recall (catalog and 2,000 synthetic tokens)")
+    ok &= check_recall(args.recall_queries, random.Random(11))
+
+    rng = random.Random(7)
+    words = make_words(args.words, rng)
+    brands = [w.title() for w in rng.sample(words, 500)]
+    products = [
+        ProductRecord(i, " ".join(rng.choice(words).title() for _ in range(rng.randint(2, 4))), rng.choice(brands),
+            rng.choice(["food", "clothing", "home", "beauty"]), rng.randint(0, 100))
+        for i in range(args.products)
+    ]
+    start = time.perf_counter()
+    index = SearchIndex(products)
+    print(f"index: {args.products:,} products, {len(index._vocabulary):,} distinct tokens "
+        f"in {time.perf_counter() - start:.1f}s")
+
+    sample = [rng.choice(products) for _ in range(args.queries)]
+    exact = [rng.choice(p.name.split()).lower() for p in sample]
+    typos = [misspell(word, rng) for word in exact]
+    vocabulary = list(index._tokens)
+
+    def brute_force(word):
+        limit = max_edits(len(word))
+        return [t for t in vocabulary if bounded_distance(word, t, limit) <= limit]
+
+    print(f"latency ({args.queries:,} queries, limit 24)")
+    report("exact word", *timed(lambda q: index.search(q, limit=24), exact))
+    report("misspelled word", *timed(lambda q: index.search(q, limit=24), typos))
+    report("misspelled, whole vocabulary", *timed(brute_force, typos[:200]))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
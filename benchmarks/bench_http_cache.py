@@ -0,0 +1,183 @@
+"""HTTP caching of read endpoints: conditional requests and compressed bytes.
+
+Runs both apps in-process (upstream stub, throwaway SQLite database and a
+temporary copy of the catalog) and first checks the behaviour; the exit
+status is 1 if any check fails:
+
+- responses carry an ``ETag`` and ``Cache-Control``, and sending the tag
+  back in ``If-None-Match`` gets an empty ``304``;
+- a 304 for ``/api/search`` does not run the search;
+- the same parameters in another order share a tag;
+- a new catalog version invalidates search and suggestion tags;
+- compressed bodies decode to exactly the uncompressed JSON.
+
+Then, per scenario, it reports the bytes on the wire without compression,
+with gzip (and brotli when installed) and for a 304, and the median
+latency of full responses against revalidations:
+
+    python -m benchmarks.bench_http_cache --requests 500
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from backend.http_cache import COMPRESS_MIN_BYTES
+from benchmarks import stub_upstream
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# name -> (app module, path, query parameters)
+SCENARIOS = {
+    "search q": ("test_server", "/api/search", {"q": "organic"}),
+    "search filter, 100": ("test_server", "/api/search", {"category": "food", "limit": "100"}),
+    "suggestions": ("test_server", "/api/suggestions", {"q": "or"}),
+    "scan": ("backend.server", "/api/scan", {"barcode": "0000000000042"}),
+}
+
+
+async def fetch(client: httpx.AsyncClient, path: str, params: dict, **headers) -> httpx.Response:
+    # Read the raw body so the byte counts are what went over the wire
+    async with client.stream("GET", path, params=params, headers=headers) as response:
+        response.raw_body = b"".join([chunk async for chunk in response.aiter_raw()])
+    return response
+
+
+def decoded(response: httpx.Response) -> bytes:
+    encoding = response.headers.get("content-encoding")
+    if encoding == "gzip":
+        return gzip.decompress(response.raw_body)
+    if encoding == "br":
+        return brotli.decompress(response.raw_body)
+    return response.raw_body
+
+
+async def median_us(client, path: str, params: dict, requests: int, **headers) -> float:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await fetch(client, path, params, **headers)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+class Checks:
+    def __init__(self):
+        self.ok = True
+
+    def __call__(self, passed: bool, what: str) -> None:
+        self.ok &= bool(passed)
+        print(f"  {'ok  ' if passed else 'FAIL'} {what}")
+
+
+async def check(clients, apps, catalog_path: str) -> bool:
+    checks = Checks()
+    for name, (module, path, params) in SCENARIOS.items():
+        client = clients[module]
+        plain = await fetch(client, path, params, **{"accept-encoding": "identity"})
+        etag = plain.headers.get("etag")
+        checks(plain.status_code == 200 and etag and plain.headers.get("cache-control"), f"{name}: ETag {etag}")
+        again = await fetch(client, path, params, **{"if-none-match": etag, "accept-encoding": "identity"})
+        checks(again.status_code == 304 and not again.raw_body, f"{name}: If-None-Match gets an empty 304")
+        packed = await fetch(client, path, params, **{"accept-encoding": "gzip"})
+        if len(plain.raw_body) >= COMPRESS_MIN_BYTES:
+            checks(packed.headers.get("content-encoding") == "gzip" and decoded(packed) == plain.raw_body,
+                f"{name}: gzip body decodes to the same JSON")
+            revalidated = await fetch(client, path, params, **{"if-none-match": packed.headers["etag"]})
+            checks(revalidated.status_code == 304, f"{name}: the gzip tag revalidates too")
+        else:
+            checks("content-encoding" not in packed.headers, f"{name}: {len(plain.raw_body)} bytes stay uncompressed")
+
+    search, client = apps["test_server"], clients["test_server"]
+    params = {"category": "food", "sustainability": "good"}
+    first = await fetch(client, "/api/search", params)
+    executed = search.search_flight.stats()["executed"]
+    for _ in range(10):
+        await fetch(client, "/api/search", params, **{"if-none-match": first.headers["etag"]})
+    checks(search.search_flight.stats()["executed"] == executed, "search: revalidations do not run the search")
+    swapped = await fetch(client, "/api/search", dict(reversed(list(params.items()))))
+    checks(swapped.headers["etag"] == first.headers["etag"], "search: parameter order does not change the tag")
+
+    suggestion = await fetch(client, "/api/suggestions", {"q": "or"})
+    # A catalog file with a new mtime is a new version, even with the same products
+    os.utime(catalog_path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    await client.post("/api/catalog/reload")
+    stale = await fetch(client, "/api/search", params, **{"if-none-match": first.headers["etag"]})
+    checks(stale.status_code == 200, "search: a new catalog version invalidates the tag")
+    stale = await fetch(client, "/api/suggestions", {"q": "or"}, **{"if-none-match": suggestion.headers["etag"]})
+    checks(stale.status_code == 200, "suggestions: a new catalog version invalidates the tag")
+    return checks.ok
+
+
+async def measure(clients, requests: int) -> None:
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"{'':<20}" + "".join(f"{e:>10}" for e in encodings) + f"{'304':>8}   {'full':>9} {'revalidated':>12}")
+    for name, (module, path, params) in SCENARIOS.items():
+        client = clients[module]
+        sizes = []
+        for encoding in encodings:
+            response = await fetch(client, path, params, **{"accept-encoding": encoding})
+            sizes.append(len(response.raw_body))
+        etag = response.headers["etag"]
+        not_modified = await fetch(client, path, params, **{"if-none-match": etag})
+        full = await median_us(client, path, params, requests, **{"accept-encoding": "gzip"})
+        revalidated = await median_us(client, path, params, requests, **{"if-none-match": etag})
+        print(f"{name:<20}" + "".join(f"{size:>8} B" for size in sizes) + f"{len(not_modified.raw_body):>6} B"
+            f"   {full:6.0f} us {revalidated:9.0f} us")
+
+
+async def run(args, workdir: str) -> bool:
+    import test_server
+    from backend import server
+    # Serve a copy of the catalog so the check can give it a new version
+    catalog_path = os.path.join(workdir, os.path.basename(test_server.catalog_store.path))
+    shutil.copyfile(test_server.catalog_store.path, catalog_path)
+    test_server.catalog_store.path = catalog_path
+    apps = {"test_server": test_server, "backend.server": server}
+    async with test_server.app.router.lifespan_context(test_server.app), \
+            server.app.router.lifespan_context(server.app):
+        clients = {
+            module: httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench")
+            for module, app in apps.items()
+        }
+        try:
+            print("checks")
+            ok = await check(clients, apps, catalog_path)
+            print(f"bytes per response and median latency ({args.requests} requests)")
+            await measure(clients, args.requests)
+        finally:
+            for client in clients.values():
+                await client.aclose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300, help="timed requests per scenario and kind")
+    args = parser.parse_args()
+
+    # Configure the apps before they are imported
+    stub = stub_upstream.start()
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(workdir, "bench.db"))
+    try:
+        ok = asyncio.run(run(args, workdir))
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
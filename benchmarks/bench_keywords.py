@@ -0,0 +1,78 @@
+"""Query scoring with a large keyword lexicon: per-keyword loops vs one automaton.
+
+Builds a synthetic weighted lexicon (plus category keywords), checks that the
+compiled ``Lexicon.analyze`` agrees with the original loop-per-keyword
+approach, and times both on the same queries:
+
+    python -m benchmarks.bench_keywords --keywords 10000
+"""
+import argparse
+import random
+import string
+import time
+
+from backend.keywords import Lexicon
+
+CATEGORIES = ["food", "electronics", "clothing", "automotive", "beauty", "home"]
+
+
+def synthetic_lexicon(count: int, rng: random.Random):
+    keywords = set()
+    while len(keywords) < count:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 2))]
+        keywords.add(" ".join(words))
+    keywords = sorted(keywords)
+    weights = {k: rng.choice((-20, -10, -5, 5, 10, 15)) for k in keywords[: count * 4 // 5]}
+    categories = {c: [] for c in CATEGORIES}
+    for k in keywords[count * 4 // 5:]:
+        categories[rng.choice(CATEGORIES)].append(k)
+    return weights, categories, keywords
+
+
+def naive(query: str, weights, categories) -> tuple:
+    # The shape of the original calculate_query_sustainability_score and
+    # determine_category: one substring test per keyword
+    score = 50
+    for keyword, weight in weights.items():
+        if keyword in query:
+            score += weight
+    category = "general"
+    for name, keywords in categories.items():
+        if any(keyword in query for keyword in keywords):
+            category = name
+            break
+    return min(100, max(0, score)), category
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    weights, categories, keywords = synthetic_lexicon(args.keywords, rng)
+    start = time.perf_counter()
+    lexicon = Lexicon(weights, categories)
+    print(f"compiled {len(lexicon.matcher):,} keywords in {time.perf_counter() - start:.2f}s")
+
+    # Queries mix lexicon keywords with noise, like "organic oat milk 1l"
+    queries = []
+    for _ in range(args.queries):
+        words = [rng.choice(keywords) if rng.random() < 0.3 else "".join(rng.choices(string.ascii_lowercase, k=5))
+                 for _ in range(rng.randint(1, 5))]
+        queries.append(" ".join(words))
+
+    for label, fn in (("naive loop", lambda q: naive(q, weights, categories)), ("automaton", lexicon.analyze)):
+        start = time.perf_counter()
+        results = [fn(q) for q in queries]
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<11} {elapsed / len(queries) * 1e6:9.1f} us/query")
+        if label == "naive loop":
+            expected = results
+        elif results != expected:
+            raise SystemExit("automaton results differ from the naive loop")
+
+
+if __name__ == "__main__":
+    main()
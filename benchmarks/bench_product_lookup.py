@@ -0,0 +1,99 @@
+"""Barcode lookup latency on a skewed (Zipf) scan workload.
+
+Fills a temporary SQLite products table, then replays Zipf-distributed
+barcodes (a few products get most of the scans; ``--unknown`` of them are
+not in the table) through ``ProductStore.get`` with and without the hot-key
+cache, reporting latency for cache hits and for lookups that reach SQLite:
+
+    python -m benchmarks.bench_product_lookup --products 1000000 --lookups 200000
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from backend import models
+from backend.cache import TTLCache
+from backend.database import make_engine
+from backend.product_store import ProductStore, ensure_search_index
+from benchmarks.stats import percentile
+
+
+def zipf_ranks(n: int, s: float, count: int, rng: random.Random):
+    """``count`` ranks in ``[0, n)``, rank k drawn with weight 1 / (k + 1) ** s."""
+    cumulative = list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+    total = cumulative[-1]
+    for _ in range(count):
+        yield bisect.bisect_left(cumulative, rng.random() * total)
+
+
+def build_table(engine, count: int) -> None:
+    ensure_search_index(engine)
+    batch = 50_000
+    with engine.begin() as conn:
+        for start in range(0, count, batch):
+            conn.execute(insert(models.Product), [
+                {"barcode": f"{i:013d}", "name": f"Product {i}", "brand": "Bench", "category": "food",
+                 "score": i % 101, "carbon": 1, "water": 2, "other": 3, "image": ""}
+                for i in range(start, min(start + batch, count))
+            ])
+
+
+def report(label: str, timings) -> None:
+    if not timings:
+        return
+    print(f"  {label:<22} {len(timings):9,}  p50 {percentile(timings, 50):7.1f}  p99 {percentile(timings, 99):7.1f}  "
+          f"p99.9 {percentile(timings, 99.9):8.1f}  max {max(timings):8.1f} us")
+
+
+def run(store: ProductStore, barcodes) -> None:
+    cache = store.cache
+    hits, misses = [], []
+    for barcode in barcodes:
+        before = cache.hits if cache is not None else 0
+        start = time.perf_counter_ns()
+        store.get(barcode)
+        elapsed = (time.perf_counter_ns() - start) / 1000
+        (hits if cache is not None and cache.hits > before else misses).append(elapsed)
+    report("cache hits", hits)
+    report("table lookups", misses)
+    if cache is not None:
+        print(f"  hit ratio {len(hits) / len(barcodes):.1%}, {len(cache):,} cached barcodes, {cache.bytes / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent; higher is more skewed")
+    parser.add_argument("--unknown", type=float, default=0.1, help="fraction of scanned barcodes not in the table")
+    parser.add_argument("--cache-mb", type=float, default=16)
+    args = parser.parse_args()
+
+    engine = make_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "products.db"))
+    start = time.perf_counter()
+    build_table(engine, args.products)
+    print(f"table: {args.products:,} products in {time.perf_counter() - start:.1f}s")
+
+    # Popularity ranks map onto a shuffled mix of known and unknown barcodes
+    rng = random.Random(42)
+    universe = int(args.products / (1 - args.unknown))
+    ids = list(range(universe))
+    rng.shuffle(ids)
+    barcodes = [f"{ids[rank]:013d}" for rank in zipf_ranks(universe, args.zipf, args.lookups, rng)]
+
+    print(f"{args.lookups:,} lookups, zipf s={args.zipf}, {args.unknown:.0%} unknown barcodes")
+    print("without cache")
+    run(ProductStore(engine), barcodes)
+    print(f"with {args.cache_mb:g} MB hot-key cache")
+    cache = TTLCache(max_bytes=int(args.cache_mb * 1024 * 1024), ttl=3600, negative_ttl=300, stale_ttl=0)
+    run(ProductStore(engine, cache=cache), barcodes)
+
+
+if __name__ == "__main__":
+    main()
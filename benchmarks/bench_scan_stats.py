@@ -0,0 +1,133 @@
+"""Scan analytics queries on hourly rollups vs GROUP BY over the raw scans.
+
+Fills a temporary SQLite database with Zipf-distributed scans spread over
+``--days``, written in batches the way the scan writer does (insert plus
+``scan_stats.apply`` in one transaction), and checks the rollups against the
+raw table; then rebuilds them and checks again. The exit status is 1 if
+either check finds a mismatch. Finally it times the same dashboard questions
+both ways: one barcode's score histogram, per-category totals, and the top
+barcodes of the last day:
+
+    python -m benchmarks.bench_scan_stats --scans 1000000 --barcodes 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, insert, select
+
+from backend import models, scan_stats
+from backend.database import make_engine
+from benchmarks.bench_product_lookup import zipf_ranks
+
+CATEGORIES = ["food", "beverages", "snacks", "dairy", "household"]
+
+
+def write(engine, batch) -> None:
+    # What ScanWriter._flush does for each batch
+    with engine.begin() as conn:
+        conn.execute(insert(models.Scan), batch)
+        scan_stats.apply(conn, batch)
+
+
+def fill(engine, scans: int, barcodes: int, days: int, zipf: float, batch_size: int) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        # Half of the barcodes are known products with a category
+        conn.execute(insert(models.Product), [
+            {"barcode": f"{i:013d}", "name": f"Product {i}", "category": CATEGORIES[i % len(CATEGORIES)], "score": 50}
+            for i in range(0, barcodes, 2)
+        ])
+    batch = []
+    for rank in zipf_ranks(barcodes, zipf, scans, rng):
+        batch.append({"barcode": f"{rank:013d}", "score": rng.randint(0, 100), "breakdown": {},
+            "created_at": now - timedelta(seconds=rng.randint(0, days * 86400))})
+        if len(batch) == batch_size:
+            write(engine, batch)
+            batch = []
+    if batch:
+        write(engine, batch)
+
+
+def check(engine, what: str) -> bool:
+    problems = scan_stats.verify(engine)
+    print(f"verify after {what}: {'ok' if not problems else f'{len(problems):,} mismatches'}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    return not problems
+
+
+def timed(fn, repeat: int) -> float:
+    """Median milliseconds of ``repeat`` calls."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scans", type=int, default=1_000_000)
+    parser.add_argument("--barcodes", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=5_000, help="scans per writer transaction")
+    args = parser.parse_args()
+
+    engine = make_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "stats.db"))
+    start = time.perf_counter()
+    fill(engine, args.scans, args.barcodes, args.days, args.zipf, args.batch)
+    print(f"scans: {args.scans:,} over {args.days} days, {args.batch:,} per batch, in {time.perf_counter() - start:.1f}s")
+    ok = check(engine, "writes")
+
+    start = time.perf_counter()
+    scan_stats.rebuild(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count()).select_from(models.ScanRollup)).scalar()
+    print(f"rebuild: {rows:,} rollup rows in {time.perf_counter() - start:.1f}s")
+    ok = check(engine, "rebuild") and ok
+
+    scans, products = models.Scan, models.Product
+    bucket = case((scans.score >= 100, scan_stats.BUCKETS - 1), else_=scans.score * scan_stats.BUCKETS / 100)
+    hot = f"{0:013d}"
+    since = datetime.utcnow() - timedelta(days=1)
+    category = func.coalesce(products.category, scan_stats.UNKNOWN_CATEGORY)
+
+    with engine.connect() as conn:
+        questions = {
+            "barcode histogram": (
+                lambda: conn.execute(select(bucket, func.count(), func.sum(scans.score))
+                    .where(scans.barcode == hot).group_by(bucket)).all(),
+                lambda: scan_stats.barcode_stats(conn, hot),
+            ),
+            "category totals": (
+                lambda: conn.execute(select(category, bucket, func.count(), func.sum(scans.score))
+                    .select_from(scans.__table__.outerjoin(products.__table__, products.barcode == scans.barcode))
+                    .group_by(category, bucket)).all(),
+                lambda: scan_stats.category_stats(conn),
+            ),
+            "top barcodes, 1 day": (
+                lambda: conn.execute(select(scans.barcode, func.count().label("n"), func.sum(scans.score))
+                    .where(scans.created_at >= since).group_by(scans.barcode).order_by(func.count().desc()).limit(10)).all(),
+                lambda: scan_stats.top_barcodes(conn, 10, since=since),
+            ),
+        }
+        print(f"{'':<22} {'raw GROUP BY':>14} {'rollups':>10}")
+        for name, (raw, rollup) in questions.items():
+            raw_ms, rollup_ms = timed(raw, args.repeat), timed(rollup, args.repeat)
+            print(f"{name:<22} {raw_ms:11.1f} ms {rollup_ms:7.1f} ms  {raw_ms / rollup_ms:7.1f}x")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare per-request commits with the write-behind ScanWriter.
+
+Run from the repository root against SQLite (default, a temp file) and/or
+Postgres:
+
+    python -m benchmarks.bench_scan_writer
+    python -m benchmarks.bench_scan_writer --url postgresql://user:pw@localhost/ecoscan_bench
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from backend import eco_data, models
+from backend.database import make_engine
+from backend.scan_writer import ScanWriter
+
+
+def make_session_factory(url: str):
+    engine = make_engine(url)
+    models.Base.metadata.drop_all(bind=engine, tables=[models.Scan.__table__, models.ScanRollup.__table__, models.CategoryRollup.__table__])
+    models.Base.metadata.create_all(bind=engine, tables=[models.Scan.__table__, models.ScanRollup.__table__, models.CategoryRollup.__table__, models.Product.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def run_threads(count: int, threads: int, work) -> float:
+    per_thread = count // threads
+    start = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(t * per_thread, per_thread)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start
+
+
+def bench_sync(session_factory, count: int, threads: int) -> float:
+    def work(offset, n):
+        for i in range(offset, offset + n):
+            barcode = f"{i:013d}"
+            score, breakdown = eco_data.compute_score(barcode)
+            session = session_factory()
+            try:
+                session.add(models.Scan(barcode=barcode, score=score, breakdown=breakdown))
+                session.commit()
+            finally:
+                session.close()
+    return run_threads(count, threads, work)
+
+
+def bench_write_behind(session_factory, count: int, threads: int, flush_size: int):
+    writer = ScanWriter(session_factory, flush_size=flush_size, flush_interval=0.05, max_queue=50_000, put_timeout=5)
+    writer.start()
+
+    def work(offset, n):
+        for i in range(offset, offset + n):
+            barcode = f"{i:013d}"
+            score, breakdown = eco_data.compute_score(barcode)
+            writer.submit(barcode, score, breakdown)
+
+    submit = run_threads(count, threads, work)
+    start = time.perf_counter()
+    writer.stop()
+    return submit, submit + time.perf_counter() - start, writer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", action="append", help="database URL (repeatable); defaults to a temp SQLite file")
+    parser.add_argument("--scans", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--flush-sizes", default="100,500,2000")
+    args = parser.parse_args()
+
+    urls = args.url
+    if not urls:
+        urls = ["sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")]
+
+    for url in urls:
+        print(f"== {url.split('@')[-1]}  ({args.scans:,} scans, {args.threads} threads)")
+        session_factory = make_session_factory(url)
+        sync_count = min(args.scans, 2_000)
+        elapsed = bench_sync(session_factory, sync_count, args.threads)
+        print(f"  commit per scan        {sync_count / elapsed:10,.0f} scans/s  ({sync_count:,} scans)")
+        for size in (int(s) for s in args.flush_sizes.split(",")):
+            session_factory = make_session_factory(url)
+            submit, total, stats = bench_write_behind(session_factory, args.scans, args.threads, size)
+            print(f"  write-behind batch={size:<5} {args.scans / submit:10,.0f} scans/s accepted, "
+                  f"{args.scans / total:10,.0f} scans/s persisted ({stats['batches']} batches, {stats['failed']} failed)")
+
+
+if __name__ == "__main__":
+    main()
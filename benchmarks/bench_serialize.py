@@ -0,0 +1,99 @@
+"""Response serialization: generic encoding vs pre-encoded JSON fragments.
+
+Times turning 1,000 search results into a response body the way FastAPI
+did before (``to_dict``, ``jsonable_encoder``, then ``JSONResponse``),
+with the fast encoder on fresh dicts (what upstream products still cost),
+and by joining the cached fragments of catalog products. Then it does the
+same for ``ScanResponse``: what FastAPI does with ``response_model``
+(pydantic validation, then ``dump_json``), against ``scan_response``. The
+scan figures leave out the thread pool hop FastAPI adds to validate the
+result of a sync endpoint, which ``scan_response`` also avoids; see
+``bench_endpoints`` for whole requests. Every path must produce identical
+bytes; the exit status is 1 otherwise:
+
+    python -m benchmarks.bench_serialize --results 1000 --repeat 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from backend import fast_json
+from backend.catalog import ProductRecord
+
+
+def make_products(count: int, rng: random.Random):
+    words = ["Organic", "Bamboo", "Recycled", "Coffee", "Sneakers", "Quinoa", "Hoodie", "Bottle", "Soap", "Tea"]
+    return [
+        ProductRecord(i, f"{rng.choice(words)} {rng.choice(words)} {i}", rng.choice(["EcoBrand", "GreenChoice", "Café Vert"]),
+            rng.choice(["food", "clothing", "home"]), rng.randint(0, 100),
+            rng.randint(0, 50), rng.randint(0, 30), rng.randint(0, 20), f"https://img.example/{i}.jpg",
+            tuple((f"{rng.choice(words)} Alternative", rng.randint(0, 100)) for _ in range(rng.randint(0, 3))))
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    """Median microseconds of ``repeat`` calls."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=1000, help="products per response")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    products = make_products(args.results, random.Random(5))
+    for product in products:
+        product.to_json()
+
+    # Importing the app must not touch a real database
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    from backend.server import ScanResponse, scan_response
+    scans = [{"barcode": f"{i:013d}", "score": 40 + i % 60, "breakdown": {"carbon": i % 50, "water": i % 30, "other": i % 20}}
+        for i in range(args.results)]
+    scans[::2] = [{**scan, "name": f"Product {i}", "brand": "EcoBrand"} for i, scan in enumerate(scans[::2])]
+
+    search_paths = {
+        "jsonable_encoder + JSONResponse": lambda: JSONResponse(jsonable_encoder([p.to_dict() for p in products])).body,
+        "to_dict + fast_json.dumps": lambda: fast_json.dumps([p.to_dict() for p in products]),
+        "cached fragments": lambda: fast_json.array(p.to_json() for p in products),
+    }
+    model = TypeAdapter(ScanResponse)
+    scan_paths = {
+        "response_model=ScanResponse": lambda: [model.dump_json(model.validate_python(scan)) for scan in scans],
+        "scan_response": lambda: [scan_response(scan).body for scan in scans],
+    }
+
+    ok = True
+    print(f"encoder: {'orjson' if fast_json.orjson is not None else 'json'}")
+    for title, paths in ((f"search, {args.results:,} results", search_paths), (f"scan, {args.results:,} responses", scan_paths)):
+        print(title)
+        expected = None
+        baseline = None
+        for name, fn in paths.items():
+            body = fn()
+            same = expected is None or body == expected
+            expected = body if expected is None else expected
+            ok &= same
+            us = timed(fn, args.repeat)
+            baseline = baseline or us
+            print(f"  {name:<34} {us:9.0f} us  {baseline / us:6.1f}x{'' if same else '  DIFFERENT BYTES'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
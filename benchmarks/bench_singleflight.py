@@ -0,0 +1,87 @@
+"""Upstream calls made by bursts of identical searches, with and without coalescing.
+
+Fires ``--clients`` concurrent /api/search requests for the same term (as
+during a promotion) at test_server through the ASGI transport, against a
+slow local upstream stub, and counts the requests that reach the stub. The
+exit status is 1 unless coalescing brings that down to one per burst and
+below the uncoalesced count:
+
+    python -m benchmarks.bench_singleflight --clients 500 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import stub_upstream
+from benchmarks.stats import percentile
+
+
+async def burst(client: httpx.AsyncClient, clients: int, query: str, latencies) -> None:
+    async def one(i: int):
+        start = time.perf_counter()
+        # A few clients ask for a filtered view; they still share the upstream lookup
+        params = {"q": query, "sustainability": "excellent"} if i % 10 == 0 else {"q": query}
+        response = await client.get("/api/search", params=params)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(clients)))
+
+
+async def run(args, stub) -> dict:
+    """Upstream calls without and with coalescing, keyed by ``enabled``."""
+    import test_server
+    from backend import providers
+
+    handler = stub.RequestHandlerClass
+    counts = {}
+    transport = httpx.ASGITransport(app=test_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled in (False, True):
+            test_server.search_flight.enabled = test_server.upstream_flight.enabled = enabled
+            providers.provider_cache.clear()
+            before = handler.calls
+            latencies = []
+            start = time.perf_counter()
+            for r in range(args.rounds):
+                await burst(client, args.clients, f"promo {enabled} {r}", latencies)
+            elapsed = time.perf_counter() - start
+            calls = counts[enabled] = handler.calls - before
+            print(f"  coalescing {'on ' if enabled else 'off'}  {calls:6,} upstream calls for {len(latencies):,} searches  "
+                  f"p50 {percentile(latencies, 50):7.1f}  p99 {percentile(latencies, 99):7.1f} ms  {elapsed:5.1f}s")
+    await providers.close_client()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500, help="identical searches per burst")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.2, help="upstream latency in seconds")
+    args = parser.parse_args()
+
+    stub = stub_upstream.start(delay=args.delay)
+    # Configure the app before it is imported
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    # Keep the circuit breaker out of the comparison: the uncoalesced burst
+    # overloads the stub and would otherwise trip it for the coalesced run
+    os.environ.setdefault("BREAKER_MIN_CALLS", str(10**9))
+    print(f"{args.rounds} bursts of {args.clients} identical searches, upstream delay {args.delay}s")
+    try:
+        counts = asyncio.run(run(args, stub))
+    finally:
+        stub.shutdown()
+    if counts[True] > args.rounds or counts[True] >= counts[False]:
+        print(f"FAIL: coalescing made {counts[True]:,} upstream calls for {args.rounds} bursts "
+              f"({counts[False]:,} without)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
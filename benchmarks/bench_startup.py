@@ -0,0 +1,110 @@
+"""Cold start: import time and time to first response of each app.
+
+For every app this starts fresh interpreters and reports
+- the import time of the app module, from ``python -X importtime``, with
+  the slowest top-level imports;
+- the time from launching uvicorn to the first successful response, which
+  includes startup (lifespan) work such as creating tables and loading
+  the catalog, against ``--target-ms``.
+The exit status is 1 if any app misses the target, so this can gate CI:
+
+    python -m benchmarks.bench_startup --runs 5 --target-ms 2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.bench_endpoints import free_port
+
+# app module -> cheap endpoint that needs the app's startup work done
+APPS = {
+    "backend.server": "/api/scan?barcode=0000000000000",
+    "test_server": "/api/suggestions?q=or",
+}
+
+
+def import_profile(module: str, env: dict) -> tuple:
+    """Total import time of ``module`` (ms) and self+children time per top-level package."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True)
+    packages = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        name = name.rstrip()
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+        elif len(name) - len(name.lstrip()) == 3:
+            # Imports made directly by the app module (or its package)
+            packages[name.strip().split(".")[0]] += int(cumulative) / 1000
+    return total, sorted(packages.items(), key=lambda item: -item[1])
+
+
+def first_response(module: str, path: str, env: dict) -> float:
+    """Milliseconds from launching uvicorn to the first 200 from ``path``."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = start + 60
+        while time.perf_counter() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}{path}").status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                break
+            time.sleep(0.005)
+        raise RuntimeError(f"{module}:app did not answer {path}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=list(APPS), default=list(APPS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    parser.add_argument("--target-ms", type=float, default=2500, help="time-to-first-response budget (median)")
+    args = parser.parse_args()
+
+    missed = False
+    for module in args.apps:
+        # A new database each run, so table creation is part of the cold start
+        env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db"))
+        imports = [import_profile(module, env) for _ in range(args.runs)]
+        ttfr = []
+        for _ in range(args.runs):
+            env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+            ttfr.append(first_response(module, APPS[module], env))
+
+        median_ttfr = statistics.median(ttfr)
+        ok = median_ttfr <= args.target_ms
+        missed |= not ok
+        print(f"{module}")
+        print(f"  import        median {statistics.median(total for total, _ in imports):7.1f} ms")
+        for package, ms in imports[-1][1][:args.top]:
+            print(f"    {package:<20} {ms:7.1f} ms")
+        print(f"  first response median {median_ttfr:7.1f} ms  max {max(ttfr):7.1f} ms  "
+            f"target {args.target_ms:g} ms  {'ok' if ok else 'MISSED'}")
+    sys.exit(1 if missed else 0)
+
+
+if __name__ == "__main__":
+    main()
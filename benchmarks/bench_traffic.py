@@ -0,0 +1,302 @@
+"""Open-loop scan and search traffic for capacity planning.
+
+Requests come from a recorded access log (``--replay``: nginx/Apache
+common or combined format, or uvicorn's access log; the GET /api/scan and
+/api/search lines are replayed in order, looping if needed) or from a
+synthetic stream: Zipf-distributed barcodes for /api/scan, over a products
+table whose most popular ``--products`` barcodes are known, and
+Zipf-distributed catalog words for /api/search, mixed by ``--search-share``.
+
+The load is open loop: each request is sent at its arrival time (Poisson
+arrivals at the step's rate), whether or not earlier ones have been
+answered. A slow server therefore builds a backlog instead of slowing the
+client down, and latency counts from the arrival time. The rate goes up
+step by step (``--rates``, or ``--start`` times ``--factor``) until a step
+saturates: an endpoint sustains less than 95% of its offered rate, its p99
+exceeds ``--slo-ms`` or its error rate exceeds ``--max-errors``. Each step
+reports, per endpoint, the achieved rate, latency, queueing delay (latency
+minus the service time measured first on an idle server) and error rate.
+The last line is the saturation point, the highest rate every endpoint
+sustained.
+
+``backend.server`` (scans) and ``test_server`` (search) run under uvicorn,
+or under the launcher with ``--workers``, against the local upstream stub
+and a temporary SQLite database, so nothing leaves the machine. Pass
+``--scan-url``/``--search-url`` to load servers that are already running:
+
+    python -m benchmarks.bench_traffic --start 50 --factor 1.5 --duration 10
+    python -m benchmarks.bench_traffic --replay access.log --rates 100 200 400 --clients 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from backend.catalog import DEFAULT_CATALOG, load_products
+from backend.database import make_engine
+from backend.search_index import tokenize
+from benchmarks import bench_endpoints, bench_workers, stub_upstream
+from benchmarks.bench_product_lookup import build_table, zipf_ranks
+from benchmarks.stats import percentile
+
+ENDPOINTS = ("/api/scan", "/api/search")
+
+# Request line of common/combined and uvicorn access log entries
+_REQUEST_RE = re.compile(r'"GET (/\S*) HTTP/[\d.]+"')
+
+
+def read_log(path: str) -> list:
+    """``(endpoint, path with query)`` of the replayable requests in an access log."""
+    requests = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _REQUEST_RE.search(line)
+            if match is None:
+                continue
+            target = match.group(1)
+            endpoint = target.split("?", 1)[0]
+            if endpoint in ENDPOINTS:
+                requests.append((endpoint, target))
+    if not requests:
+        raise SystemExit(f"{path}: no GET /api/scan or /api/search requests found")
+    return requests
+
+
+class Synthetic:
+    """Zipf-skewed barcode and query streams."""
+
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self.rng = rng
+        words = sorted({word for product in load_products(DEFAULT_CATALOG)
+            for word in tokenize(f"{product.name} {product.brand}") if len(word) > 2})
+        # Popularity order is random, but the same for every run
+        rng.shuffle(words)
+        self.words = words
+
+    def take(self, count: int) -> list:
+        searches = sum(self.rng.random() < self.args.search_share for _ in range(count))
+        barcodes = zipf_ranks(self.args.barcodes, self.args.zipf, count - searches, self.rng)
+        queries = zipf_ranks(len(self.words), self.args.zipf, searches, self.rng)
+        requests = [("/api/scan", f"/api/scan?barcode={rank:013d}") for rank in barcodes]
+        requests += [("/api/search", f"/api/search?q={self.words[rank]}") for rank in queries]
+        self.rng.shuffle(requests)
+        return requests
+
+
+class Replay:
+    def __init__(self, requests: list):
+        self.requests = requests
+        self.position = 0
+
+    def take(self, count: int) -> list:
+        taken = []
+        while len(taken) < count:
+            chunk = self.requests[self.position:self.position + count - len(taken)]
+            taken += chunk
+            self.position = (self.position + len(chunk)) % len(self.requests)
+        return taken
+
+
+def client(urls: dict, schedule: list, start_at: float, timeout: float, max_connections: int) -> list:
+    """Send ``(due, endpoint, target)`` requests at their due time (seconds after the
+    wall-clock ``start_at``); returns ``(endpoint, due, latency, lag, status)`` samples."""
+    async def go():
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        samples = []
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as http:
+            loop = asyncio.get_running_loop()
+            origin = loop.time() + (start_at - time.time())
+
+            async def one(due, endpoint, target):
+                sent = loop.time()
+                try:
+                    status = (await http.get(urls[endpoint] + target)).status_code
+                except httpx.HTTPError:
+                    status = 0
+                samples.append((endpoint, due, loop.time() - origin - due, sent - origin - due, status))
+
+            tasks = []
+            for due, endpoint, target in schedule:
+                delay = origin + due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(due, endpoint, target)))
+            await asyncio.gather(*tasks)
+        return samples
+    return asyncio.run(go())
+
+
+def calibrate(urls: dict, source, count: int) -> dict:
+    """Median service time per endpoint on an idle server, one request at a time."""
+    service = {}
+    with httpx.Client(timeout=30) as http:
+        for endpoint in ENDPOINTS:
+            targets = [target for e, target in source.take(count * 20) if e == endpoint][:count]
+            samples = []
+            for target in targets:
+                start = time.perf_counter()
+                http.get(urls[endpoint] + target)
+                samples.append(time.perf_counter() - start)
+            if samples:
+                service[endpoint] = statistics.median(samples)
+    return service
+
+
+def run_step(rate: float, duration: float, args, urls: dict, source, service: dict, pool, rng: random.Random) -> dict:
+    count = max(1, int(rate * duration))
+    due, schedule = 0.0, []
+    for endpoint, target in source.take(count):
+        due += rng.expovariate(rate)
+        schedule.append((due, endpoint, target))
+    start_at = time.time() + 0.5
+    jobs = [pool.apply_async(client, (urls, schedule[i::args.clients], start_at, args.timeout, args.max_connections))
+        for i in range(args.clients)]
+    samples = [sample for job in jobs for sample in job.get()]
+
+    result = {"rate": rate, "endpoints": {}}
+    # Poisson arrivals: the schedule only lasts about ``duration`` seconds
+    scheduled = schedule[-1][0]
+    span = max(scheduled, max(d + latency for _, d, latency, _, _ in samples))
+    lags = [lag for *_, lag, _ in samples]
+    result["client_lag_p99_ms"] = percentile(lags, 99) * 1000
+    for endpoint in ENDPOINTS:
+        mine = [s for s in samples if s[0] == endpoint]
+        if not mine:
+            continue
+        ok = [latency for _, _, latency, _, status in mine if 200 <= status < 400]
+        latencies = [latency for _, _, latency, _, _ in mine]
+        queue = [max(0.0, latency - service.get(endpoint, 0.0)) for latency in latencies]
+        result["endpoints"][endpoint] = {
+            "offered": len(mine) / scheduled,
+            "achieved": len(ok) / span,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "queue_p50_ms": percentile(queue, 50) * 1000,
+            "queue_p99_ms": percentile(queue, 99) * 1000,
+            "error_rate": 1 - len(ok) / len(mine),
+        }
+    return result
+
+
+def saturated(step: dict, args) -> list:
+    """Reasons the step counts as saturated, per endpoint."""
+    reasons = []
+    for endpoint, stats in step["endpoints"].items():
+        if stats["achieved"] < 0.95 * stats["offered"]:
+            reasons.append(f"{endpoint} sustained {stats['achieved']:.0f} of {stats['offered']:.0f} req/s")
+        if stats["p99_ms"] > args.slo_ms:
+            reasons.append(f"{endpoint} p99 {stats['p99_ms']:.0f} ms > {args.slo_ms:.0f} ms")
+        if stats["error_rate"] > args.max_errors:
+            reasons.append(f"{endpoint} errors {stats['error_rate']:.1%}")
+    return reasons
+
+
+def report(step: dict) -> None:
+    for endpoint, stats in step["endpoints"].items():
+        print(f"  {step['rate']:8.0f}  {endpoint:<12} {stats['offered']:8.0f} {stats['achieved']:9.0f} "
+            f"{stats['p50_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['queue_p50_ms']:9.1f} {stats['queue_p99_ms']:9.1f}"
+            f" {stats['error_rate']:7.1%}")
+    if step["client_lag_p99_ms"] > 10:
+        print(f"            client fell behind its schedule (p99 {step['client_lag_p99_ms']:.0f} ms late); "
+            "add --clients")
+
+
+def launch(module: str, workers: int) -> tuple:
+    if workers > 1:
+        return bench_workers.launch(module, workers, dict(os.environ))
+    return bench_endpoints.launch(module, dict(os.environ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", help="access log to replay instead of synthetic traffic")
+    parser.add_argument("--rates", type=float, nargs="+", help="offered req/s per step (default: --start, --factor)")
+    parser.add_argument("--start", type=float, default=25)
+    parser.add_argument("--factor", type=float, default=1.5)
+    parser.add_argument("--max-rate", type=float, default=20_000)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per step")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds at the first rate before measuring")
+    parser.add_argument("--search-share", type=float, default=0.2, help="fraction of synthetic requests to /api/search")
+    parser.add_argument("--barcodes", type=int, default=100_000, help="distinct synthetic barcodes")
+    parser.add_argument("--products", type=int, default=20_000, help="most popular barcodes that are known products")
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--slo-ms", type=float, default=250, help="p99 above this saturates a step")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="error rate above this saturates a step")
+    parser.add_argument("--timeout", type=float, default=5, help="seconds before a request counts as an error")
+    parser.add_argument("--clients", type=int, default=1, help="client processes sharing the schedule")
+    parser.add_argument("--max-connections", type=int, default=512, help="per client process")
+    parser.add_argument("--workers", type=int, default=1, help="server workers (the launcher when above 1)")
+    parser.add_argument("--upstream-delay", type=float, default=0.0, help="seconds the upstream stub takes to answer")
+    parser.add_argument("--scan-url", help="running backend.server to load instead of launching one")
+    parser.add_argument("--search-url", help="running test_server to load instead of launching one")
+    parser.add_argument("--output", help="write the steps to this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    source = Replay(read_log(args.replay)) if args.replay else Synthetic(args, rng)
+    rates = args.rates or []
+    if not rates:
+        rate = args.start
+        while rate <= args.max_rate:
+            rates.append(rate)
+            rate *= args.factor
+
+    # Configure the servers before they are launched
+    stub = stub_upstream.start(delay=args.upstream_delay)
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    servers = []
+    steps = []
+    try:
+        urls = {"/api/scan": args.scan_url, "/api/search": args.search_url}
+        if args.scan_url is None:
+            build_table(make_engine(os.environ["DATABASE_URL"]), args.products)
+        for endpoint, module in (("/api/scan", "backend.server"), ("/api/search", "test_server")):
+            if urls[endpoint] is None:
+                proc, urls[endpoint] = launch(module, args.workers)
+                servers.append(proc)
+
+        service = calibrate(urls, source, 50)
+        print("idle service time: " + ", ".join(f"{e} {s * 1000:.1f} ms" for e, s in service.items()))
+        print(f"  {'rate':>8}  {'endpoint':<12} {'offered':>8} {'achieved':>9} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'queue p50':>9} {'queue p99':>9} {'errors':>7}")
+        best = None
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            # Starts the client processes and fills the server caches; not reported
+            run_step(rates[0], args.warmup, args, urls, source, service, pool, rng)
+            for rate in rates:
+                step = run_step(rate, args.duration, args, urls, source, service, pool, rng)
+                steps.append(step)
+                report(step)
+                reasons = saturated(step, args)
+                step["saturated"] = reasons
+                if reasons:
+                    print(f"saturation point: {best:.0f} req/s" if best is not None else "saturated at the first step",
+                        f"({'; '.join(reasons)} at {rate:.0f} req/s)")
+                    break
+                best = rate
+            else:
+                print(f"not saturated up to {rates[-1]:.0f} req/s")
+    finally:
+        for proc in servers:
+            proc.terminate()
+            proc.wait()
+        stub.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "steps": steps}, f, indent=2)
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
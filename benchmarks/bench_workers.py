@@ -0,0 +1,130 @@
+"""Throughput of the pre-forking launcher with 1 vs N workers.
+
+Starts ``backend.launcher`` once per worker count, drives one endpoint
+scenario from several client processes (a single asyncio client saturates
+before a few workers do) and reports aggregate throughput and latency,
+plus the server's proportional memory (PSS, Linux only), which shows how
+much of the preloaded catalog the workers share copy-on-write:
+
+    python -m benchmarks.bench_workers --workers 1 4 --scenario search
+    python -m benchmarks.bench_workers --workers 1 8 --scenario scan_get --clients 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import stub_upstream
+from benchmarks.bench_endpoints import SCENARIOS, drive, free_port
+
+
+def launch(module: str, workers: int, env: dict) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "backend.launcher", f"{module}:app", "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/openapi.json").status_code == 200 and len(worker_pids(proc.pid)) >= workers:
+                return proc, url
+        except httpx.TransportError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"launcher for {module}:app did not start")
+
+
+def worker_pids(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def pss_mb(pids) -> float:
+    """Summed proportional set size of ``pids``; shared pages count once overall."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return float("nan")
+    return total / 1024
+
+
+def client(url: str, scenario: str, requests: int, warmup: int, concurrency: int) -> dict:
+    async def go():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as c:
+            await drive(c, scenario, warmup, concurrency)
+            return await drive(c, scenario, requests, concurrency)
+    return asyncio.run(go())
+
+
+def run(module: str, workers: int, args, pool) -> float:
+    proc, url = launch(module, workers, dict(os.environ))
+    try:
+        jobs = [pool.apply_async(client, (url, args.scenario, args.requests, args.warmup, args.concurrency))
+                for _ in range(args.clients)]
+        results = [job.get() for job in jobs]
+        pids = [proc.pid] + worker_pids(proc.pid)
+        memory = pss_mb(pids)
+    finally:
+        proc.terminate()
+        proc.wait()
+    rps = sum(r["rps"] for r in results)
+    p50 = max(r["p50_ms"] for r in results)
+    p99 = max(r["p99_ms"] for r in results)
+    errors = sum(r["errors"] for r in results)
+    print(f"  {workers:3d} workers  {rps:9,.0f} req/s  p50 {p50:7.2f}  p99 {p99:7.2f} ms  "
+          f"{errors:5,} errors  PSS {memory:7.1f} MB")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="search")
+    parser.add_argument("--clients", type=int, default=min(8, os.cpu_count() or 1), help="client processes")
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per client")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client")
+    args = parser.parse_args()
+
+    stub = stub_upstream.start()
+    os.environ["OPENFOODFACTS_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+    module = SCENARIOS[args.scenario][0]
+    print(f"{args.scenario}: {args.clients} clients x {args.requests:,} requests, concurrency {args.concurrency} each")
+    baseline = None
+    try:
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            for workers in args.workers:
+                rps = run(module, workers, args, pool)
+                if baseline is None:
+                    baseline = rps
+                else:
+                    print(f"      {rps / baseline:.2f}x the first run")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
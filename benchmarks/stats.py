@@ -0,0 +1,7 @@
+"""Summary statistics shared by the benchmark scripts."""
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank ``pct`` percentile of ``samples`` (which need not be sorted)."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,123 @@
+"""Local stand-in for the OpenFoodFacts, Edamam and Spoonacular APIs.
+
+Point the providers at it to exercise /api/search without the network:
+
+    python -m benchmarks.stub_upstream --port 9100 --delay 0.05 &
+    OPENFOODFACTS_URL=http://127.0.0.1:9100 python test_server.py
+
+``--error-rate`` and ``--hang-rate`` inject 503 answers and requests that
+never answer in time, to exercise the providers' circuit breakers.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_products(query: str, count: int):
+    return [
+        {
+            "code": f"{abs(hash((query, i))) % 10**13:013d}",
+            "product_name": f"{query.title()} {i + 1}",
+            "brands": "Stub Foods",
+            "labels_tags": ["en:organic"] if i % 2 == 0 else [],
+            "packaging": "recyclable" if i % 3 == 0 else "plastic",
+            "origins": "local",
+            "image_url": "",
+        }
+        for i in range(count)
+    ]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    products = 3
+    calls = 0
+    # Faults, adjustable while the server runs (set them on the handler class)
+    error_rate = 0.0
+    hang_rate = 0.0
+    hang = 30.0
+
+    def do_GET(self):
+        type(self).calls += 1
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.delay:
+            time.sleep(self.delay)
+        fault = random.random()
+        if fault < self.error_rate:
+            self.send_error(503)
+            return
+        if fault < self.error_rate + self.hang_rate:
+            time.sleep(self.hang)
+
+        if url.path == "/cgi/search.pl":
+            body = {"products": fake_products(params.get("search_terms", ""), self.products)}
+        elif url.path == "/api/food-database/v2/parser":
+            body = {"hints": [
+                {"food": {"foodId": p["code"], "label": p["product_name"], "brand": p["brands"]}}
+                for p in fake_products(params.get("ingr", ""), self.products)
+            ]}
+        elif url.path == "/food/products/search":
+            body = {"products": [
+                {"id": p["code"], "title": p["product_name"]}
+                for p in fake_products(params.get("query", ""), self.products)
+            ]}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The caller gave up (deadline hit or lookup cancelled)
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port: int = 0, delay: float = 0.0, products: int = 3, handler: Optional[type] = None,
+          error_rate: float = 0.0, hang_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Start a stub server in a daemon thread; ``port=0`` picks a free port.
+
+    The handler class is ``server.RequestHandlerClass``; change its fault
+    attributes to inject failures mid-run.
+    """
+    handler = type("Handler", (handler or StubHandler,), {
+        "delay": delay, "products": products, "calls": 0, "error_rate": error_rate, "hang_rate": hang_rate,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to sleep before answering")
+    parser.add_argument("--products", type=int, default=3, help="products returned per query")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that stall for 30s")
+    args = parser.parse_args()
+
+    server = start(args.port, args.delay, args.products, error_rate=args.error_rate, hang_rate=args.hang_rate)
+    print(f"stub upstream listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,12 @@ source venv/bin/activate
 
 # Start backend server
 echo "Starting backend server on http://localhost:8000..."
-python test_server.py &
+if [ -n "$WEB_CONCURRENCY" ] && [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    # Pre-forked workers sharing one preloaded catalog
+    python -m backend.launcher test_server:app --port 8000 --workers "$WEB_CONCURRENCY" &
+else
+    python test_server.py &
+fi
 BACKEND_PID=$!
 
 # Wait a moment for backend to start
@@ -1,10 +1,73 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import requests
 import json
+import os
+import time
 from typing import Dict, List, Optional
 
-app = FastAPI(title="EcoScan Test API")
+from backend import fast_json, metrics, providers
+from backend.catalog import CatalogStore, ProductRecord
+from backend.database import engine
+from backend.http_cache import CacheRule, HttpCacheMiddleware
+from backend.keywords import get_lexicon
+from backend.product_store import ProductStore
+from backend.search_index import decode_cursor, encode_cursor
+from backend.singleflight import SingleFlight
+
+# Seconds between checks of the catalog file for changes (0 disables)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "0"))
+
+async def watch_catalog(interval: float):
+    """Reload the catalog whenever its file changes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await run_in_threadpool(catalog_store.reload):
+                print(f"Reloaded catalog: {len(catalog_store.current)} products")
+        except Exception as e:
+            print(f"Error reloading catalog: {e}")
+
+def prepare():
+    """Load the catalog and compile the lexicon (the launcher calls this before forking)"""
+    catalog_store.current
+    get_lexicon()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(prepare)
+    watcher = asyncio.create_task(watch_catalog(CATALOG_RELOAD_INTERVAL)) if CATALOG_RELOAD_INTERVAL > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    # Release pooled upstream connections
+    await providers.close_client()
+
+app = FastAPI(title="EcoScan Test API", lifespan=lifespan)
+
+# Seconds a search validator stays valid when the results include upstream
+# and local database products, which can change without a catalog reload
+SEARCH_ETAG_WINDOW = float(os.getenv("HTTP_SEARCH_ETAG_WINDOW", "60"))
+
+def search_version(params: Dict[str, str]) -> str:
+    """Everything a /api/search response depends on besides its parameters"""
+    version = catalog_store.current.version
+    if params.get("q"):
+        version += f"/{int(time.time() // SEARCH_ETAG_WINDOW)}"
+    return version
+
+# Conditional GETs answered from the catalog version without running the
+# search, plus compression of large responses. Added before CORS so 304
+# responses get the CORS headers too.
+app.add_middleware(HttpCacheMiddleware, rules={
+    "/api/search": CacheRule(os.getenv("HTTP_CACHE_CONTROL_SEARCH", "public, max-age=60"), search_version),
+    "/api/suggestions": CacheRule(
+        os.getenv("HTTP_CACHE_CONTROL_SUGGESTIONS", "public, max-age=300"),
+        lambda params: catalog_store.current.version,
+    ),
+})
 
 # Allow CORS for local frontend development
 app.add_middleware(
@@ -13,8 +76,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Request latency histograms for /metrics (and X-Profile sampling when enabled)
+app.add_middleware(metrics.MetricsMiddleware)
+
 @app.get("/api/scan")
 def scan_get(barcode: str):
     """Test endpoint for barcode scanning"""
@@ -31,30 +98,62 @@ def scan_get(barcode: str):
 def root():
     return {"message": "EcoScan API is running!"}
 
-def search_real_products(query: str) -> List[Dict]:
-    """Search for real products using various APIs and web scraping"""
+@app.get("/api/catalog")
+def catalog_info():
+    """Size and version of the loaded product catalog"""
+    catalog = catalog_store.current
+    return {"path": catalog_store.path, "version": catalog.version, "products": len(catalog)}
+
+@app.post("/api/catalog/reload")
+async def reload_catalog(force: bool = False):
+    """Re-read the catalog file and swap it in without restarting"""
+    try:
+        reloaded = await run_in_threadpool(catalog_store.reload, force)
+    except Exception as e:
+        print(f"Error reloading catalog: {e}")
+        raise HTTPException(status_code=500, detail="catalog reload failed")
+    catalog = catalog_store.current
+    return {"reloaded": reloaded, "version": catalog.version, "products": len(catalog)}
+
+@app.get("/metrics")
+def get_metrics():
+    """Latency histograms in Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """Hit/miss/eviction counters for the upstream provider cache"""
+    return providers.provider_cache.stats()
+
+@app.get("/api/providers/breakers")
+def provider_breakers():
+    """Circuit breaker state, counters and current timeout per upstream provider"""
+    return providers.breaker_stats()
+
+# Products ingested from an OpenFoodFacts dump (python -m backend.off_ingest)
+product_store = ProductStore(engine)
+
+# Products taken from the local table before asking the upstream APIs
+LOCAL_SEARCH_LIMIT = 20
+
+async def search_real_products(query: str) -> List[Dict]:
+    """Search for real products, locally first, then across the upstream APIs concurrently"""
     products = []
     
     try:
-        # 1. Always try OpenFoodFacts API first (most reliable)
-        food_products = search_openfoodfacts(query)
-        if food_products:
-            products.extend(food_products)
-        
-        # 2. Search using Edamam API for food products (backup)
-        if not products:
-            edamam_products = search_edamam_foods(query)
-            products.extend(edamam_products)
+        # 0. Products ingested from an OpenFoodFacts dump need no network call
+        products = await run_in_threadpool(product_store.search, query, LOCAL_SEARCH_LIMIT)
+        if products:
+            return products
         
-        # 3. Search using Spoonacular API for recipes/food
-        if not products:
-            spoonacular_products = search_spoonacular(query)
-            products.extend(spoonacular_products)
+        # 1. Query OpenFoodFacts, Edamam and Spoonacular at once; the first
+        #    source to return products wins and the others are cancelled
+        products = await providers.fan_out(query)
         
-        # 4. Generate dynamic products based on query if no real products found
-        if not products:
-            dynamic_products = generate_dynamic_products(query)
-            products.extend(dynamic_products)
+        # 2. Generate dynamic products based on query if no real products
+        #    found, not even in the catalog allowing for typos ("iphnoe")
+        if not products and not catalog_store.current.search_index.matches(query):
+            products = generate_dynamic_products(query)
         
     except Exception as e:
         print(f"Error searching real products: {e}")
@@ -63,64 +162,6 @@ def search_real_products(query: str) -> List[Dict]:
     
     return products
 
-def search_openfoodfacts(query: str) -> List[Dict]:
-    """Search OpenFoodFacts database for food products"""
-    try:
-        url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={query}&search_simple=1&action=process&json=1"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            products = []
-            for item in data.get('products', [])[:3]:  # Limit to 3 results
-                if item.get('product_name') and len(item.get('product_name', '')) > 2:
-                    # Calculate sustainability score based on available data
-                    score = calculate_food_sustainability_score(item)
-                    products.append({
-                        "id": f"off_{item.get('code', '')}",
-                        "name": item.get('product_name', 'Unknown Product'),
-                        "brand": item.get('brands', 'Unknown Brand'),
-                        "category": "food",
-                        "score": score,
-                        "breakdown": {
-                            "carbon": max(0, 50 - score),
-                            "water": max(0, 30 - score),
-                            "other": max(0, 20 - score)
-                        },
-                        "image": item.get('image_url', ''),
-                        "alternatives": []
-                    })
-            return products
-    except Exception as e:
-        print(f"Error searching OpenFoodFacts: {e}")
-    return []
-
-def search_edamam_foods(query: str) -> List[Dict]:
-    """Search Edamam API for food products"""
-    try:
-        # Free tier API (limited requests)
-        app_id = "demo_id"  # You would need to register for a real API key
-        app_key = "demo_key"
-        url = f"https://api.edamam.com/api/food-database/v2/parser?app_id={app_id}&app_key={app_key}&ingr={query}"
-        
-        # For demo purposes, return mock data
-        return []
-    except Exception as e:
-        print(f"Error searching Edamam: {e}")
-    return []
-
-def search_spoonacular(query: str) -> List[Dict]:
-    """Search Spoonacular API for food products"""
-    try:
-        # Free tier API (limited requests)
-        api_key = "demo_key"  # You would need to register for a real API key
-        url = f"https://api.spoonacular.com/food/products/search?query={query}&apiKey={api_key}"
-        
-        # For demo purposes, return mock data
-        return []
-    except Exception as e:
-        print(f"Error searching Spoonacular: {e}")
-    return []
-
 def generate_dynamic_products(query: str) -> List[Dict]:
     """Generate dynamic products based on query when no real products are found"""
     products = []
@@ -137,9 +178,12 @@ def generate_dynamic_products(query: str) -> List[Dict]:
     
     brands = ["Generic", "EcoBrand", "GreenChoice", "SustainableCo", "EcoFriendly"]
     
+    # Score and categorize from the keyword lexicon in one pass over the query
+    base_score, category = get_lexicon().analyze(query_lower)
+    
     for i, variation in enumerate(variations[:3]):
         # Generate realistic sustainability score based on keywords
-        score = calculate_query_sustainability_score(query_lower)
+        score = base_score
         
         # Adjust score based on variation
         if "eco" in variation.lower() or "sustainable" in variation.lower() or "organic" in variation.lower():
@@ -151,7 +195,7 @@ def generate_dynamic_products(query: str) -> List[Dict]:
             "id": f"dynamic_{i}",
             "name": variation,
             "brand": brands[i % len(brands)],
-            "category": determine_category(query_lower),
+            "category": category,
             "score": score,
             "breakdown": {
                 "carbon": max(0, 50 - score),
@@ -166,328 +210,99 @@ def generate_dynamic_products(query: str) -> List[Dict]:
 
 def calculate_query_sustainability_score(query: str) -> int:
     """Calculate sustainability score based on query keywords"""
-    score = 50  # Base score
-    
-    # Positive keywords
-    positive_keywords = [
-        'organic', 'eco', 'green', 'sustainable', 'recycled', 'biodegradable',
-        'renewable', 'fair trade', 'local', 'natural', 'plant-based', 'vegan'
-    ]
-    
-    # Negative keywords
-    negative_keywords = [
-        'plastic', 'disposable', 'single-use', 'toxic', 'chemical', 'synthetic',
-        'artificial', 'processed', 'industrial', 'mass-produced'
-    ]
-    
-    for keyword in positive_keywords:
-        if keyword in query:
-            score += 15
-    
-    for keyword in negative_keywords:
-        if keyword in query:
-            score -= 20
-    
-    return min(100, max(0, score))
+    return get_lexicon().analyze(query)[0]
 
 def determine_category(query: str) -> str:
     """Determine product category based on query"""
-    if any(keyword in query for keyword in ['food', 'drink', 'beverage', 'snack', 'cereal', 'organic']):
-        return 'food'
-    elif any(keyword in query for keyword in ['phone', 'computer', 'laptop', 'tablet', 'electronic']):
-        return 'electronics'
-    elif any(keyword in query for keyword in ['clothes', 'shoes', 'shirt', 'pants', 'dress']):
-        return 'clothing'
-    elif any(keyword in query for keyword in ['car', 'vehicle', 'automotive', 'tesla']):
-        return 'automotive'
-    else:
-        return 'general'
-
-def get_products_by_category(category: str) -> List[Dict]:
-    """Get all products in a specific category"""
-    category_products = {
-        'electronics': [
-            {"id": "elec_1", "name": "iPhone 15 Pro", "brand": "Apple", "category": "electronics", "score": 85, "breakdown": {"carbon": 12, "water": 6, "other": 3}, "image": "", "alternatives": []},
-            {"id": "elec_2", "name": "Samsung Galaxy S24", "brand": "Samsung", "category": "electronics", "score": 72, "breakdown": {"carbon": 15, "water": 8, "other": 5}, "image": "", "alternatives": []},
-            {"id": "elec_3", "name": "MacBook Pro M3", "brand": "Apple", "category": "electronics", "score": 68, "breakdown": {"carbon": 20, "water": 7, "other": 5}, "image": "", "alternatives": []},
-            {"id": "elec_4", "name": "iPad Air", "brand": "Apple", "category": "electronics", "score": 75, "breakdown": {"carbon": 14, "water": 6, "other": 5}, "image": "", "alternatives": []},
-            {"id": "elec_5", "name": "Google Pixel 8", "brand": "Google", "category": "electronics", "score": 80, "breakdown": {"carbon": 11, "water": 5, "other": 4}, "image": "", "alternatives": []},
-            {"id": "elec_6", "name": "Dell XPS 13", "brand": "Dell", "category": "electronics", "score": 65, "breakdown": {"carbon": 18, "water": 9, "other": 8}, "image": "", "alternatives": []},
-            {"id": "elec_7", "name": "AirPods Pro", "brand": "Apple", "category": "electronics", "score": 70, "breakdown": {"carbon": 16, "water": 7, "other": 7}, "image": "", "alternatives": []},
-            {"id": "elec_8", "name": "Sony WH-1000XM5", "brand": "Sony", "category": "electronics", "score": 73, "breakdown": {"carbon": 15, "water": 8, "other": 4}, "image": "", "alternatives": []}
-        ],
-        'food': [
-            {"id": "food_1", "name": "Coca Cola Classic", "brand": "Coca Cola", "category": "food", "score": 25, "breakdown": {"carbon": 45, "water": 25, "other": 5}, "image": "", "alternatives": []},
-            {"id": "food_2", "name": "Beyond Meat Burger", "brand": "Beyond Meat", "category": "food", "score": 82, "breakdown": {"carbon": 12, "water": 4, "other": 2}, "image": "", "alternatives": []},
-            {"id": "food_3", "name": "Organic Quinoa", "brand": "Nature's Path", "category": "food", "score": 90, "breakdown": {"carbon": 5, "water": 3, "other": 2}, "image": "", "alternatives": []},
-            {"id": "food_4", "name": "Fair Trade Coffee", "brand": "Equal Exchange", "category": "food", "score": 85, "breakdown": {"carbon": 8, "water": 4, "other": 3}, "image": "", "alternatives": []},
-            {"id": "food_5", "name": "Local Honey", "brand": "Local Farm", "category": "food", "score": 95, "breakdown": {"carbon": 2, "water": 2, "other": 1}, "image": "", "alternatives": []},
-            {"id": "food_6", "name": "Organic Avocado", "brand": "Earthbound Farm", "category": "food", "score": 78, "breakdown": {"carbon": 12, "water": 8, "other": 2}, "image": "", "alternatives": []},
-            {"id": "food_7", "name": "Plant-Based Milk", "brand": "Oatly", "category": "food", "score": 88, "breakdown": {"carbon": 7, "water": 3, "other": 2}, "image": "", "alternatives": []},
-            {"id": "food_8", "name": "Sustainable Tuna", "brand": "Wild Planet", "category": "food", "score": 72, "breakdown": {"carbon": 15, "water": 8, "other": 5}, "image": "", "alternatives": []}
-        ],
-        'clothing': [
-            {"id": "cloth_1", "name": "Nike Air Max 270", "brand": "Nike", "category": "clothing", "score": 45, "breakdown": {"carbon": 35, "water": 15, "other": 5}, "image": "", "alternatives": []},
-            {"id": "cloth_2", "name": "Patagonia Better Sweater", "brand": "Patagonia", "category": "clothing", "score": 88, "breakdown": {"carbon": 8, "water": 3, "other": 1}, "image": "", "alternatives": []},
-            {"id": "cloth_3", "name": "Allbirds Tree Runners", "brand": "Allbirds", "category": "clothing", "score": 85, "breakdown": {"carbon": 10, "water": 4, "other": 1}, "image": "", "alternatives": []},
-            {"id": "cloth_4", "name": "Veja V-10 Sneakers", "brand": "Veja", "category": "clothing", "score": 82, "breakdown": {"carbon": 12, "water": 5, "other": 1}, "image": "", "alternatives": []},
-            {"id": "cloth_5", "name": "Organic Cotton T-Shirt", "brand": "Pact", "category": "clothing", "score": 90, "breakdown": {"carbon": 5, "water": 4, "other": 1}, "image": "", "alternatives": []},
-            {"id": "cloth_6", "name": "Recycled Denim Jeans", "brand": "Outerknown", "category": "clothing", "score": 75, "breakdown": {"carbon": 15, "water": 8, "other": 2}, "image": "", "alternatives": []},
-            {"id": "cloth_7", "name": "Hemp Hoodie", "brand": "Patagonia", "category": "clothing", "score": 92, "breakdown": {"carbon": 4, "water": 3, "other": 1}, "image": "", "alternatives": []},
-            {"id": "cloth_8", "name": "Wool Base Layer", "brand": "Icebreaker", "category": "clothing", "score": 80, "breakdown": {"carbon": 12, "water": 6, "other": 2}, "image": "", "alternatives": []}
-        ],
-        'automotive': [
-            {"id": "auto_1", "name": "Tesla Model 3", "brand": "Tesla", "category": "automotive", "score": 78, "breakdown": {"carbon": 18, "water": 4, "other": 0}, "image": "", "alternatives": []},
-            {"id": "auto_2", "name": "Toyota Prius", "brand": "Toyota", "category": "automotive", "score": 85, "breakdown": {"carbon": 12, "water": 2, "other": 1}, "image": "", "alternatives": []},
-            {"id": "auto_3", "name": "BMW i3", "brand": "BMW", "category": "automotive", "score": 72, "breakdown": {"carbon": 20, "water": 5, "other": 3}, "image": "", "alternatives": []},
-            {"id": "auto_4", "name": "Nissan Leaf", "brand": "Nissan", "category": "automotive", "score": 80, "breakdown": {"carbon": 15, "water": 3, "other": 2}, "image": "", "alternatives": []},
-            {"id": "auto_5", "name": "Hyundai Ioniq", "brand": "Hyundai", "category": "automotive", "score": 75, "breakdown": {"carbon": 18, "water": 4, "other": 3}, "image": "", "alternatives": []},
-            {"id": "auto_6", "name": "Ford Mustang Mach-E", "brand": "Ford", "category": "automotive", "score": 70, "breakdown": {"carbon": 22, "water": 5, "other": 3}, "image": "", "alternatives": []}
-        ],
-        'beauty': [
-            {"id": "beauty_1", "name": "Organic Face Cream", "brand": "Dr. Bronner's", "category": "beauty", "score": 85, "breakdown": {"carbon": 8, "water": 4, "other": 3}, "image": "", "alternatives": []},
-            {"id": "beauty_2", "name": "Cruelty-Free Shampoo", "brand": "Aveda", "category": "beauty", "score": 80, "breakdown": {"carbon": 12, "water": 6, "other": 2}, "image": "", "alternatives": []},
-            {"id": "beauty_3", "name": "Natural Deodorant", "brand": "Native", "category": "beauty", "score": 88, "breakdown": {"carbon": 6, "water": 3, "other": 3}, "image": "", "alternatives": []},
-            {"id": "beauty_4", "name": "Reef-Safe Sunscreen", "brand": "All Good", "category": "beauty", "score": 92, "breakdown": {"carbon": 4, "water": 3, "other": 1}, "image": "", "alternatives": []}
-        ],
-        'home': [
-            {"id": "home_1", "name": "LED Light Bulbs", "brand": "Philips", "category": "home", "score": 90, "breakdown": {"carbon": 5, "water": 2, "other": 3}, "image": "", "alternatives": []},
-            {"id": "home_2", "name": "Smart Thermostat", "brand": "Nest", "category": "home", "score": 85, "breakdown": {"carbon": 8, "water": 3, "other": 4}, "image": "", "alternatives": []},
-            {"id": "home_3", "name": "Bamboo Cutting Board", "brand": "Bambu", "category": "home", "score": 95, "breakdown": {"carbon": 2, "water": 2, "other": 1}, "image": "", "alternatives": []},
-            {"id": "home_4", "name": "Reusable Water Bottle", "brand": "Hydro Flask", "category": "home", "score": 88, "breakdown": {"carbon": 6, "water": 4, "other": 2}, "image": "", "alternatives": []}
-        ]
-    }
-    
-    return category_products.get(category, [])
+    return get_lexicon().analyze(query)[1]
 
 # Removed problematic scraping function - using dynamic product generation instead
 
-def calculate_food_sustainability_score(product_data: Dict) -> int:
-    """Calculate sustainability score for food products based on available data"""
-    score = 50  # Base score
-    
-    # Check for organic certification
-    if 'organic' in str(product_data.get('labels_tags', [])).lower():
-        score += 20
-    
-    # Check for sustainable packaging
-    packaging = str(product_data.get('packaging', '')).lower()
-    if any(eco in packaging for eco in ['recyclable', 'biodegradable', 'compostable']):
-        score += 15
-    
-    # Check for fair trade
-    if 'fair trade' in str(product_data.get('labels_tags', [])).lower():
-        score += 10
+# Product catalog (backend/data/products.json unless ECOSCAN_CATALOG says
+# otherwise), loaded and indexed once; see /api/catalog/reload
+# Loaded by prepare() at startup rather than at import
+catalog_store = CatalogStore(lazy=True)
+
+# Concurrent identical requests share one computation (SINGLEFLIGHT=0 disables)
+search_flight = SingleFlight()
+upstream_flight = SingleFlight()
+
+# Page size for /api/search when the client does not pass ``limit``
+SEARCH_PAGE_SIZE = 24
+SEARCH_MAX_LIMIT = 100
+
+@app.get("/api/search", response_class=fast_json.RawJSONResponse)
+async def search_products(q: str = "", category: str = "", brand: str = "", sustainability: str = "", limit: int = SEARCH_PAGE_SIZE, cursor: str = ""):
+    """Search for products by name, brand, category, or sustainability rating
     
-    # Check for local production
-    origins = str(product_data.get('origins', '')).lower()
-    if any(local in origins for local in ['local', 'regional', 'domestic']):
-        score += 5
+    Results are paginated: pass the ``X-Next-Cursor`` response header back as
+    ``cursor`` to get the next ``limit`` products. The header is absent on
+    the last page.
+    """
+    if limit < 1 or limit > SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
     
-    return min(100, max(0, score))
+    # Identical concurrent searches (e.g. a promoted term) share one upstream
+    # fan-out and filter pass; brand matching ignores case
+    key = (q, category, brand.lower(), sustainability, limit, cursor)
+    body, next_key = await search_flight.do(
+        key, lambda: run_search(q, category, brand, sustainability, limit, after)
+    )
+    headers = {"X-Next-Cursor": encode_cursor(next_key)} if next_key is not None else None
+    return fast_json.RawJSONResponse(body, headers=headers)
 
-@app.get("/api/search")
-def search_products(q: str = "", category: str = "", brand: str = "", sustainability: str = ""):
-    """Search for products by name, brand, category, or sustainability rating"""
-    all_products = []
+async def run_search(q: str, category: str, brand: str, sustainability: str, limit: int, after: Optional[tuple]):
+    """One page of search results as a JSON body, plus the key of the next page"""
+    extra_products = []
     
-    # If category is specified but no query, show all products in that category
-    if category and not q:
-        all_products = get_products_by_category(category)
     # If query is provided, search for products
-    elif q:
-        # Try to find real products first
-        real_products = search_real_products(q)
-        all_products = real_products.copy()
-    
-    # Always add mock products for demonstration
-    products_db = [
-        {
-            "id": 1,
-            "name": "iPhone 15 Pro",
-            "brand": "Apple",
-            "category": "electronics",
-            "score": 85,
-            "breakdown": {"carbon": 12, "water": 6, "other": 3},
-            "image": "https://images.unsplash.com/photo-1592899677977-9c10ca588bbd?w=400",
-            "alternatives": [
-                {"name": "iPhone 15 Pro (Refurbished)", "score": 92},
-                {"name": "Fairphone 5", "score": 95}
-            ]
-        },
-        {
-            "id": 2,
-            "name": "Tesla Model 3",
-            "brand": "Tesla",
-            "category": "automotive",
-            "score": 78,
-            "breakdown": {"carbon": 18, "water": 4, "other": 0},
-            "image": "https://images.unsplash.com/photo-1560958089-b8a1929cea89?w=400",
-            "alternatives": [
-                {"name": "Tesla Model 3 (Used)", "score": 88},
-                {"name": "BYD Atto 3", "score": 82}
-            ]
-        },
-        {
-            "id": 3,
-            "name": "Nike Air Max 270",
-            "brand": "Nike",
-            "category": "clothing",
-            "score": 45,
-            "breakdown": {"carbon": 35, "water": 15, "other": 5},
-            "image": "https://images.unsplash.com/photo-1542291026-7eec264c27ff?w=400",
-            "alternatives": [
-                {"name": "Allbirds Tree Runners", "score": 85},
-                {"name": "Veja V-10", "score": 82}
-            ]
-        },
-        {
-            "id": 4,
-            "name": "Coca Cola Classic",
-            "brand": "Coca Cola",
-            "category": "food",
-            "score": 25,
-            "breakdown": {"carbon": 45, "water": 25, "other": 5},
-            "image": "https://images.unsplash.com/photo-1581636625402-29b2a704ef13?w=400",
-            "alternatives": [
-                {"name": "La Croix Sparkling Water", "score": 75},
-                {"name": "Topo Chico Mineral Water", "score": 68}
-            ]
-        },
-        {
-            "id": 5,
-            "name": "Samsung Galaxy S24",
-            "brand": "Samsung",
-            "category": "electronics",
-            "score": 72,
-            "breakdown": {"carbon": 15, "water": 8, "other": 5},
-            "image": "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=400",
-            "alternatives": [
-                {"name": "Samsung Galaxy S24 (Refurbished)", "score": 88},
-                {"name": "Google Pixel 8", "score": 85}
-            ]
-        },
-        {
-            "id": 6,
-            "name": "MacBook Pro M3",
-            "brand": "Apple",
-            "category": "electronics",
-            "score": 68,
-            "breakdown": {"carbon": 20, "water": 7, "other": 5},
-            "image": "https://images.unsplash.com/photo-1517336714731-489689fd1ca8?w=400",
-            "alternatives": [
-                {"name": "MacBook Pro M3 (Refurbished)", "score": 85},
-                {"name": "Framework Laptop 16", "score": 92}
-            ]
-        },
-        {
-            "id": 7,
-            "name": "Patagonia Better Sweater",
-            "brand": "Patagonia",
-            "category": "clothing",
-            "score": 88,
-            "breakdown": {"carbon": 8, "water": 3, "other": 1},
-            "image": "https://images.unsplash.com/photo-1551698618-1dfe5d97d256?w=400",
-            "alternatives": [
-                {"name": "Patagonia Better Sweater (Used)", "score": 95},
-                {"name": "Arcteryx Atom LT", "score": 82}
-            ]
-        },
-        {
-            "id": 8,
-            "name": "Beyond Meat Burger",
-            "brand": "Beyond Meat",
-            "category": "food",
-            "score": 82,
-            "breakdown": {"carbon": 12, "water": 4, "other": 2},
-            "image": "https://images.unsplash.com/photo-1571091718767-18b5b1457add?w=400",
-            "alternatives": [
-                {"name": "Impossible Burger", "score": 78},
-                {"name": "Black Bean Burger (Homemade)", "score": 95}
-            ]
-        }
-    ]
-    
-    # Add mock products to the search pool
-    all_products.extend(products_db)
-    
-    # Filter products based on search query and filters
-    filtered_products = []
-    
-    for product in all_products:
-        # Check if product matches search query (only if query is provided)
-        matches_query = True
-        if q:
-            query_lower = q.lower()
-            matches_query = (
-                query_lower in product["name"].lower() or
-                query_lower in product["brand"].lower() or
-                query_lower in product["category"].lower()
-            )
-        
-        # Check category filter
-        matches_category = not category or product["category"] == category
-        
-        # Check brand filter
-        matches_brand = not brand or product["brand"].lower() == brand.lower()
-        
-        # Check sustainability filter
-        matches_sustainability = True
-        if sustainability:
-            if sustainability == "excellent" and product["score"] < 80:
-                matches_sustainability = False
-            elif sustainability == "good" and (product["score"] < 60 or product["score"] >= 80):
-                matches_sustainability = False
-            elif sustainability == "fair" and (product["score"] < 40 or product["score"] >= 60):
-                matches_sustainability = False
-            elif sustainability == "poor" and product["score"] >= 40:
-                matches_sustainability = False
-        
-        if matches_query and matches_category and matches_brand and matches_sustainability:
-            filtered_products.append(product)
-    
-    # Sort by relevance (exact matches first, then by score)
     if q:
-        query_lower = q.lower()
-        filtered_products.sort(key=lambda x: (
-            -1 if query_lower in x["name"].lower() else 0,
-            -x["score"]
-        ))
-    else:
-        # Sort by score when no query is provided
-        filtered_products.sort(key=lambda x: -x["score"])
+        # Try to find real products first
+        with metrics.span("search_real_products"):
+            # Pages and filters of the same query also share the upstream lookup
+            found = await upstream_flight.do(q, lambda: search_real_products(q))
+            extra_products = [ProductRecord.from_dict(p) for p in found]
     
-    return filtered_products
+    # Filtering (typo-tolerant matching included) and encoding are CPU-bound
+    return await run_in_threadpool(
+        search_page, catalog_store.current.search_index, q, category, brand, sustainability, extra_products, limit, after
+    )
+
+def search_page(search_index, q: str, category: str, brand: str, sustainability: str, extra_products, limit: int,
+                after: Optional[tuple]):
+    """Filter one page out of the index (and the upstream products) and encode it"""
+    # Catalog products live in the prebuilt index; upstream results are
+    # filtered alongside them. A category without a query is answered by
+    # the index's category filter.
+    with metrics.span("search_filter"):
+        products, next_key = search_index.search_page(
+            q=q,
+            category=category,
+            brand=brand,
+            sustainability=sustainability,
+            extra=extra_products,
+            limit=limit,
+            after=after,
+        )
+    # Catalog products are encoded once and reused; only upstream ones are new
+    with metrics.span("search_serialize"):
+        return fast_json.array(product.to_json() for product in products), next_key
+
+@app.get("/api/search/coalescing")
+def search_coalescing_stats():
+    """How many searches ran and how many shared an identical in-flight search"""
+    return {"search": search_flight.stats(), "upstream": upstream_flight.stats()}
 
 @app.get("/api/suggestions")
 def get_suggestions(q: str):
     """Get search suggestions based on query"""
-    # Mock suggestions - in a real app, this would use a search index
-    all_suggestions = [
-        {"name": "iPhone 15 Pro", "brand": "Apple"},
-        {"name": "iPhone 15", "brand": "Apple"},
-        {"name": "Tesla Model 3", "brand": "Tesla"},
-        {"name": "Tesla Model Y", "brand": "Tesla"},
-        {"name": "Nike Air Max 270", "brand": "Nike"},
-        {"name": "Nike Air Force 1", "brand": "Nike"},
-        {"name": "Coca Cola Classic", "brand": "Coca Cola"},
-        {"name": "Samsung Galaxy S24", "brand": "Samsung"},
-        {"name": "Samsung Galaxy S23", "brand": "Samsung"},
-        {"name": "MacBook Pro M3", "brand": "Apple"},
-        {"name": "MacBook Air M2", "brand": "Apple"},
-        {"name": "Patagonia Better Sweater", "brand": "Patagonia"},
-        {"name": "Beyond Meat Burger", "brand": "Beyond Meat"}
-    ]
-    
-    query_lower = q.lower()
-    suggestions = []
-    
-    for suggestion in all_suggestions:
-        if query_lower in suggestion["name"].lower() or query_lower in suggestion["brand"].lower():
-            suggestions.append(suggestion)
-    
-    # Limit to 5 suggestions
-    return suggestions[:5]
+    # Highest-scoring products with a word starting with the query
+    with metrics.span("suggestions"):
+        return catalog_store.current.autocomplete.complete(q, limit=5)
 
 if __name__ == "__main__":
     import uvicorn